@@ -0,0 +1,95 @@
+"""
+防读屏基准测试：对比原来的 SequenceMatcher 实现与 ReadAloudDetector
+在长卡片上的单句检测耗时和判定结果
+
+用法: python bench_read_aloud.py
+"""
+import random
+import time
+from difflib import SequenceMatcher
+from services.read_aloud import ReadAloudDetector, QUESTION_STARTERS
+
+VOCAB = (
+    "system design latency throughput cache shard replica queue consumer producer "
+    "team project deadline stakeholder impact metric customer feedback launch "
+    "python service database index partition retry timeout backoff budget owner "
+    "migrate rollout incident postmortem review mentor growth delivery quality"
+).split()
+
+
+def is_reading_card(speech_text, card_content):
+    """原实现（main.py 中的 is_reading_card）"""
+    if not card_content or not speech_text:
+        return False
+    speech_clean = speech_text.lower().strip()
+    card_clean = card_content.lower()
+
+    if any(speech_clean.startswith(q) for q in QUESTION_STARTERS):
+        return False
+
+    matcher = SequenceMatcher(None, speech_clean, card_clean)
+    match = matcher.find_longest_match(0, len(speech_clean), 0, len(card_clean))
+    ratio = match.size / len(speech_clean)
+    return ratio > 0.8
+
+
+def make_card(rng, card_id, n_words):
+    words = [rng.choice(VOCAB) for _ in range(n_words)]
+    return {"id": card_id, "topic": card_id, "content": " ".join(words)}
+
+
+def make_utterances(rng, card, n=50):
+    """一半是从卡片里连续念出来的片段，一半是随机组合的句子"""
+    words = card["content"].split()
+    utterances = []
+    for i in range(n):
+        length = rng.randint(6, 20)
+        if i % 2 == 0:
+            start = rng.randint(0, len(words) - length)
+            utterances.append((" ".join(words[start:start + length]), True))
+        else:
+            utterances.append((" ".join(rng.choice(VOCAB) for _ in range(length)), False))
+    return utterances
+
+
+def bench(name, fn, utterances, repeat=3):
+    best = float("inf")
+    results = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        results = [fn(text) for text, _ in utterances]
+        best = min(best, time.perf_counter() - start)
+    per_call = best / len(utterances) * 1e6
+    correct = sum(1 for r, (_, expected) in zip(results, utterances) if r == expected)
+    print(f"  {name:<22} {per_call:10.1f} us/utterance   correct {correct}/{len(utterances)}")
+    return results
+
+
+def main():
+    rng = random.Random(7)
+    for n_words in (200, 1000, 5000):
+        card = make_card(rng, f"card_{n_words}", n_words)
+        history = [make_card(rng, f"history_{i}", n_words) for i in range(10)]
+        utterances = make_utterances(rng, card)
+
+        detector = ReadAloudDetector()
+        start = time.perf_counter()
+        for c in history + [card]:
+            detector.track(c)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        print(f"\n--- card: {n_words} words ({len(card['content'])} chars), "
+              f"{len(history)} cards in history ---")
+        old = bench("SequenceMatcher", lambda text: is_reading_card(text, card["content"]), utterances)
+        new = bench("ReadAloudDetector", detector.is_reading, utterances)
+        agree = sum(1 for a, b in zip(old, new) if a == b)
+        print(f"  agreement {agree}/{len(utterances)}, index build {build_ms:.1f} ms for {len(history) + 1} cards")
+
+        # 原实现只检查当前卡片：回退前/历史卡片上的念稿检测不到
+        history_utterances = [(text, True) for text, expected in make_utterances(rng, history[3]) if expected]
+        bench("SequenceMatcher (hist)", lambda text: is_reading_card(text, card["content"]), history_utterances)
+        bench("ReadAloudDetector (hist)", detector.is_reading, history_utterances)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+"""
+多会话负载测试：一个进程能同时跑多少场面试
+
+- 本地起一个假的云端（/v1/proxy/transcribe、/v1/proxy/chat），带固定延迟
+- 每个会话用合成音频代替麦克风：每隔 UTTERANCE_INTERVAL 秒说一句话，
+  一部分能命中本地卡片，其余走云端匹配 + AI 生成
+- 统计每句话从说完到处理完成的延迟 (p50 / p95)、丢句数和进程 CPU 占用
+
+用法: python bench_sessions.py [会话数 ...]    例如 python bench_sessions.py 1 10 50
+环境变量: BENCH_DURATION（每档秒数）、BENCH_P95_TARGET（可接受的 p95 延迟，秒）
+"""
+import asyncio
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TRANSCRIBE_LATENCY = 0.30   # 假云端转录耗时（秒）
+CHAT_LATENCY = 0.40         # 假云端 LLM 耗时（秒）
+UTTERANCE_INTERVAL = 3.0    # 每个会话平均多久说一句话
+SPEECH_SECONDS = 2.0        # 每句话的音频长度
+DURATION = float(os.getenv("BENCH_DURATION", "10"))
+P95_TARGET = float(os.getenv("BENCH_P95_TARGET", "1.5"))
+LEVELS = [int(n) for n in sys.argv[1:]] or [1, 5, 10, 25, 50]
+
+VOCAB = (
+    "system design latency throughput cache shard replica queue consumer producer "
+    "team project deadline stakeholder impact metric customer feedback launch "
+    "python service database index partition retry timeout backoff budget owner"
+).split()
+
+
+class FakeCloud(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # 客户端已取消请求（停止面试）
+
+    def do_GET(self):
+        if self.path == "/v1/proxy/transcribe/formats":
+            self._reply({"formats": ["wav"], "streaming": False})
+        else:
+            self._reply({"status": "ok"})
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path == "/v1/proxy/transcribe":
+            time.sleep(TRANSCRIBE_LATENCY)
+            self._reply({"text": "placeholder"})
+            return
+        if self.path == "/v1/proxy/chat/stream":
+            # 流式生成：首段在一半延迟时到达，其余在剩下的时间里到达
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            try:
+                for delta in ("Topic: Generated\n", "STAR ", "answer"):
+                    time.sleep(CHAT_LATENCY / 3)
+                    self.wfile.write(f"data: {json.dumps({'delta': delta})}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                self.wfile.write(b"data: [DONE]\n\n")
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+            self.close_connection = True
+            return
+        time.sleep(CHAT_LATENCY)
+        request = json.loads(body)
+        if request.get("temperature", 0) == 0:
+            content = {"best_match_index": None}
+        else:
+            content = {"valid": True, "topic": "Generated", "content": "STAR answer"}
+        self._reply({"content": json.dumps(content)})
+
+
+def start_fake_cloud():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeCloud)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def make_cards(rng, n):
+    cards = []
+    for i in range(n):
+        words = [rng.choice(VOCAB) for _ in range(12)]
+        cards.append({"id": f"card_{i}", "topic": " ".join(words[:3]), "content": " ".join(words)})
+    return cards
+
+
+def main():
+    server = start_fake_cloud()
+    # 必须在导入 services 之前设置（cloud client 首次使用时读取）
+    os.environ["RENDER_URL"] = f"http://127.0.0.1:{server.server_address[1]}"
+    os.environ.setdefault("MIC_DEVICE_NAME", "Default")
+
+    import speech_recognition as sr
+    from services.audio import AudioService, Segment
+    from services.card_store import CardStore
+    from services.matcher import CardIndex
+    from services.sessions import SessionManager
+    from services.transcripts import TranscriptLibrary
+
+    rng = random.Random(7)
+    cards = make_cards(rng, 200)
+    sample_rate, sample_width = 16000, 2
+    silence = b"\x00\x00" * int(sample_rate * SPEECH_SECONDS)
+
+    class SyntheticAudio(AudioService):
+        """不开麦克风：按固定节奏产出合成语音段，转录照常上传到（假）云端"""
+
+        def __init__(self, state=None, device_name=None):
+            super().__init__(state=state, device_name=device_name)
+            self.rng = random.Random(id(self))
+            self.scripts = {}
+
+        def save_noise_profile(self):
+            pass
+
+        def stream_segments(self, is_running, partial_interval_s=None):
+            # 错开各会话的第一句话
+            time.sleep(self.rng.uniform(0, UTTERANCE_INTERVAL))
+            stream_id = 0
+            while is_running():
+                stream_id += 1   # 每句话一个编号（录音时刻按编号记录）
+                if self.rng.random() < 0.5:
+                    text = self.rng.choice(cards)["content"]      # 本地命中
+                else:
+                    text = "tell me about " + " ".join(self.rng.choice(VOCAB) for _ in range(6))
+                audio_data = sr.AudioData(silence, sample_rate, sample_width)
+                self.scripts[id(audio_data)] = text
+                yield Segment(silence, 0.0, SPEECH_SECONDS, SPEECH_SECONDS, stream_id), audio_data
+                time.sleep(self.rng.uniform(0.5, 1.5) * UTTERANCE_INTERVAL)
+
+        async def atranscribe(self, audio_data):
+            if await super().atranscribe(audio_data) is None:
+                return None
+            return self.scripts.pop(id(audio_data), None)
+
+    workdir = tempfile.mkdtemp(prefix="bench_sessions_")
+    store = CardStore(os.path.join(workdir, "cards.db"))
+    store.replace(cards)
+    card_index = CardIndex(store)
+    card_index.load_cards()
+    library = TranscriptLibrary(os.path.join(workdir, "transcripts"))
+
+    async def run_level(n):
+        manager = SessionManager(card_index, library, max_sessions=n, audio_factory=SyntheticAudio)
+        latencies = []
+        sessions = []
+        for i in range(n):
+            session = manager.create(f"bench_{i}")
+            session.set_token("bench-token")
+
+            async def timed(text, captured_at, _process=session.process_text):
+                await _process(text, captured_at)
+                latencies.append(time.time() - captured_at - SPEECH_SECONDS)
+
+            session.process_text = timed
+            sessions.append(session)
+
+        cpu_start, wall_start = time.process_time(), time.time()
+        for session in sessions:
+            session.start()
+        await asyncio.sleep(DURATION)
+        for session in sessions:
+            manager.remove(session.id)
+        cpu = (time.process_time() - cpu_start) / (time.time() - wall_start)
+        await asyncio.sleep(1.0)  # 等这一档的录音线程退出
+        return latencies, cpu
+
+    async def run_all():
+        results = []
+        for n in LEVELS:
+            sys.stdout = open(os.devnull, "w")  # 会话日志太多，测量期间关闭
+            try:
+                latencies, cpu = await run_level(n)
+            finally:
+                sys.stdout.close()
+                sys.stdout = real_stdout
+            latencies.sort()
+            p50 = latencies[len(latencies) // 2] if latencies else float("nan")
+            p95 = latencies[int(len(latencies) * 0.95)] if latencies else float("nan")
+            results.append((n, len(latencies), p50, p95, cpu))
+            print(f"{n:>4} sessions: {len(latencies):>4} utterances  "
+                  f"p50 {p50 * 1000:7.0f} ms  p95 {p95 * 1000:7.0f} ms  CPU {cpu * 100:5.1f}%")
+        return results
+
+    real_stdout = sys.stdout
+    try:
+        results = asyncio.run(run_all())
+    finally:
+        server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    sustainable = [n for n, count, _, p95, _ in results if count and p95 <= P95_TARGET]
+    if sustainable:
+        print(f"\nMax sessions with p95 <= {P95_TARGET:.1f}s: {max(sustainable)}")
+    else:
+        print(f"\nNo level met p95 <= {P95_TARGET:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+VAD 分段基准测试：对比 recognizer.listen 与 VoiceActivityDetector
+的 "说话结束 -> 语音段产出" 延迟
+
+用法: python bench_vad.py
+"""
+import time
+import numpy as np
+import speech_recognition as sr
+from services.audio import VoiceActivityDetector
+
+SAMPLE_RATE = 16000
+CHUNK = 1024
+
+
+def synth_speech(rng, seconds):
+    """用带包络的噪声模拟一个单词串（能量远高于底噪）"""
+    n = int(seconds * SAMPLE_RATE)
+    t = np.arange(n) / SAMPLE_RATE
+    envelope = 0.6 + 0.4 * np.sin(2 * np.pi * 4 * t) ** 2
+    return rng.normal(0, 2500, n) * envelope
+
+
+def build_session(rng):
+    """
+    模拟一段面试音频，返回 (int16 PCM, 每句话的结束时间)
+    包含短问题、带短停顿的长问题，句间 1~1.5 秒静音
+    """
+    # (说话时长, 停顿时长) 列表，每个列表是一句话
+    utterances = [
+        [(1.2, 0.1), (0.8, 0.0)],
+        [(2.0, 0.15), (1.5, 0.15), (2.0, 0.2), (1.8, 0.15), (2.5, 0.0)],   # 长问题
+        [(0.9, 0.0)],
+        [(3.0, 0.2), (3.0, 0.2), (3.0, 0.0)],
+    ]
+    parts, ends, cursor = [], [], 0.0
+    noise = lambda s: rng.normal(0, 60, int(s * SAMPLE_RATE))
+    parts.append(noise(1.0))
+    cursor += 1.0
+    for words in utterances:
+        for speak, pause in words:
+            parts.append(synth_speech(rng, speak))
+            cursor += speak
+            if pause:
+                parts.append(noise(pause))
+                cursor += pause
+        ends.append(cursor)
+        gap = rng.uniform(1.0, 1.5)
+        parts.append(noise(gap))
+        cursor += gap
+    pcm = np.clip(np.concatenate(parts), -32768, 32767).astype(np.int16)
+    return pcm.tobytes(), ends
+
+
+class FakeStream:
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+
+    def read(self, frames):
+        chunk = self.data[self.pos:self.pos + frames * 2]
+        self.pos += len(chunk)
+        return chunk
+
+
+class FakeSource(sr.AudioSource):
+    def __init__(self, data):
+        self.SAMPLE_RATE = SAMPLE_RATE
+        self.SAMPLE_WIDTH = 2
+        self.CHUNK = CHUNK
+        self.stream = FakeStream(data)
+
+
+def nearest_end(ends, speech_end):
+    """段对应的那句话的真实结束时间（段结束之后最近的一个）"""
+    for end in ends:
+        if end >= speech_end - 0.05:
+            return end
+    return ends[-1]
+
+
+def bench_listen(data, ends):
+    """当前实现：recognizer.listen (pause_threshold=0.8)"""
+    recognizer = sr.Recognizer()
+    recognizer.pause_threshold = 0.8
+    recognizer.energy_threshold = 300
+    recognizer.dynamic_energy_threshold = False
+    source = FakeSource(data)
+    results = []
+    while source.stream.pos < len(data):
+        try:
+            audio = recognizer.listen(source, timeout=None, phrase_time_limit=20)
+        except sr.WaitTimeoutError:
+            break
+        if not audio.frame_data:
+            break
+        emitted = source.stream.pos / 2 / SAMPLE_RATE
+        results.append(emitted)
+    return results
+
+
+def bench_vad(data):
+    """VoiceActivityDetector：按 CHUNK 喂入，记录每段的产出时刻"""
+    vad = VoiceActivityDetector(SAMPLE_RATE, threshold=300)
+    results = []
+    step = CHUNK * 2
+    start = time.perf_counter()
+    for pos in range(0, len(data), step):
+        for segment in vad.process(data[pos:pos + step]):
+            emitted = (pos + step) / 2 / SAMPLE_RATE
+            results.append((emitted, segment))
+    cpu = time.perf_counter() - start
+    return results, cpu
+
+
+def main():
+    rng = np.random.default_rng(42)
+    data, ends = build_session(rng)
+    audio_seconds = len(data) / 2 / SAMPLE_RATE
+    print(f"[BENCH] Synthetic session: {audio_seconds:.1f}s audio, {len(ends)} utterances")
+
+    listen_emits = bench_listen(data, ends)
+    print("\n--- recognizer.listen (pause_threshold=0.8) ---")
+    listen_latency = []
+    seen = set()
+    for emitted in listen_emits:
+        end = max([e for e in ends if e <= emitted] or [ends[0]])
+        if end in seen:
+            continue  # 流末尾的纯噪声段
+        seen.add(end)
+        listen_latency.append(emitted - end)
+        print(f"  segment emitted at {emitted:6.2f}s  end-of-speech -> emit {1000 * (emitted - end):6.0f} ms")
+
+    vad_results, cpu = bench_vad(data)
+    print("\n--- VoiceActivityDetector (hangover=300ms) ---")
+    vad_latency = []
+    for emitted, segment in vad_results:
+        latency = emitted - segment.speech_end
+        vad_latency.append(latency)
+        final = " (end of question)" if abs(nearest_end(ends, segment.speech_end) - segment.speech_end) < 0.05 else ""
+        print(f"  segment {segment.start:6.2f}-{segment.end:6.2f}s  emitted at {emitted:6.2f}s  "
+              f"end-of-speech -> emit {1000 * latency:6.0f} ms{final}")
+
+    print("\n--- Summary ---")
+    print(f"  listen: {len(listen_latency)} segments, mean end-of-speech -> emit {1000 * np.mean(listen_latency):.0f} ms")
+    print(f"  VAD:    {len(vad_latency)} segments, mean end-of-speech -> emit {1000 * np.mean(vad_latency):.0f} ms")
+    print(f"  VAD CPU: {1000 * cpu:.1f} ms for {audio_seconds:.1f}s audio ({cpu / audio_seconds * 100:.3f}% realtime)")
+
+
+if __name__ == "__main__":
+    main()
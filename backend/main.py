@@ -1,15 +1,18 @@
-import threading
 import time
 import json
 import os
 import sys
 import io
-from datetime import datetime
-from difflib import SequenceMatcher
-from fastapi import FastAPI
+import uuid
+import asyncio
+from fastapi import FastAPI, Request, Body
 from fastapi.middleware.cors import CORSMiddleware
-from services.audio import AudioService, set_audio_global_state
-from services.matcher import MatchService, set_global_state
+from fastapi.responses import Response, StreamingResponse
+from services.matcher import CardIndex
+from services.cloud_client import get_cloud_client
+from services.card_store import CardStore, VersionConflict
+from services.transcripts import TranscriptLibrary
+from services.sessions import SessionManager, SessionLimitError, DEFAULT_SESSION_ID
 
 # ✨ 修复 Windows 编码问题：确保 stdout/stderr 使用 UTF-8
 if sys.platform == 'win32':
@@ -63,7 +66,8 @@ def get_writable_env_path():
 BASE_PATH = get_base_path()
 DATA_PATH = os.path.join(BASE_PATH, "data")
 TRANSCRIPTS_PATH = os.path.join(DATA_PATH, "transcripts")
-CARDS_FILE = os.path.join(DATA_PATH, "cards.json")
+CARDS_FILE = os.path.join(DATA_PATH, "cards.json")      # 导入/导出格式
+CARDS_DB_FILE = os.path.join(DATA_PATH, "cards.db")
 
 app = FastAPI()
 
@@ -75,163 +79,29 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-audio_service = AudioService()
-match_service = MatchService()
-
-class GlobalState:
-    is_running = False
-    latest_text = ""
-    latest_card = None
-    sentence_buffer = ""       
-    last_update_time = 0
-    
-    # --- 历史记录栈 (回退用) ---
-    card_history = []
-    
-    # --- [NEW] 新增：Transcript 记录 ---
-    transcript_log = []      # 存所有的对话记录 [{time, text}, ...]
-    start_time = 0           # 面试开始的时间戳
-    
-    # ---  云端化：用户 Token ---
-    user_token = None        # 用户的认证 Token，用于调用云端 API
-    
-    # --- 🚨 云端 API 错误状态 ---
-    cloud_api_error = None   # 存储云端 API 错误信息: {"status": 401, "message": "..."}
-
-state = GlobalState()
-
-# 设置 matcher 和 audio 的全局 state 引用
-set_global_state(state)
-set_audio_global_state(state)
-
-# 辅助函数：格式化时间 (把秒数转为 05:30 格式)
-def format_time(seconds):
-    m, s = divmod(int(seconds), 60)
-    return f"{m:02d}:{s:02d}"
-
-# 辅助函数：保存 Transcript 到本地文件
-def save_transcript_to_file():
-    if not state.transcript_log:
-        return
-    
-    # 创建存放目录
-    os.makedirs(TRANSCRIPTS_PATH, exist_ok=True)
-    
-    # 文件名：transcript_2023-10-27_10-30.json
-    filename = f"transcript_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.json"
-    filepath = os.path.join(TRANSCRIPTS_PATH, filename)
-    
-    try:
-        with open(filepath, "w", encoding="utf-8") as f:
-            json.dump(state.transcript_log, f, indent=2, ensure_ascii=False)
-        print(f"💾 Transcript saved to: {filepath}")
-    except Exception as e:
-        print(f"[ERROR] Failed to save transcript: {e}")
-
-# 卡片更新封装函数 (带历史记录)
-def update_card(new_card):
-    if state.latest_card and state.latest_card.get('id') != new_card.get('id'):
-        state.card_history.append(state.latest_card)
-        if len(state.card_history) > 10:
-            state.card_history.pop(0)
-    state.latest_card = new_card
-
-# 防读屏函数
-def is_reading_card(speech_text, card_content):
-    if not card_content or not speech_text:
-        return False
-    speech_clean = speech_text.lower().strip()
-    card_clean = card_content.lower()
-
-    question_starters = [
-        "what", "how", "why", "can you", "could you", 
-        "tell me", "define", "explain", "is it", "do you"
-    ]
-    if any(speech_clean.startswith(q) for q in question_starters):
-        return False
-
-    matcher = SequenceMatcher(None, speech_clean, card_clean)
-    match = matcher.find_longest_match(0, len(speech_clean), 0, len(card_clean))
-    ratio = match.size / len(speech_clean)
-    return ratio > 0.8
-
-def background_listener():
-    print("[THREAD] Background listener started")
-    BUFFER_TIMEOUT = 5.0 
-    
-    # [NEW] 记录开始时间
-    state.start_time = time.time()
-    
-    while state.is_running:
-        text = audio_service.listen_and_transcribe()
-        
-        if text:
-            # --- [NEW] 记录 Transcript ---
-            # 只要识别到一段文本，就记录下来
-            current_time = time.time()
-            elapsed = current_time - state.start_time
-            timestamp_str = format_time(elapsed)
-            
-            log_entry = {
-                "timestamp": timestamp_str,
-                "text": text
-            }
-            state.transcript_log.append(log_entry)
-            # ------------------------
-
-            if state.latest_card and is_reading_card(text, state.latest_card.get('content', '')):
-                print(f"🙊 Detected user reading card: '{text}' -> IGNORED")
-                state.last_update_time = time.time()
-                continue
-
-            # 超时清理
-            if current_time - state.last_update_time > BUFFER_TIMEOUT:
-                if state.sentence_buffer:
-                    print("🧹 Buffer timeout (Reset)")
-                    state.sentence_buffer = ""
-            
-            state.last_update_time = current_time
-            
-            # 防止“Thank you”等短语
-            if state.sentence_buffer and len(state.sentence_buffer.split()) < 3:
-                if current_time - state.last_update_time > 2.0:
-                     print("🧹 Cleared stale short buffer (noise/politeness)")
-                     state.sentence_buffer = ""
-
-            # 拼接
-            current_full_text = (state.sentence_buffer + " " + text).strip()
-            print(f"🧩 Analyzing: [{current_full_text}]")
-            state.latest_text = current_full_text 
-            
-            # --- 逻辑核心 ---
-            card = match_service.find_best_match(current_full_text)
-            
-            if card:
-                print(f"[OK] LOCAL MATCH: {card['topic']}")
-                update_card(card) 
-                state.sentence_buffer = "" 
-            else:
-                # 没找到，尝试 AI 生成
-                if len(current_full_text.split()) > 3:
-                    ai_card = match_service.generate_ai_answer(current_full_text)
-                    
-                    if ai_card:
-                        print(f"🧞‍♂️ AI GENERATED: {ai_card['topic']}")
-                        update_card(ai_card)
-                        state.sentence_buffer = "" 
-                    else:
-                        # AI 拒绝生成
-                        if len(current_full_text.split()) > 8:
-                            print("🧹 Text rejected by AI & too long -> Clearing buffer")
-                            state.sentence_buffer = ""
-                        else:
-                            print("[WAIT] Text kept in buffer...")
-                            state.sentence_buffer = current_full_text
-                else:
-                    state.sentence_buffer = current_full_text
-        
-        time.sleep(0.1)
-    print("[STOP] Stopped")
+# API 和 matcher 共用同一份内存中的卡片
+card_store = CardStore(CARDS_DB_FILE, CARDS_FILE)
+# 卡片索引：所有会话共用
+card_index = CardIndex(card_store)
+# 历史面试记录（带元数据索引）
+transcript_library = TranscriptLibrary(TRANSCRIPTS_PATH)
+# 上次进程异常退出时没来得及结束的面试
+transcript_library.recover()
+
+# 会话管理：每个会话有自己的 state / 流水线 / Token / transcript
+session_manager = SessionManager(card_index, transcript_library)
+# 默认会话：不带 session_id 的请求（单会话客户端）都落到这里
+default_session = session_manager.create(DEFAULT_SESSION_ID)
+
+def get_session(session_id):
+    """按 id 查找会话；不存在返回 None"""
+    return session_manager.get(session_id or DEFAULT_SESSION_ID)
+
+def session_not_found(session_id):
+    return Response(
+        json.dumps({"success": False, "error": f"Session '{session_id}' not found"}),
+        status_code=404, media_type="application/json",
+    )
 
 # --- API 接口区域 ---
 
@@ -241,190 +111,304 @@ def read_root(): return {"status": "ready"}
 @app.get("/health")
 def health_check(): return {"status": "healthy", "service": "RecallAI Backend"}
 
+# --- 会话管理 ---
+
+@app.post("/api/sessions")
+def create_session(data: dict = Body(default={})):
+    """新建一个面试会话（可以带上 token），返回会话 id"""
+    try:
+        session = session_manager.create(data.get("session_id"), device_name=data.get("device"))
+    except SessionLimitError as e:
+        return Response(
+            json.dumps({"success": False, "error": str(e)}),
+            status_code=429, media_type="application/json",
+        )
+    if data.get("token"):
+        session.set_token(data["token"])
+        get_cloud_client().prewarm()
+    return {"success": True, "session_id": session.id}
+
+@app.get("/api/sessions")
+def list_sessions():
+    return {"sessions": [s.info() for s in session_manager.all()], "max_sessions": session_manager.max_sessions}
+
+@app.delete("/api/sessions/{session_id}")
+def delete_session(session_id: str):
+    """停止并删除会话（默认会话不能删除）"""
+    if session_id == DEFAULT_SESSION_ID:
+        return {"success": False, "error": "The default session cannot be deleted"}
+    if not session_manager.remove(session_id):
+        return session_not_found(session_id)
+    return {"success": True}
+
 @app.post("/api/set-token")
-def set_user_token(token_data: dict):
+def set_user_token(token_data: dict, session_id: str = DEFAULT_SESSION_ID):
     """接收并存储前端传来的用户 Token"""
     token = token_data.get("token")
     if not token:
         return {"success": False, "error": "Token is required"}
+    session = get_session(session_id)
+    if session is None:
+        return session_not_found(session_id)
     
-    state.user_token = token
-    # 同时设置到 audio_service 和 match_service
-    audio_service.set_token(token)
-    match_service.set_token(token)
-    print(f"[OK] User token received and stored (length: {len(token)})")
+    # 同时设置到这个会话的 audio 和 matcher
+    session.set_token(token)
+    # 提前建立到云端的连接，第一句话不用等握手
+    get_cloud_client().prewarm()
+    print(f"[OK] User token received and stored for session {session.id} (length: {len(token)})")
     return {"success": True, "msg": "Token stored successfully"}
 
 @app.post("/api/start")
-def start_interview():
-    print(f"[DOWNLOAD] Received START request, current state: is_running={state.is_running}")
+async def start_interview(session_id: str = DEFAULT_SESSION_ID):
+    session = get_session(session_id)
+    if session is None:
+        return session_not_found(session_id)
+    print(f"[DOWNLOAD] Received START request for session {session.id}, current state: is_running={session.state.is_running}")
     
-    if state.is_running: 
+    if not session.start():
         print("[WARN] Already running, ignoring start request")
         return {"msg": "Already running", "is_running": True}
+
+    device = session.audio.get_device_name()
+    sharing = [s.id for s in session_manager.all()
+               if s is not session and s.state.is_running and s.audio.get_device_name() == device]
+    if sharing:
+        print(f"[WARN] Session {session.id} records the same device '{device}' as {sharing}; give each session its own device")
     
-    # [NEW] 重置状态 - 确保清空所有旧数据
-    state.is_running = True
-    state.transcript_log = []  # 清空 transcript 记录
-    state.sentence_buffer = ""
-    state.latest_text = ""
-    state.latest_card = None
-    state.card_history = []
-    state.start_time = time.time()
-    
-    print("[START] Starting background listener thread...")
-    t = threading.Thread(target=background_listener)
-    t.daemon = True
-    t.start()
     print("[OK] Background listener started!")
     return {"msg": "Started", "is_running": True}
 
 @app.post("/api/stop")
-def stop_interview():
-    print(f"[DOWNLOAD] Received STOP request, current state: is_running={state.is_running}")
+def stop_interview(session_id: str = DEFAULT_SESSION_ID):
+    session = get_session(session_id)
+    if session is None:
+        return session_not_found(session_id)
+    print(f"[DOWNLOAD] Received STOP request for session {session.id}, current state: is_running={session.state.is_running}")
     
-    state.is_running = False
-    state.cloud_api_error = None  # 清除错误状态
-    
-    # [NEW] 停止时保存文件（只有当有记录时才保存）
-    if state.transcript_log:
-        save_transcript_to_file()
-        print(f"📝 Saved {len(state.transcript_log)} transcript entries")
-    else:
-        print("[WARN] No transcript to save (empty)")
-    
-    # [NEW] 保存后立即清空，防止重复保存
-    state.transcript_log = []
+    session.stop()
     
     print("[OK] Stopped successfully")
     return {"msg": "Stopped", "is_running": False}
 
+# 推送通道参数
+PUSH_INTERVAL = 0.1         # 检查状态变化的间隔（秒），与前端原来的轮询频率一致
+HEARTBEAT_INTERVAL = 15.0   # 没有变化时发送心跳，防止连接被中间层断开
+GZIP_MIN_SIZE = 1024        # /api/poll 响应超过这个大小才压缩
+POLL_ETAG_PREFIX = uuid.uuid4().hex[:8]   # 快照版本号重启后从 0 开始，ETag 带上进程标识
+
+def sse_event(event, data):
+    """格式化一条 SSE 消息"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.get("/api/events")
+async def stream_events(request: Request, session_id: str = DEFAULT_SESSION_ID):
+    """
+    SSE 推送通道：只发送变化的部分
+    - status / text / card / cloud_error: 值变化时发送
+    - transcript: 只发送新增的条目；新面试开始（列表被替换）时发送 transcript_reset
+    首次连接时所有字段都视为变化，相当于一次完整快照
+    """
+    session = get_session(session_id)
+    if session is None:
+        return session_not_found(session_id)
+    state = session.state
+
+    async def event_stream():
+        unset = object()
+        is_running = text = card = error = unset
+        version, session, sent = None, None, 0
+        last_emit = time.time()
+
+        while not await request.is_disconnected():
+            events = []
+            snapshot = state.snapshot   # 一次取一个完整快照，字段之间一致
+            if snapshot.version != version:
+                version = snapshot.version
+                if snapshot.is_running != is_running:
+                    is_running = snapshot.is_running
+                    events.append(sse_event("status", {"is_running": is_running}))
+                if snapshot.latest_text != text:
+                    text = snapshot.latest_text
+                    events.append(sse_event("text", {"text": text}))
+                if snapshot.latest_card is not card:
+                    card = snapshot.latest_card
+                    events.append(sse_event("card", {"card": card}))
+                if snapshot.cloud_api_error != error:
+                    error = snapshot.cloud_api_error
+                    events.append(sse_event("cloud_error", {"cloud_api_error": error}))
+
+                transcript = snapshot.transcript
+                if snapshot.session_id != session or len(transcript) < sent:
+                    session, sent = snapshot.session_id, len(transcript)
+                    events.append(sse_event("transcript_reset", {"transcript": transcript}))
+                elif len(transcript) > sent:
+                    entries = transcript[sent:]
+                    sent = len(transcript)
+                    events.append(sse_event("transcript", {"entries": entries}))
+
+            if events:
+                last_emit = time.time()
+                yield "".join(events)
+            elif time.time() - last_emit > HEARTBEAT_INTERVAL:
+                last_emit = time.time()
+                yield ": ping\n\n"
+
+            await asyncio.sleep(PUSH_INTERVAL)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @app.get("/api/poll")
-def get_latest_result():
-    # 返回错误状态但不清除（持续显示直到面试停止）
-    error = state.cloud_api_error
-    
-    return {
-        "is_running": state.is_running,
-        "text": state.latest_text,
-        "card": state.latest_card,
-        # [NEW] 返回 transcript 给前端展示
-        "transcript": state.transcript_log,
-        # 🚨 返回云端 API 错误（如果有）
-        "cloud_api_error": error
-    }
+def get_latest_result(request: Request, session_id: str = DEFAULT_SESSION_ID):
+    """
+    轮询接口（推送通道不可用时的后备），响应较大时 gzip 压缩
+    同一版本的快照只序列化/压缩一次；错误状态持续返回直到面试停止
+    """
+    session = get_session(session_id)
+    if session is None:
+        return session_not_found(session_id)
+    snapshot, body, compressed = session.state.serialized(GZIP_MIN_SIZE)
+    etag = f'"{POLL_ETAG_PREFIX}-{session.id}-{snapshot.version}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    if compressed is not None and "gzip" in request.headers.get("accept-encoding", ""):
+        headers.update({"Content-Encoding": "gzip", "Vary": "Accept-Encoding"})
+        return Response(compressed, media_type="application/json", headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
 
 @app.post("/api/rewind")
-def rewind_card():
+def rewind_card(session_id: str = DEFAULT_SESSION_ID):
     """回到上一张卡片"""
-    if state.card_history:
-        previous_card = state.card_history.pop()
+    session = get_session(session_id)
+    if session is None:
+        return session_not_found(session_id)
+    previous_card = session.rewind()
+    if previous_card:
         print(f"⏪ Rewind to: {previous_card['topic']}")
-        state.latest_card = previous_card
         return {"success": True, "topic": previous_card['topic']}
     else:
         print("[WARN] No history to rewind")
         return {"success": False, "msg": "No history"}
 
 @app.get("/api/cards")
-def get_cards():
-    """获取所有 cards"""
-    if os.path.exists(CARDS_FILE):
-        try:
-            with open(CARDS_FILE, 'r', encoding='utf-8') as f:
-                cards = json.load(f)
-            return {"cards": cards}
-        except Exception as e:
-            print(f"Error reading cards: {e}")
-            return {"cards": []}
-    return {"cards": []}
+def get_cards(request: Request):
+    """获取所有 cards（内存缓存 + ETag，内容没变返回 304）"""
+    body, etag = card_store.serialized()
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+def to_backend_card(card):
+    """前端卡片格式 (components 列表) -> 后端格式 (content 字符串)"""
+    return {
+        "id": card.get("id"),
+        "topic": card.get("topic"),
+        "content": "\n".join(card.get("components", [])) if isinstance(card.get("components"), list) else card.get("content", "")
+    }
 
 @app.post("/api/cards")
 def save_cards(cards_data: dict):
-    """保存 cards 到后端（从前端同步）"""
-    os.makedirs(DATA_PATH, exist_ok=True)
-    
+    """保存 cards 到后端（从前端全量同步）"""
     try:
         cards = cards_data.get("cards", [])
         # 转换前端格式到后端格式
-        backend_cards = []
-        for card in cards:
-            backend_card = {
-                "id": card.get("id"),
-                "topic": card.get("topic"),
-                "content": "\n".join(card.get("components", [])) if isinstance(card.get("components"), list) else card.get("content", "")
-            }
-            backend_cards.append(backend_card)
+        backend_cards = [to_backend_card(card) for card in cards]
         
-        with open(CARDS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(backend_cards, f, indent=2, ensure_ascii=False)
+        # 只写有变化的卡片
+        version = card_store.replace(backend_cards)
         
-        # 重新加载 matcher service 的 cards
-        match_service.load_cards()
+        # 更新 matcher service 的索引（直接用内存中的新版本，不再读盘）
+        card_index.load_cards()
         
         print(f"[OK] Saved {len(backend_cards)} cards to backend")
-        return {"success": True, "count": len(backend_cards)}
+        return {"success": True, "count": len(backend_cards), "version": version}
     except Exception as e:
         print(f"[ERROR] Error saving cards: {e}")
         return {"success": False, "error": str(e)}
 
-@app.get("/api/transcripts")
-def get_transcripts():
-    """获取所有保存的 transcript 文件列表"""
-    if not os.path.exists(TRANSCRIPTS_PATH):
-        return {"transcripts": []}
+@app.patch("/api/cards")
+def patch_cards(delta: dict):
+    """
+    增量同步：{"base_version": n, "changed": [card, ...], "deleted": [id, ...]}
+    base_version 不是当前版本时返回 409 和当前版本，客户端需要先重新同步
+    """
+    changed = [to_backend_card(card) for card in delta.get("changed", [])]
+    deleted = delta.get("deleted", [])
+    try:
+        version = card_store.apply_delta(delta.get("base_version"), changed, deleted)
+    except VersionConflict as e:
+        print(f"[WARN] Rejected stale card sync (base {delta.get('base_version')}, current {e.current_version})")
+        return Response(
+            json.dumps({"success": False, "error": "version_conflict", "version": e.current_version}),
+            status_code=409, media_type="application/json",
+        )
+    except Exception as e:
+        print(f"[ERROR] Error syncing cards: {e}")
+        return {"success": False, "error": str(e)}
     
+    # 只重新索引这次改动的卡片
+    card_index.load_cards()
+    print(f"[OK] Synced card delta: {len(changed)} changed, {len(deleted)} deleted (version {version})")
+    return {"success": True, "version": version}
+
+@app.get("/api/cards/search")
+def search_cards(q: str, limit: int = 10):
+    """关键词查找卡片（FTS5）"""
+    return {"cards": card_store.search(q, max(1, min(limit, 50)))}
+
+@app.get("/api/cards/export")
+def export_cards():
+    """导出全部卡片（cards.json 格式）"""
+    cards, _ = card_store.get()
+    headers = {"Content-Disposition": 'attachment; filename="cards.json"'}
+    return Response(json.dumps(cards, indent=2, ensure_ascii=False), media_type="application/json", headers=headers)
+
+@app.post("/api/cards/import")
+def import_cards(cards: list = Body(...)):
+    """从 cards.json 格式导入（替换全部卡片）"""
     try:
-        transcript_list = []
-        files = sorted(os.listdir(TRANSCRIPTS_PATH), reverse=True)  # 最新的在前
-        
-        for filename in files:
-            if filename.endswith('.json'):
-                filepath = os.path.join(TRANSCRIPTS_PATH, filename)
-                try:
-                    with open(filepath, 'r', encoding='utf-8') as f:
-                        transcript_data = json.load(f)
-                    
-                    # 从文件名提取时间戳：transcript_2025-11-23_20-32-58.json
-                    timestamp_str = filename.replace('transcript_', '').replace('.json', '')
-                    
-                    # 解析日期和时间：2025-11-23_20-32-58
-                    parts = timestamp_str.split('_')
-                    if len(parts) == 2:
-                        date_part = parts[0]  # 2025-11-23
-                        time_part = parts[1]  # 20-32-58
-                        
-                        # 转换日期格式：2025-11-23 -> 11/23/2025
-                        date_components = date_part.split('-')
-                        if len(date_components) == 3:
-                            formatted_date = f"{date_components[1]}/{date_components[2]}/{date_components[0]}"
-                            # 转换时间格式：20-32-58 -> 20:32:58
-                            formatted_time = time_part.replace('-', ':')
-                            display_name = f"{formatted_date} {formatted_time}"
-                        else:
-                            display_name = timestamp_str.replace('_', ' ').replace('-', ':')
-                    else:
-                        display_name = timestamp_str.replace('_', ' ').replace('-', ':')
-                    
-                    transcript_list.append({
-                        "id": filename.replace('.json', ''),  # 使用文件名作为ID
-                        "name": display_name,
-                        "timestamp": timestamp_str,
-                        "transcript": transcript_data
-                    })
-                except Exception as e:
-                    print(f"Error reading {filename}: {e}")
-                    continue
-        
-        print(f"[INFO] Found {len(transcript_list)} transcripts")
-        return {"transcripts": transcript_list}
+        version = card_store.replace(cards)
+        card_index.load_cards()
+        print(f"[OK] Imported {len(cards)} cards")
+        return {"success": True, "count": len(card_store.cards), "version": version}
+    except Exception as e:
+        print(f"[ERROR] Error importing cards: {e}")
+        return {"success": False, "error": str(e)}
+
+@app.get("/api/transcripts")
+def get_transcripts(offset: int = 0, limit: int = 50):
+    """分页获取保存的 transcript 列表（只返回元数据，内容用 /api/transcripts/{id} 获取）"""
+    offset = max(0, offset)
+    limit = max(1, min(limit, 200))
+    try:
+        items, total = transcript_library.list(offset, limit)
+        return {"transcripts": items, "total": total, "offset": offset, "limit": limit}
     except Exception as e:
         print(f"[ERROR] Error listing transcripts: {e}")
-        return {"transcripts": []}
+        return {"transcripts": [], "total": 0, "offset": offset, "limit": limit}
+
+@app.get("/api/transcripts/{transcript_id}")
+def get_transcript(transcript_id: str):
+    """获取单场面试的完整 transcript"""
+    transcript = transcript_library.get(transcript_id)
+    if transcript is None:
+        return Response(status_code=404)
+    return transcript
 
 @app.get("/api/mic-device")
-def get_mic_device():
-    """获取当前麦克风设备设置"""
+def get_mic_device(session_id: str = None):
+    """获取当前麦克风设备设置（带 session_id 时返回这个会话的设备）"""
+    if session_id:
+        session = get_session(session_id)
+        if session is None:
+            return session_not_found(session_id)
+        if session.audio.device_name:
+            return {"device": session.audio.device_name}
     env_path = get_writable_env_path()
     print(f"[FILE] Reading .env from: {env_path}")
     try:
@@ -439,11 +423,23 @@ def get_mic_device():
         return {"device": "default"}
 
 @app.post("/api/mic-device")
-def set_mic_device(data: dict):
-    """设置麦克风设备 (default 或 CABLE)"""
+def set_mic_device(data: dict, session_id: str = None):
+    """
+    设置麦克风设备 (default 或 CABLE)
+    - 带 session_id：只改这个会话的设备（多会话同时录音时每个会话一个设备）
+    - 不带：写入 .env 作为默认设备，没有单独设置过设备的会话都跟着切换
+    """
     device = data.get("device", "default")
     if device not in ["default", "CABLE"]:
         return {"success": False, "error": "Invalid device. Must be 'default' or 'CABLE'"}
+
+    if session_id:
+        session = get_session(session_id)
+        if session is None:
+            return session_not_found(session_id)
+        session.audio.reload_device(device)
+        print(f"[OK] Microphone device for session {session.id} changed to: {device}")
+        return {"success": True, "device": device, "session_id": session.id}
     
     env_path = get_writable_env_path()
     print(f"📝 Writing to .env at: {env_path}")
@@ -463,8 +459,10 @@ def set_mic_device(data: dict):
         # 更新环境变量
         os.environ['MIC_DEVICE_NAME'] = device
         
-        # [NEW] 重要：重新加载 audio_service 的设备配置
-        audio_service.reload_device()
+        # [NEW] 重要：重新加载跟随默认设备的会话（单独设置过设备的会话不受影响）
+        for session in session_manager.all():
+            if not session.audio.device_name:
+                session.audio.reload_device()
         
         print(f"[OK] Microphone device changed to: {device}")
         return {"success": True, "device": device}
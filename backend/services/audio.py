@@ -1,18 +1,14 @@
 import speech_recognition as sr
+import asyncio
 import os
 import sys
-import io
 import re
-import requests
+import uuid
+from collections import deque, namedtuple
+import numpy as np
 from dotenv import load_dotenv
-
-# 全局 state 引用（与 matcher.py 相同的机制）
-_global_state = None
-
-def set_audio_global_state(state):
-    """从 main.py 设置全局 state 引用"""
-    global _global_state
-    _global_state = state
+from services.cloud_client import get_cloud_client
+from services.noise_profile import NoiseFloorTracker
 
 def get_base_path():
     """获取程序运行的基础路径，支持开发和打包环境"""
@@ -32,12 +28,175 @@ else:
     load_dotenv()  # 尝试从默认位置加载
     print(f"[WARN] .env not found at {env_path}, using default")
 
-# 获取 Render 云端 URL
-RENDER_URL = os.getenv("RENDER_URL", "https://recallai-d9sc.onrender.com")
+# 上传格式：重采样到 16 kHz 单声道 16-bit，优先 FLAC（由云端 /formats 协商）
+UPLOAD_SAMPLE_RATE = 16000
+UPLOAD_MIME_TYPES = {"flac": "audio/flac", "wav": "audio/wav"}
+
+# 流式转录：说话中每隔 STREAM_PARTIAL_INTERVAL 秒上传一块 16 kHz PCM，拿到部分转录
+# 费用：云端每次都转录整句音频，partial 只在音频长度翻倍时转录（1、2、4、8 秒 ...），
+# 加上 final，一句话的转录量约为时长的 2 倍、请求数 log2(时长) + 1 次（Groq 每个请求按最少 10 秒计费）
+STREAMING_TRANSCRIBE = os.getenv("STREAMING_TRANSCRIBE", "0") == "1"
+STREAM_PARTIAL_INTERVAL = float(os.getenv("STREAM_PARTIAL_INTERVAL", "1.0"))
+
+# VAD 切出的一段语音
+# start / end: 段在音频流中的起止时间（秒）；speech_end: 最后一个有声帧的结束时间
+# stream_id: 同一句话的编号；final: 是否是这句话的最后一块（流式模式下才会有 final=False）
+Segment = namedtuple("Segment", ["data", "start", "end", "speech_end", "stream_id", "final"],
+                     defaults=(0, True))
+
+
+class VoiceActivityDetector:
+    """
+    帧级语音活动检测（16-bit PCM，NumPy 计算帧能量）
+    - 静音持续 hangover_ms 即切段（recognizer.listen 需要 0.8 秒）
+    - 段长超过 soft_limit_s 后，遇到 soft_pause_ms 的短停顿就提前切段，
+      长问题不用等到说完才开始转录
+    - 段长到 max_segment_s 强制切段
+    - partial_interval_s: 流式模式，说话中每隔这么久产出一块新增音频（final=False）
+    """
+
+    def __init__(self, sample_rate, noise=None, threshold=300.0, frame_ms=30,
+                 hangover_ms=300, min_speech_ms=200, preroll_ms=150,
+                 soft_limit_s=4.0, soft_pause_ms=120, max_segment_s=15.0,
+                 partial_interval_s=None):
+        self.sample_rate = sample_rate
+        self.noise = noise
+        self.fixed_threshold = threshold
+        self.frame_len = max(1, int(sample_rate * frame_ms / 1000))
+        self.frame_s = self.frame_len / sample_rate
+
+        frames = lambda ms: max(1, int(round(ms / 1000 / self.frame_s)))
+        self.hangover_frames = frames(hangover_ms)
+        self.min_speech_frames = frames(min_speech_ms)
+        self.soft_pause_frames = frames(soft_pause_ms)
+        self.soft_limit_frames = frames(soft_limit_s * 1000)
+        self.max_segment_frames = frames(max_segment_s * 1000)
+        self.partial_frames = frames(partial_interval_s * 1000) if partial_interval_s else None
+
+        self._remainder = b""
+        self._preroll = deque(maxlen=frames(preroll_ms))
+        self._frames = []          # 当前段的帧
+        self._in_speech = False
+        self._silence_run = 0
+        self._voiced_count = 0
+        self._seg_start = 0.0
+        self._last_voiced_end = 0.0
+        self._position = 0         # 已处理的帧数
+        self._emitted = 0          # 当前段里已经作为 partial 产出的帧数
+        self._stream_id = 0
+
+    @property
+    def threshold(self):
+        if self.noise is not None and self.noise.calibrated:
+            return self.noise.threshold()
+        return self.fixed_threshold
+
+    def _frame_energies(self, data):
+        samples = np.frombuffer(data, dtype=np.int16).astype(np.float32)
+        frames = samples.reshape(-1, self.frame_len)
+        return np.sqrt(np.mean(frames * frames, axis=1))
+
+    def _cut(self):
+        """结束当前段，去掉多余的尾部静音；有声帧太少则丢弃"""
+        keep_tail = min(self._silence_run, self._preroll.maxlen)
+        end_index = max(self._emitted, len(self._frames) - self._silence_run + keep_tail)
+        segment = None
+        # 已经产出过 partial 的段必须有 final 收尾
+        if self._emitted or self._voiced_count >= self.min_speech_frames:
+            segment = Segment(
+                data=b"".join(self._frames[self._emitted:end_index]),
+                start=self._seg_start + self._emitted * self.frame_s,
+                end=self._seg_start + end_index * self.frame_s,
+                speech_end=self._last_voiced_end,
+                stream_id=self._stream_id,
+                final=True,
+            )
+        self._frames = []
+        self._emitted = 0
+        self._in_speech = False
+        self._silence_run = 0
+        self._voiced_count = 0
+        self._preroll.clear()
+        return segment
+
+    def process(self, data):
+        """喂入任意长度的 PCM，返回这次切出的 [Segment, ...]"""
+        data = self._remainder + data
+        usable = len(data) - len(data) % (self.frame_len * 2)
+        self._remainder = data[usable:]
+        if usable == 0:
+            return []
+
+        chunk = data[:usable]
+        energies = self._frame_energies(chunk)
+        voiced = energies > self.threshold
+
+        segments = []
+        quiet = []                 # 段外的静音帧能量，用于更新底噪
+        step = self.frame_len * 2
+        for i, is_voiced in enumerate(voiced):
+            frame = chunk[i * step:(i + 1) * step]
+            frame_start = self._position * self.frame_s
+            self._position += 1
+
+            if not self._in_speech:
+                if not is_voiced:
+                    self._preroll.append(frame)
+                    quiet.append(energies[i])
+                    continue
+                # 语音开始：带上一小段前导音频
+                self._in_speech = True
+                self._stream_id += 1
+                self._frames = list(self._preroll)
+                self._seg_start = frame_start - len(self._preroll) * self.frame_s
+                self._preroll.clear()
+
+            self._frames.append(frame)
+            if is_voiced:
+                self._silence_run = 0
+                self._voiced_count += 1
+                self._last_voiced_end = frame_start + self.frame_s
+            else:
+                self._silence_run += 1
+
+            seg_frames = len(self._frames)
+            if (self._silence_run >= self.hangover_frames
+                    or (seg_frames >= self.soft_limit_frames and self._silence_run >= self.soft_pause_frames)
+                    or seg_frames >= self.max_segment_frames):
+                segment = self._cut()
+                if segment:
+                    segments.append(segment)
+            elif (self.partial_frames and self._voiced_count >= self.min_speech_frames
+                    and len(self._frames) - self._emitted >= self.partial_frames):
+                # 流式：说话中产出新增的音频块
+                segments.append(Segment(
+                    data=b"".join(self._frames[self._emitted:]),
+                    start=self._seg_start + self._emitted * self.frame_s,
+                    end=self._seg_start + len(self._frames) * self.frame_s,
+                    speech_end=self._last_voiced_end,
+                    stream_id=self._stream_id,
+                    final=False,
+                ))
+                self._emitted = len(self._frames)
+
+        if self.noise is not None:
+            self.noise.observe(quiet, energies)
+        return segments
+
+    def flush(self):
+        """流结束时输出未完成的段"""
+        if not self._in_speech:
+            return None
+        return self._cut()
+
 
 class AudioService:
-    def __init__(self):
+    def __init__(self, state=None, device_name=None):
         self.recognizer = sr.Recognizer()
+        # 云端错误写到这个会话的 state（None = 不上报）
+        self.state = state
+        # 这个会话自己的麦克风（None = 跟随 .env 里的 MIC_DEVICE_NAME）
+        self.device_name = device_name
         
         # --- 你的稳健设置 ---
         self.recognizer.pause_threshold = 0.8
@@ -49,23 +208,54 @@ class AudioService:
         
         # ---  云端化：用户 Token (需要从外部设置) ---
         self.user_token = None
+        # 共享的云端连接池
+        self.cloud = get_cloud_client()
+        # 协商后的上传格式（None = 尚未协商）
+        self.upload_format = None
+        self.streaming_supported = False
+        # 流式转录的 stream id 前缀（区分不同进程/会话）
+        self.stream_prefix = uuid.uuid4().hex[:8]
+
+        # --- 底噪跟踪：按设备保存校准结果，不再每句话都校准 0.5 秒 ---
+        self.noise = NoiseFloorTracker(os.path.join(get_base_path(), "data", "noise_profiles.json"))
+        self._load_noise_profile()
     
     def set_token(self, token: str):
         """设置用户 Token，用于云端 API 鉴权"""
         self.user_token = token
     
-    def reload_device(self):
-        """重新读取设备配置（用于切换麦克风/CABLE）"""
+    def get_device_name(self):
+        """这个会话实际使用的设备名：会话自己的设置优先，否则用 MIC_DEVICE_NAME"""
+        return self.device_name or os.getenv("MIC_DEVICE_NAME", "Default") or "Default"
+
+    def reload_device(self, device_name=None):
+        """重新读取设备配置（用于切换麦克风/CABLE）；传入 device_name 时只改这个会话"""
+        if device_name is not None:
+            self.device_name = device_name
         print("[RELOAD] Reloading audio device configuration...")
         self.target_device_index = self._find_device_index()
+        self._load_noise_profile()
         device_status = f"Index {self.target_device_index}" if self.target_device_index is not None else "Default Mic"
         print(f"[OK] Audio device updated to: [{device_status}]")
         
+    def _load_noise_profile(self):
+        """读取当前设备上次保存的底噪校准"""
+        device = self.get_device_name()
+        if self.noise.load(device):
+            self.recognizer.energy_threshold = self.noise.threshold()
+            print(f"[MIC] Reusing noise profile for '{device}' (threshold={self.recognizer.energy_threshold:.0f})")
+        else:
+            print(f"[MIC] No noise profile for '{device}', will calibrate once")
+
+    def save_noise_profile(self):
+        """保存当前设备的底噪校准（停止面试时调用）"""
+        self.noise.save()
+
     def _find_device_index(self):
         """
-        根据 .env 中的 MIC_DEVICE_NAME 查找设备索引
+        根据会话的设备名（默认是 .env 中的 MIC_DEVICE_NAME）查找设备索引
         """
-        target_name = os.getenv("MIC_DEVICE_NAME", "Default")
+        target_name = self.get_device_name()
         
         # 如果配置是 Default 或空，使用系统默认
         if not target_name or target_name.lower() == 'default':
@@ -87,7 +277,11 @@ class AudioService:
         print(f"[WARN] Device '{target_name}' not found! Falling back to Default Mic.")
         return None
 
-    def listen_and_transcribe(self):
+    def capture(self):
+        """
+        录音阶段：阻塞直到录到一段语音
+        返回: sr.AudioData 或 None（超时/出错）
+        """
         # 显示当前正在监听哪个设备，方便调试
         device_status = f"Index {self.target_device_index}" if self.target_device_index is not None else "Default Mic"
         print(f"[MIC] Listening on [{device_status}]... (Using Groq Turbo)")
@@ -95,81 +289,244 @@ class AudioService:
         try:
             # 关键修改：传入 device_index
             with sr.Microphone(device_index=self.target_device_index) as source:
-                self.recognizer.adjust_for_ambient_noise(source, duration=0.5)
+                # 只在没有校准数据时校准一次，之后由 noise tracker 持续更新
+                if not self.noise.calibrated:
+                    self.recognizer.adjust_for_ambient_noise(source, duration=0.5)
+                    self.noise.calibrate(self.recognizer.energy_threshold)
+                    print(f"[MIC] Calibrated noise floor (threshold={self.recognizer.energy_threshold:.0f})")
                 # 录音参数
                 audio_data = self.recognizer.listen(source, timeout=5, phrase_time_limit=20)
-                print("[WAIT] Transcribing...")
 
-            wav_bytes = audio_data.get_wav_data()
-            audio_file = io.BytesIO(wav_bytes)
-            audio_file.name = "audio.wav" 
+            # 用这段录音里的安静帧更新底噪和能量阈值
+            threshold = self.noise.update(audio_data.get_raw_data(convert_width=2), audio_data.sample_rate)
+            if threshold is not None:
+                self.recognizer.energy_threshold = threshold
+            return audio_data
+        except sr.WaitTimeoutError:
+            return None
+        except Exception as e:
+            print(f"[ERROR] Audio Error: {e}")
+            return None
 
-            # 使用云端 API (Render) 进行转录
-            if not self.user_token:
-                print("[ERROR] No user token set! Please call set_token() first")
-                return None
-            
+    def _negotiate_upload_format(self):
+        """向云端查询支持的上传格式和流式能力（只查一次；网络失败下次再查）"""
+        if self.upload_format is not None:
+            return self.upload_format
+        response = self.cloud.get("/v1/proxy/transcribe/formats")
+        if response is None:
+            return "wav"
+        try:
+            caps = response.json() if response.status_code == 200 else {}
+        except ValueError:
+            caps = {}
+        self.upload_format = "flac" if "flac" in caps.get("formats", []) else "wav"
+        self.streaming_supported = bool(caps.get("streaming"))
+        print(f"[MIC] Upload format negotiated: {self.upload_format} (streaming={self.streaming_supported})")
+        return self.upload_format
+
+    def streaming_enabled(self):
+        """STREAMING_TRANSCRIBE=1 且云端支持流式接口"""
+        if not STREAMING_TRANSCRIBE:
+            return False
+        self._negotiate_upload_format()
+        return self.streaming_supported
+
+    def _encode_upload(self, audio_data):
+        """重采样到 16 kHz + 编码，返回 (filename, bytes, mime)"""
+        # 只降采样，不升采样
+        rate = UPLOAD_SAMPLE_RATE if audio_data.sample_rate > UPLOAD_SAMPLE_RATE else None
+        fmt = self._negotiate_upload_format()
+        if fmt == "flac":
             try:
-                # 准备文件和请求头
-                files = {'file': ('audio.wav', audio_file, 'audio/wav')}
-                headers = {'Authorization': f'Bearer {self.user_token}'}
-                
-                # 发送请求到 Render 云端
-                response = requests.post(
-                    f"{RENDER_URL}/v1/proxy/transcribe",
-                    files=files,
-                    headers=headers,
-                    timeout=30
-                )
-                
-                if response.status_code != 200:
-                    print(f"[ERROR] Cloud API Error: {response.status_code}")
-                    print(f"   Response: {response.text}")
-                    if _global_state is not None:
-                        _global_state.cloud_api_error = {"status": response.status_code, "message": response.text}
-                    return None
-                
-                result = response.json()
-                text = result.get("text", "").strip()
-                
-            except requests.exceptions.RequestException as e:
-                print(f"[ERROR] Request Error: {e}")
-                return None
-            except Exception as e:
-                print(f"[ERROR] Unexpected Error: {e}")
-                return None
-
-            # --- 增强的垃圾词过滤 ---
-            # 1. 完全匹配过滤（忽略大小写和标点）
-            hallucinations = [
-                "thank you", "thanks", "you", "yeah", "yes", "okay", "ok", 
-                "um", "uh", "hmm", "mhm", "ah", "oh", "well"
-            ]
-            
-            # 清理后的文本（去除标点符号）
-            text_clean = re.sub(r'[^\w\s]', '', text.lower())
-            
-            # 2. 如果整句话就是垃圾词
-            if text_clean in hallucinations:
-                print(f"[FILTER] Filtered Hallucination (exact): '{text}'")
-                return None
-            
-            # 3. 如果句子很短（<8个字符）且包含thank/you等关键词
-            if len(text) < 8 and any(word in text_clean for word in ["thank", "you", "thanks"]):
-                print(f"[FILTER] Filtered Hallucination (short): '{text}'")
-                return None
-            
-            # 4. 如果只有1-2个单词且是常见礼貌用语
-            words = text_clean.split()
-            if len(words) <= 2 and all(w in hallucinations for w in words):
-                print(f"[FILTER] Filtered Hallucination (polite): '{text}'")
-                return None
+                data = audio_data.get_flac_data(convert_rate=rate, convert_width=2)
+                return "audio.flac", data, UPLOAD_MIME_TYPES["flac"]
+            except OSError as e:
+                # 没有可用的 flac 编码器，之后都用 WAV
+                print(f"[WARN] FLAC encoder unavailable ({e}), falling back to WAV")
+                self.upload_format = "wav"
+        data = audio_data.get_wav_data(convert_rate=rate, convert_width=2)
+        return "audio.wav", data, UPLOAD_MIME_TYPES["wav"]
+
+    def _is_hallucination(self, text):
+        """Whisper 在静音/噪声上常见的幻觉短语"""
+        # --- 增强的垃圾词过滤 ---
+        # 1. 完全匹配过滤（忽略大小写和标点）
+        hallucinations = [
+            "thank you", "thanks", "you", "yeah", "yes", "okay", "ok", 
+            "um", "uh", "hmm", "mhm", "ah", "oh", "well"
+        ]
+        
+        # 清理后的文本（去除标点符号）
+        text_clean = re.sub(r'[^\w\s]', '', text.lower())
+        
+        # 2. 如果整句话就是垃圾词
+        if text_clean in hallucinations:
+            print(f"[FILTER] Filtered Hallucination (exact): '{text}'")
+            return True
+        
+        # 3. 如果句子很短（<8个字符）且包含thank/you等关键词
+        if len(text) < 8 and any(word in text_clean for word in ["thank", "you", "thanks"]):
+            print(f"[FILTER] Filtered Hallucination (short): '{text}'")
+            return True
+        
+        # 4. 如果只有1-2个单词且是常见礼貌用语
+        words = text_clean.split()
+        if len(words) <= 2 and all(w in hallucinations for w in words):
+            print(f"[FILTER] Filtered Hallucination (polite): '{text}'")
+            return True
+        return False
 
-            print(f"[VOICE] You said: {text}")
-            return text
+    def _transcribe_request(self, audio_data):
+        """编码一段录音，返回上传参数 (files, headers)；没有 Token 或编码失败返回 None"""
+        if not self.user_token:
+            print("[ERROR] No user token set! Please call set_token() first")
+            return None
+        try:
+            # 准备文件和请求头（16 kHz FLAC，比原始 WAV 小很多）
+            filename, upload_bytes, mime = self._encode_upload(audio_data)
+        except Exception as e:
+            print(f"[ERROR] Unexpected Error: {e}")
+            return None
+        raw_size = len(audio_data.frame_data)
+        print(f"[UPLOAD] {filename}: {len(upload_bytes) / 1024:.0f} KB (raw {raw_size / 1024:.0f} KB)")
+        files = {'file': (filename, upload_bytes, mime)}
+        headers = {'Authorization': f'Bearer {self.user_token}'}
+        return files, headers
 
-        except sr.WaitTimeoutError:
+    def _transcribe_result(self, response):
+        """解析转录响应并过滤垃圾词；返回 文本 或 None"""
+        # 网络错误/熔断时 response 为 None
+        if response is None:
             return None
+
+        if response.status_code != 200:
+            print(f"[ERROR] Cloud API Error: {response.status_code}")
+            print(f"   Response: {response.text}")
+            return None
+
+        try:
+            text = response.json().get("text", "").strip()
         except Exception as e:
-            print(f"[ERROR] Audio Error: {e}")
-            return None
\ No newline at end of file
+            print(f"[ERROR] Unexpected Error: {e}")
+            return None
+
+        if self._is_hallucination(text):
+            return None
+
+        print(f"[VOICE] You said: {text}")
+        return text
+
+    def transcribe(self, audio_data):
+        """
+        转录阶段：上传到云端并过滤垃圾词（线程安全，可在 worker 中并发调用）
+        返回: 文本 或 None
+        """
+        print("[WAIT] Transcribing...")
+        request = self._transcribe_request(audio_data)
+        if request is None:
+            return None
+        files, headers = request
+        # 发送请求到 Render 云端（复用连接池）
+        response = self.cloud.post("/v1/proxy/transcribe", files=files, headers=headers, state=self.state)
+        return self._transcribe_result(response)
+
+    async def atranscribe(self, audio_data):
+        """transcribe 的异步版本（asyncio 流水线使用）：编码放到线程里，上传可以随时取消"""
+        print("[WAIT] Transcribing...")
+        request = await asyncio.to_thread(self._transcribe_request, audio_data)
+        if request is None:
+            return None
+        files, headers = request
+        response = await self.cloud.apost("/v1/proxy/transcribe", files=files, headers=headers, state=self.state)
+        return self._transcribe_result(response)
+
+    def _chunk_request(self, segment, audio_data):
+        """流式上传参数 (files, data, headers)；没有 Token 返回 None"""
+        if not self.user_token:
+            print("[ERROR] No user token set! Please call set_token() first")
+            return None
+        pcm = audio_data.get_raw_data(
+            convert_rate=UPLOAD_SAMPLE_RATE if audio_data.sample_rate != UPLOAD_SAMPLE_RATE else None,
+            convert_width=2,
+        )
+        files = {'file': ('chunk.pcm', pcm, 'audio/L16')}
+        data = {
+            'stream_id': f"{self.stream_prefix}-{segment.stream_id}",
+            'final': 'true' if segment.final else 'false',
+        }
+        headers = {'Authorization': f'Bearer {self.user_token}'}
+        return files, data, headers
+
+    def _chunk_result(self, segment, response):
+        """解析流式转录响应；返回 到目前为止这句话的文本 或 None"""
+        if response is None or response.status_code != 200:
+            return None
+        try:
+            text = response.json().get("text", "").strip()
+        except Exception as e:
+            print(f"[ERROR] Unexpected Error: {e}")
+            return None
+
+        if not text or (segment.final and self._is_hallucination(text)):
+            return None
+        print(f"[VOICE] {'You said' if segment.final else 'Partial'}: {text}")
+        return text
+
+    def transcribe_chunk(self, segment, audio_data):
+        """
+        流式转录：上传一块新增音频（16 kHz PCM），云端按 stream_id 累积
+        返回: 到目前为止这句话的转录文本 或 None
+        """
+        request = self._chunk_request(segment, audio_data)
+        if request is None:
+            return None
+        files, data, headers = request
+        response = self.cloud.post("/v1/proxy/transcribe/stream", files=files, data=data, headers=headers, state=self.state)
+        return self._chunk_result(segment, response)
+
+    async def atranscribe_chunk(self, segment, audio_data):
+        """transcribe_chunk 的异步版本"""
+        request = self._chunk_request(segment, audio_data)
+        if request is None:
+            return None
+        files, data, headers = request
+        response = await self.cloud.apost("/v1/proxy/transcribe/stream", files=files, data=data, headers=headers, state=self.state)
+        return self._chunk_result(segment, response)
+
+    def stream_segments(self, is_running, partial_interval_s=None):
+        """
+        常开麦克风 + VAD 分段（流水线录音阶段使用）
+        在自然停顿处切段并立即产出，转录可以在对方还在说话时开始
+        is_running: 返回 False 时停止
+        partial_interval_s: 流式模式下说话中产出部分音频块的间隔
+        产出: (Segment, sr.AudioData)
+        """
+        device_status = f"Index {self.target_device_index}" if self.target_device_index is not None else "Default Mic"
+        print(f"[MIC] Streaming on [{device_status}] with VAD segmentation")
+
+        with sr.Microphone(device_index=self.target_device_index) as source:
+            if not self.noise.calibrated:
+                self.recognizer.adjust_for_ambient_noise(source, duration=0.5)
+                self.noise.calibrate(self.recognizer.energy_threshold)
+                print(f"[MIC] Calibrated noise floor (threshold={self.recognizer.energy_threshold:.0f})")
+
+            # 每次打开麦克风换一个 stream id 前缀，VAD 的句子编号从 1 重新开始
+            self.stream_prefix = uuid.uuid4().hex[:8]
+            vad = VoiceActivityDetector(source.SAMPLE_RATE, noise=self.noise, partial_interval_s=partial_interval_s)
+            while is_running():
+                buffer = source.stream.read(source.CHUNK)
+                if not buffer:
+                    break
+                for segment in vad.process(buffer):
+                    yield segment, sr.AudioData(segment.data, source.SAMPLE_RATE, source.SAMPLE_WIDTH)
+
+            segment = vad.flush()
+            if segment:
+                yield segment, sr.AudioData(segment.data, source.SAMPLE_RATE, source.SAMPLE_WIDTH)
+
+    def listen_and_transcribe(self):
+        """录音 + 转录（串行版本，run.interview.py 使用）"""
+        audio_data = self.capture()
+        if audio_data is None:
+            return None
+        return self.transcribe(audio_data)
@@ -0,0 +1,325 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from collections import deque
+
+# 进程内卡片存储：API 和 MatchService 共用同一份数据
+# - 数据保存在 SQLite (cards.db)，单张卡片的增改删只写一行
+# - FTS5 全文索引提供关键词查找
+# - cards.json 只作为导入/导出格式：首次启动或文件被外部修改时导入
+# - version: 内容每变化一次 +1（持久化），MatchService 据此判断是否需要重建索引
+# - etag: 内容哈希，GET /api/cards 用来返回 304
+# - 最近的变更记录在内存里，apply_delta 拒绝基于旧版本的写入，
+#   MatchService 通过 changes_since 只更新变化的卡片
+
+
+def _fts5_available():
+    try:
+        conn = sqlite3.connect(":memory:")
+        conn.execute("CREATE VIRTUAL TABLE t USING fts5(x)")
+        conn.close()
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+FTS5_AVAILABLE = _fts5_available()
+
+CARD_FIELDS = ("id", "topic", "content")
+
+# 内存中保留的变更记录条数；落后更多版本的读者需要全量重建
+CHANGELOG_SIZE = 256
+
+
+class VersionConflict(Exception):
+    """写入基于的版本已经过时（其他客户端先写了）"""
+
+    def __init__(self, current_version):
+        super().__init__(f"Card store is at version {current_version}")
+        self.current_version = current_version
+
+
+def _normalize(card):
+    return {
+        "id": card.get("id"),
+        "topic": card.get("topic") or "",
+        "content": card.get("content") or "",
+    }
+
+
+class CardStore:
+    def __init__(self, db_path, json_path=None):
+        self.db_path = db_path
+        self.json_path = json_path
+        self._lock = threading.RLock()
+        self.cards = []            # 按 position 排序
+        self._by_id = {}
+        self.version = 0
+        self.etag = None
+        self.body = None           # 预先序列化的 {"cards": [...]} 响应体（按需生成）
+        self._body_version = None
+        self._json_stat = None
+        self._changelog = deque(maxlen=CHANGELOG_SIZE)   # [(version, 修改的 id, 删除的 id)]
+
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._create_schema()
+        self._load()
+        self._import_if_changed()
+
+    # ---------- 数据库 ----------
+
+    def _create_schema(self):
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS cards ("
+                "rowid INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE, position INTEGER NOT NULL, "
+                "topic TEXT, content TEXT)"
+            )
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            if FTS5_AVAILABLE:
+                # 全文索引的 rowid 与 cards.rowid 一致
+                self._conn.execute(
+                    "CREATE VIRTUAL TABLE IF NOT EXISTS cards_fts USING fts5("
+                    "topic, content, tokenize='porter unicode61')"
+                )
+
+    def _get_meta(self, key, default=None):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set_meta(self, key, value):
+        self._conn.execute(
+            "INSERT INTO meta (key, value) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value", (key, str(value))
+        )
+
+    def _load(self):
+        rows = self._conn.execute("SELECT id, topic, content FROM cards ORDER BY position").fetchall()
+        self.cards = [dict(zip(CARD_FIELDS, row)) for row in rows]
+        self._by_id = {c["id"]: c for c in self.cards}
+        self.version = int(self._get_meta("version", 0))
+
+    def _write_rows(self, upserts, deletes, positions):
+        """
+        一个事务里写入变化的行并把版本号 +1（需持有锁）
+        upserts: [card]，deletes: [id]，positions: {id: position}（只包含位置变化的卡片）
+        """
+        with self._conn:
+            for card_id in deletes:
+                row = self._conn.execute("DELETE FROM cards WHERE id = ? RETURNING rowid", (card_id,)).fetchone()
+                if FTS5_AVAILABLE and row:
+                    self._conn.execute("DELETE FROM cards_fts WHERE rowid = ?", row)
+            for card in upserts:
+                row = self._conn.execute(
+                    "INSERT INTO cards (id, position, topic, content) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(id) DO UPDATE SET topic = excluded.topic, content = excluded.content "
+                    "RETURNING rowid",
+                    (card["id"], positions.get(card["id"], 0), card["topic"], card["content"]),
+                ).fetchone()
+                if FTS5_AVAILABLE:
+                    self._conn.execute("DELETE FROM cards_fts WHERE rowid = ?", row)
+                    self._conn.execute(
+                        "INSERT INTO cards_fts (rowid, topic, content) VALUES (?, ?, ?)",
+                        (row[0], card["topic"], card["content"]),
+                    )
+            for card_id, position in positions.items():
+                self._conn.execute("UPDATE cards SET position = ? WHERE id = ?", (position, card_id))
+            self.version += 1
+            self._set_meta("version", self.version)
+        self._changelog.append((self.version, {c["id"] for c in upserts}, set(deletes)))
+
+    def _apply(self, cards):
+        """把内存中的卡片列表替换为 cards（需持有锁）"""
+        self.cards = cards
+        self._by_id = {c["id"]: c for c in cards}
+
+    # ---------- 导入 / 导出 ----------
+
+    def _file_stat(self):
+        try:
+            st = os.stat(self.json_path)
+            return f"{st.st_mtime_ns}:{st.st_size}"
+        except (FileNotFoundError, TypeError):
+            return None
+
+    def _import_if_changed(self):
+        """cards.json 在上次导入之后被修改过（或从未导入）时导入一次"""
+        stat = self._file_stat()
+        if stat is None or stat == self._json_stat:
+            return False
+        with self._lock:
+            if stat == self._get_meta("json_stat"):
+                self._json_stat = stat
+                return False
+            try:
+                print(f"[FILE] Importing cards from: {self.json_path}")
+                with open(self.json_path, "r", encoding="utf-8") as f:
+                    cards = json.load(f)
+            except Exception as e:
+                print(f"Error loading cards: {e}")
+                self._json_stat = stat
+                return False
+            self.replace(cards)
+            with self._conn:
+                self._set_meta("json_stat", stat)
+            self._json_stat = stat
+            return True
+
+    def export_json(self, path=None):
+        """导出全部卡片为 JSON（先写临时文件再替换）"""
+        path = path or self.json_path
+        with self._lock:
+            cards = list(self.cards)
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(cards, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_path, path)
+            if path == self.json_path:
+                # 自己写出的文件不需要再导入
+                self._json_stat = self._file_stat()
+                with self._conn:
+                    self._set_meta("json_stat", self._json_stat)
+        return len(cards)
+
+    # ---------- 读 ----------
+
+    def refresh(self):
+        """cards.json 被外部修改时重新导入；返回当前版本号"""
+        self._import_if_changed()
+        return self.version
+
+    def get(self):
+        """返回 (cards, version)"""
+        self.refresh()
+        with self._lock:
+            return self.cards, self.version
+
+    def changes_since(self, version):
+        """
+        返回 (cards, 当前版本, changed_ids, deleted_ids)
+        变更记录不够（版本太旧或 version 为 None）时 changed_ids/deleted_ids 为 None，调用方应全量重建
+        """
+        self.refresh()
+        with self._lock:
+            if version == self.version:
+                return self.cards, self.version, set(), set()
+            if (version is None or version > self.version or not self._changelog
+                    or self._changelog[0][0] > version + 1):
+                return self.cards, self.version, None, None
+            changed, deleted = set(), set()
+            for entry_version, entry_changed, entry_deleted in self._changelog:
+                if entry_version <= version:
+                    continue
+                changed -= entry_deleted
+                deleted -= entry_changed
+                changed |= entry_changed
+                deleted |= entry_deleted
+            return self.cards, self.version, changed, deleted
+
+    def serialized(self):
+        """返回 (响应体 bytes, etag)，响应体为 {"cards": [...], "version": n}"""
+        self.refresh()
+        with self._lock:
+            if self._body_version != self.version:
+                self.body = json.dumps({"cards": self.cards, "version": self.version}, ensure_ascii=False).encode("utf-8")
+                self.etag = '"' + hashlib.sha1(self.body).hexdigest() + '"'
+                self._body_version = self.version
+            return self.body, self.etag
+
+    def search(self, query, limit=10):
+        """FTS5 关键词查找，按 bm25 排序返回卡片"""
+        terms = [t for t in "".join(ch if ch.isalnum() else " " for ch in query.lower()).split() if t]
+        if not terms:
+            return []
+        with self._lock:
+            if FTS5_AVAILABLE:
+                match = " OR ".join(f'"{t}"' for t in terms)
+                rows = self._conn.execute(
+                    "SELECT cards.id FROM cards_fts JOIN cards ON cards.rowid = cards_fts.rowid "
+                    "WHERE cards_fts MATCH ? ORDER BY bm25(cards_fts, 3.0, 1.0) LIMIT ?",
+                    (match, limit),
+                ).fetchall()
+            else:
+                like = f"%{terms[0]}%"
+                rows = self._conn.execute(
+                    "SELECT id FROM cards WHERE topic LIKE ? OR content LIKE ? ORDER BY position LIMIT ?",
+                    (like, like, limit),
+                ).fetchall()
+            return [self._by_id[row[0]] for row in rows if row[0] in self._by_id]
+
+    # ---------- 写 ----------
+
+    def _apply_changes(self, cards, deleted):
+        """新增/修改 cards 并删除 deleted，一个事务、版本号只 +1（需持有锁）"""
+        deleted = [card_id for card_id in dict.fromkeys(deleted) if card_id in self._by_id]
+        removed = set(deleted)
+        changed = {}
+        positions = {}
+        next_position = self._conn.execute("SELECT COALESCE(MAX(position), -1) + 1 FROM cards").fetchone()[0]
+        for card in map(_normalize, cards):
+            if not card["id"] or card["id"] in removed:
+                continue
+            existing = self._by_id.get(card["id"])
+            if existing == card:
+                continue
+            if existing is None and card["id"] not in positions:
+                positions[card["id"]] = next_position
+                next_position += 1
+            changed[card["id"]] = card
+        if not changed and not deleted:
+            return self.version
+        self._write_rows(list(changed.values()), deleted, positions)
+        new_cards = [changed.pop(c["id"], c) for c in self.cards if c["id"] not in removed]
+        new_cards.extend(changed.values())
+        self._apply(new_cards)
+        return self.version
+
+    def apply_delta(self, base_version, changed=(), deleted=()):
+        """
+        增量同步：base_version 与当前版本一致时应用修改和删除，返回新版本号
+        版本不一致说明客户端的数据已经过时，抛出 VersionConflict
+        """
+        with self._lock:
+            if base_version != self.version:
+                raise VersionConflict(self.version)
+            return self._apply_changes(changed, deleted)
+
+    def upsert(self, cards):
+        """新增或修改卡片（只写内容变化的行）；返回新版本号"""
+        with self._lock:
+            return self._apply_changes(cards, ())
+
+    def delete(self, ids):
+        """删除卡片；返回新版本号"""
+        with self._lock:
+            return self._apply_changes((), ids)
+
+    def replace(self, cards):
+        """
+        用完整卡片列表替换（前端全量同步、导入 JSON）
+        与当前内容做差异比较，只写变化的行和位置变化的行；返回新版本号
+        """
+        with self._lock:
+            new_cards = []
+            seen = set()
+            for card in map(_normalize, cards):
+                if card["id"] and card["id"] not in seen:
+                    seen.add(card["id"])
+                    new_cards.append(card)
+            old_positions = {c["id"]: i for i, c in enumerate(self.cards)}
+            upserts = [c for c in new_cards if self._by_id.get(c["id"]) != c]
+            deletes = [card_id for card_id in self._by_id if card_id not in seen]
+            positions = {
+                c["id"]: i for i, c in enumerate(new_cards)
+                if old_positions.get(c["id"]) != i
+            }
+            if not upserts and not deletes and not positions:
+                return self.version
+            self._write_rows(upserts, deletes, positions)
+            self._apply(new_cards)
+            return self.version
@@ -0,0 +1,317 @@
+import asyncio
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+import requests
+from requests.adapters import HTTPAdapter
+
+# 共享云端 HTTP 客户端：AudioService / MatchService 共用一个连接池
+# - keep-alive 连接复用（省掉每次请求的 TCP+TLS 握手）
+# - 安装了 httpx[http2] 时走 HTTP/2，否则用 requests 连接池
+# - /api/set-token 时预热连接
+# - 重试预算 + 熔断器，错误只写一次 cloud_api_error
+# - apost: asyncio 流水线用的异步版本（httpx.AsyncClient），任务取消时请求立即中断
+# - astream: 流式响应（SSE），边收边处理
+
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    HTTPX_AVAILABLE = False
+
+try:
+    import h2  # noqa: F401  httpx 的 http2 依赖
+    HTTP2_AVAILABLE = HTTPX_AVAILABLE
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# 可重试的状态码（Render 冷启动 / 网关抖动）
+RETRYABLE_STATUS = {502, 503, 504}
+
+
+class RetryBudget:
+    """
+    重试预算：重试次数不超过 请求数 * ratio + min_retries
+    云端整体故障时不会因为重试把流量放大
+    """
+
+    def __init__(self, ratio=0.2, min_retries=3, window=10.0):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.window = window
+        self._lock = threading.Lock()
+        self._requests = []
+        self._retries = []
+
+    def _trim(self, now):
+        cutoff = now - self.window
+        self._requests = [t for t in self._requests if t > cutoff]
+        self._retries = [t for t in self._retries if t > cutoff]
+
+    def record_request(self):
+        with self._lock:
+            now = time.time()
+            self._trim(now)
+            self._requests.append(now)
+
+    def try_spend(self):
+        """申请一次重试，预算不足返回 False"""
+        with self._lock:
+            now = time.time()
+            self._trim(now)
+            if len(self._retries) >= len(self._requests) * self.ratio + self.min_retries:
+                return False
+            self._retries.append(now)
+            return True
+
+
+class CircuitBreaker:
+    """连续失败 threshold 次后熔断 cooldown 秒，期间请求直接失败"""
+
+    def __init__(self, threshold=5, cooldown=30.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self.failures = 0
+        self.opened_at = None
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            # 冷却结束后放行（half-open），成功一次即闭合
+            return time.time() - self.opened_at >= self.cooldown
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        """记录失败，返回 True 表示这次失败导致熔断打开"""
+        with self._lock:
+            self.failures += 1
+            if self.failures < self.threshold:
+                return False
+            was_open = self.opened_at is not None
+            self.opened_at = time.time()
+            return not was_open
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+
+class CloudClient:
+    def __init__(self, base_url, timeout=30, max_retries=2, pool_size=4):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.pool_size = pool_size
+        self.budget = RetryBudget()
+        self.breaker = CircuitBreaker()
+
+        if HTTP2_AVAILABLE:
+            self.session = httpx.Client(
+                http2=True,
+                limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            )
+            self._transport_errors = (httpx.HTTPError,)
+        else:
+            self.session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+            self.session.mount("https://", adapter)
+            self.session.mount("http://", adapter)
+            self._transport_errors = (requests.exceptions.RequestException,)
+
+        # 异步客户端绑定在事件循环上，第一次 apost 时创建
+        self._async_session = None
+        self._async_loop = None
+
+        protocol = "HTTP/2" if HTTP2_AVAILABLE else "HTTP/1.1 keep-alive"
+        print(f"[CLOUD] Cloud client ready: {self.base_url} ({protocol})")
+
+    def prewarm(self):
+        """后台打开连接（同时唤醒 Render 冷启动），不阻塞调用方"""
+        def _warm():
+            try:
+                start = time.time()
+                self.session.get(f"{self.base_url}/", timeout=10)
+                print(f"[CLOUD] Connection pre-warmed in {(time.time() - start) * 1000:.0f} ms")
+            except Exception as e:
+                print(f"[WARN] Pre-warm failed: {e}")
+
+        threading.Thread(target=_warm, daemon=True).start()
+
+    async def aprewarm(self):
+        """预热异步连接池（面试开始时调用，第一句话不用等握手）"""
+        if not HTTPX_AVAILABLE:
+            return
+        try:
+            start = time.time()
+            await self._get_async_session().get(f"{self.base_url}/", timeout=10)
+            print(f"[CLOUD] Async connection pre-warmed in {(time.time() - start) * 1000:.0f} ms")
+        except httpx.HTTPError as e:
+            print(f"[WARN] Async pre-warm failed: {e}")
+
+    def get(self, path, headers=None, timeout=10):
+        """简单 GET（无重试），返回 response 或 None"""
+        if not self.breaker.allow():
+            return None
+        try:
+            return self.session.get(f"{self.base_url}{path}", headers=headers, timeout=timeout)
+        except self._transport_errors as e:
+            print(f"[ERROR] Request Error: {e}")
+            return None
+
+    def _report_error(self, status, message, state=None):
+        """写入发起请求的会话的 cloud_api_error（内容相同则不重复写）"""
+        if state is None:
+            return
+        error = {"status": status, "message": message}
+        state.update(cloud_api_error=error)
+
+    def _should_retry(self, response, error, attempt, state):
+        """
+        处理一次请求的结果：返回 True 表示应该重试（已经扣除重试预算）
+        否则更新熔断器并记录错误
+        """
+        retryable = response is None or response.status_code in RETRYABLE_STATUS
+        if not retryable:
+            self.breaker.record_success()
+            if response.status_code != 200:
+                self._report_error(response.status_code, response.text, state)
+            return False
+
+        if attempt < self.max_retries and self.budget.try_spend():
+            return True
+
+        if error is not None:
+            print(f"[ERROR] Request Error: {error}")
+        else:
+            self._report_error(response.status_code, response.text, state)
+        if self.breaker.record_failure():
+            print(f"[ERROR] Cloud API unreachable, circuit open for {self.breaker.cooldown:.0f}s")
+            if error is not None:
+                self._report_error(503, f"Cloud API unreachable: {error}", state)
+        return False
+
+    def post(self, path, headers=None, json=None, files=None, data=None, timeout=None, state=None):
+        """
+        POST 到云端
+        返回: response（包括非 200，错误已记录）或 None（网络错误 / 熔断中）
+        注意: files 里请传 bytes 而不是文件对象，方便重试
+        state: 错误写入哪个会话的 state（None = 不上报：每个会话传自己的 state）
+        """
+        if not self.breaker.allow():
+            return None
+
+        url = f"{self.base_url}{path}"
+        self.budget.record_request()
+        attempt = 0
+        while True:
+            try:
+                response = self.session.post(
+                    url, headers=headers, json=json, files=files, data=data,
+                    timeout=timeout or self.timeout,
+                )
+                error = None
+            except self._transport_errors as e:
+                response = None
+                error = e
+
+            if not self._should_retry(response, error, attempt, state):
+                return response
+            attempt += 1
+            time.sleep(0.2 * attempt)
+
+    def _get_async_session(self):
+        """当前事件循环的 httpx.AsyncClient（换了事件循环就重新创建）"""
+        loop = asyncio.get_running_loop()
+        if self._async_session is None or self._async_loop is not loop:
+            self._async_session = httpx.AsyncClient(
+                http2=HTTP2_AVAILABLE,
+                limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size),
+            )
+            self._async_loop = loop
+        return self._async_session
+
+    async def apost(self, path, headers=None, json=None, files=None, data=None, timeout=None, state=None):
+        """
+        post 的异步版本，参数和返回值相同
+        任务被取消时（停止面试）正在进行的请求直接中断，不用等超时
+        没有安装 httpx 时退回到线程里执行同步请求（取消后结果丢弃）
+        """
+        if not HTTPX_AVAILABLE:
+            return await asyncio.to_thread(self.post, path, headers, json, files, data, timeout, state)
+        if not self.breaker.allow():
+            return None
+
+        url = f"{self.base_url}{path}"
+        self.budget.record_request()
+        attempt = 0
+        while True:
+            try:
+                response = await self._get_async_session().post(
+                    url, headers=headers, json=json, files=files, data=data,
+                    timeout=timeout or self.timeout,
+                )
+                error = None
+            except httpx.HTTPError as e:
+                response = None
+                error = e
+
+            if not self._should_retry(response, error, attempt, state):
+                return response
+            attempt += 1
+            await asyncio.sleep(0.2 * attempt)
+
+    @asynccontextmanager
+    async def astream(self, path, headers=None, json=None, timeout=None, state=None):
+        """
+        流式 POST：async with 得到状态码为 200 的 httpx 响应（用 aiter_lines 逐行读取），否则得到 None
+        不重试（已经展示出去的内容不能重来）；404 表示云端还不支持这个接口，不记错误，调用方退回到普通请求
+        没有安装 httpx 时同样得到 None
+        """
+        if not HTTPX_AVAILABLE or not self.breaker.allow():
+            yield None
+            return
+
+        self.budget.record_request()
+        request = self._get_async_session().build_request(
+            "POST", f"{self.base_url}{path}", headers=headers, json=json, timeout=timeout or self.timeout,
+        )
+        try:
+            response = await self._get_async_session().send(request, stream=True)
+        except httpx.HTTPError as e:
+            self._should_retry(None, e, self.max_retries, state)
+            yield None
+            return
+
+        try:
+            if response.status_code != 200:
+                await response.aread()
+                if response.status_code != 404:
+                    self._should_retry(response, None, self.max_retries, state)
+                yield None
+            else:
+                self.breaker.record_success()
+                yield response
+        finally:
+            await response.aclose()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_cloud_client():
+    """获取共享的 CloudClient（首次调用时创建，此时 .env 已加载）"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = CloudClient(
+                os.getenv("RENDER_URL", "https://recallai-d9sc.onrender.com"),
+                pool_size=int(os.getenv("CLOUD_POOL_SIZE", "16")),
+            )
+        return _client
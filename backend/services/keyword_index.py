@@ -0,0 +1,222 @@
+import math
+import re
+from collections import Counter
+
+# 本地关键词预匹配：BM25 倒排索引
+# 问题里明确出现卡片 topic 关键词时，直接返回卡片，不再走云端 LLM
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# 只过滤疑问句里的“虚词”，保留 yourself / weakness 这类有区分度的词
+STOPWORDS = {
+    "a", "an", "the", "and", "or", "but", "of", "to", "in", "on", "at", "for",
+    "with", "by", "from", "as", "is", "are", "was", "were", "be", "been", "am",
+    "do", "does", "did", "can", "could", "would", "should", "will", "me", "my",
+    "i", "you", "your", "we", "our", "it", "its", "this", "that", "these",
+    "those", "what", "how", "why", "when", "where", "which", "who", "tell",
+    "about", "so", "if", "there", "have", "has", "had", "e", "g", "eg",
+}
+
+
+# 本地命中只接受“像问题”的句子：以问句/祈使句开头，或带问号
+# 候选人自己的回答（"I think my greatest weakness is ..."）也会命中 topic 词，交给云端按意图判断
+QUESTION_STARTERS = (
+    "what", "how", "why", "when", "where", "which", "who", "whats",
+    "can", "could", "would", "will", "do", "does", "did", "is", "are", "have", "has",
+    "tell", "describe", "walk", "explain", "define", "give", "share", "talk", "name", "list",
+)
+# 问题前面常见的口头语（"So, tell me ..." / "Okay, what ..."）
+_LEAD_INS = {"so", "ok", "okay", "alright", "and", "well", "now", "great", "thanks", "um", "uh", "next", "then"}
+
+
+def is_question(text):
+    """这句话是不是在提问（问号，或去掉口头语后以疑问词 / 祈使动词开头）"""
+    if not text:
+        return False
+    if "?" in text:
+        return True
+    words = _TOKEN_RE.findall(text.lower().replace("'", ""))
+    while words and words[0] in _LEAD_INS:
+        words = words[1:]
+    return bool(words) and words[0] in QUESTION_STARTERS
+
+
+def _stem(word):
+    """极简词干化（两端使用同一规则，只需保证一致）"""
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 5 and word.endswith("ing"):
+        return word[:-3]
+    if len(word) > 4 and word.endswith("ed"):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def tokenize(text):
+    """小写 + 切词 + 去停用词 + 词干化"""
+    if not text:
+        return []
+    return [_stem(w) for w in _TOKEN_RE.findall(text.lower()) if w not in STOPWORDS]
+
+
+class KeywordIndex:
+    """
+    卡片 topic + content 的 BM25 倒排索引
+    - topic 词按 topic_weight 加权（topic 比正文更能代表问题）
+    - 文档按卡片 id 存储，upsert / remove 只更新变化的卡片
+    - match() 只在置信度足够高时返回，否则交给云端：
+      - 某一种 topic 问法的 idf 加权覆盖率 >= threshold，且至少命中 min_terms 个词
+        （只剩一个词的问法，如 "Tell me about yourself" -> {yourself}，太容易误中，交给云端）
+      - 归一化 BM25 分数 >= min_score（问题里大部分词卡片都没有时不算命中）
+      - 这句话像一个问题（is_question）：陈述句 / 第一人称的回答交给云端判断意图
+    """
+
+    def __init__(self, k1=1.5, b=0.75, topic_weight=3, threshold=0.75, margin=0.2, min_terms=2, min_score=0.3):
+        self.k1 = k1
+        self.b = b
+        self.topic_weight = topic_weight
+        self.threshold = threshold
+        self.margin = margin
+        self.min_terms = min_terms
+        self.min_score = min_score
+
+        self.postings = {}       # term -> {card_id: tf}
+        self.doc_terms = {}      # card_id -> Counter（删除/更新时从 postings 里撤掉）
+        self.doc_len = {}        # card_id -> 文档长度
+        self.total_len = 0
+        self.topic_phrases = {}  # card_id -> [set(terms), ...]（topic 里用 / 分隔的多种问法）
+
+    @property
+    def avg_len(self):
+        return self.total_len / len(self.doc_len) if self.doc_len else 0.0
+
+    def idf(self, term):
+        plist = self.postings.get(term)
+        if not plist:
+            return 0.0
+        n = len(self.doc_len)
+        return math.log(1 + (n - len(plist) + 0.5) / (len(plist) + 0.5))
+
+    def _remove_doc(self, card_id):
+        tf = self.doc_terms.pop(card_id, None)
+        if tf is None:
+            return False
+        for term in tf:
+            plist = self.postings[term]
+            del plist[card_id]
+            if not plist:
+                del self.postings[term]
+        self.total_len -= self.doc_len.pop(card_id)
+        self.topic_phrases.pop(card_id, None)
+        return True
+
+    def upsert(self, cards):
+        """新增或更新卡片"""
+        for card in cards:
+            card_id = card.get("id")
+            self._remove_doc(card_id)
+
+            topic = card.get("topic") or ""
+            content = card.get("content") or ""
+
+            topic_terms = tokenize(topic)
+            tf = Counter(tokenize(content))
+            for term in topic_terms:
+                tf[term] += self.topic_weight
+
+            for term, count in tf.items():
+                self.postings.setdefault(term, {})[card_id] = count
+            self.doc_terms[card_id] = tf
+            self.doc_len[card_id] = sum(tf.values())
+            self.total_len += self.doc_len[card_id]
+
+            phrases = [set(tokenize(p)) for p in topic.split("/")]
+            self.topic_phrases[card_id] = [p for p in phrases if p]
+
+    def remove(self, card_ids):
+        """删除卡片；返回实际删除的数量"""
+        return sum(1 for card_id in card_ids if self._remove_doc(card_id))
+
+    def build(self, cards):
+        """根据卡片列表重建索引"""
+        self.postings, self.doc_terms, self.doc_len, self.topic_phrases = {}, {}, {}, {}
+        self.total_len = 0
+        self.upsert(cards)
+
+    def search(self, query, top_k=3):
+        """BM25 打分，返回 [(card_id, score), ...]（分数从高到低）"""
+        terms = set(tokenize(query))
+        if not terms or not self.avg_len:
+            return []
+
+        scores = {}
+        k1, b, avg_len = self.k1, self.b, self.avg_len
+        for term in terms:
+            plist = self.postings.get(term)
+            if not plist:
+                continue
+            idf = self.idf(term)
+            for card_id, tf in plist.items():
+                norm = k1 * (1 - b + b * self.doc_len[card_id] / avg_len)
+                scores[card_id] = scores.get(card_id, 0.0) + idf * tf * (k1 + 1) / (tf + norm)
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return ranked[:top_k]
+
+    def topic_coverage(self, card_id, query_terms):
+        """
+        query 覆盖了该卡片某一种 topic 问法的比例（按 idf 加权，取最大值）
+        命中少于 min_terms 个词的问法不算（单个词的问法永远不会高置信度）
+        """
+        best = 0.0
+        for phrase in self.topic_phrases.get(card_id, []):
+            hits = phrase & query_terms
+            if len(hits) < self.min_terms:
+                continue
+            total = sum(self.idf(t) for t in phrase)
+            if total <= 0:
+                continue
+            best = max(best, sum(self.idf(t) for t in hits) / total)
+        return best
+
+    def normalized_score(self, score, query_terms):
+        """
+        BM25 分数除以这个 query 可能得到的最高分（每个词 idf * (k1 + 1)），0~1
+        索引里没有的词按最高 idf 计入分母：问题里卡片不认识的内容越多，分数越低
+        """
+        unknown_idf = math.log(1 + (len(self.doc_len) + 0.5) / 0.5)
+        best = sum(
+            (self.idf(t) if t in self.postings else unknown_idf) * (self.k1 + 1) for t in query_terms
+        )
+        return score / best if best > 0 else 0.0
+
+    def match(self, query):
+        """
+        高置信度本地匹配
+        返回: (card_id, confidence) 或 None（模糊时交给云端）
+        """
+        if not is_question(query):
+            return None
+        ranked = self.search(query, top_k=3)
+        if not ranked:
+            return None
+
+        query_terms = set(tokenize(query))
+        confident = []
+        for card_id, score in ranked:
+            if self.normalized_score(score, query_terms) < self.min_score:
+                continue
+            coverage = self.topic_coverage(card_id, query_terms)
+            if coverage >= self.threshold:
+                confident.append((card_id, score, coverage))
+
+        if not confident:
+            return None
+        # 多张卡片都高置信度时，BM25 第一名要明显领先，否则视为模糊
+        if len(confident) > 1 and confident[1][1] >= confident[0][1] * (1 - self.margin):
+            return None
+
+        card_id, _, coverage = confident[0]
+        return card_id, coverage
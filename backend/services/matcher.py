@@ -2,16 +2,13 @@ import time
 import json
 import os
 import sys
-import requests
+import asyncio
+import threading
 from dotenv import load_dotenv
-
-# 全局 state 引用（避免循环导入）
-_global_state = None
-
-def set_global_state(state):
-    """从 main.py 设置全局 state 引用"""
-    global _global_state
-    _global_state = state
+from services.keyword_index import KeywordIndex
+from services.vector_index import VectorIndex
+from services.cloud_client import get_cloud_client
+from services.card_store import CardStore
 
 def get_base_path():
     """获取程序运行的基础路径，支持开发和打包环境"""
@@ -31,40 +28,287 @@ else:
     load_dotenv()  # 尝试从默认位置加载
     print(f"[WARN] .env not found at {env_path}, using default")
 
-# 获取 Render 云端 URL
-RENDER_URL = os.getenv("RENDER_URL", "https://recallai-d9sc.onrender.com")
+# 本地预匹配置信度阈值（topic 关键词覆盖率，0~1）
+LOCAL_MATCH_THRESHOLD = float(os.getenv("LOCAL_MATCH_THRESHOLD", "0.75"))
+# 归一化 BM25 分数下限（0~1）：问题里大部分词卡片都没有时不在本地命中
+LOCAL_MATCH_MIN_SCORE = float(os.getenv("LOCAL_MATCH_MIN_SCORE", "0.3"))
+
+# 卡组超过这个数量时，只把向量检索的 top-N 候选放进 LLM prompt
+MAX_PROMPT_CARDS = int(os.getenv("MAX_PROMPT_CARDS", "40"))
+
+# AI 生成走流式接口：第一段文字到达就出卡，后面边生成边更新（STREAM_GENERATION=0 关闭）
+STREAM_GENERATION = os.getenv("STREAM_GENERATION", "1") == "1"
+STREAM_UPDATE_INTERVAL = 0.1    # 流式生成时卡片最多每隔多久更新一次（秒）
+
+class CardIndex:
+    """
+    卡片索引（BM25 倒排 + 向量），所有会话共用一份
+    卡片存储版本变化时增量更新
+    """
+
+    def __init__(self, store=None):
+        # 与 API 共用的卡片存储（不传则单独打开 data/cards.db）
+        data_path = os.path.join(get_base_path(), "data")
+        self.store = store or CardStore(os.path.join(data_path, "cards.db"), os.path.join(data_path, "cards.json"))
+        self.keyword_index = KeywordIndex(threshold=LOCAL_MATCH_THRESHOLD, min_score=LOCAL_MATCH_MIN_SCORE)
+        self.vector_index = VectorIndex()
+        self.cards = []
+        self.cards_by_id = {}
+        self.cards_version = None
+        # 索引增量更新与检索互斥（更新是原地修改）
+        self._index_lock = threading.Lock()
+        self._sync_cards()
+
+    def _sync_cards(self):
+        """
+        卡片存储版本变化时更新索引；返回是否发生了变化
+        能拿到变更记录时只更新变化的卡片，否则全量重建
+        """
+        if self.store.refresh() == self.cards_version:
+            return False
+        with self._index_lock:
+            cards, version, changed_ids, deleted_ids = self.store.changes_since(self.cards_version)
+            if version == self.cards_version:
+                return False
+            by_id = {c['id']: c for c in cards}
+            if changed_ids is None:
+                # 全量：本地倒排索引重建，向量索引只编码新增/修改的卡片
+                self.keyword_index.build(cards)
+                encoded, removed = self.vector_index.sync(cards)
+                print(f"[INDEX] Rebuilt indexes: {len(cards)} cards (encoded {encoded}, removed {removed})")
+            else:
+                changed = [by_id[card_id] for card_id in changed_ids if card_id in by_id]
+                self.keyword_index.remove(deleted_ids)
+                self.keyword_index.upsert(changed)
+                removed = self.vector_index.remove(deleted_ids)
+                encoded = self.vector_index.upsert(changed)
+                print(f"[INDEX] Updated indexes: {len(changed)} changed, {removed} removed (encoded {encoded})")
+            self.cards, self.cards_by_id = cards, by_id
+            self.cards_version = version
+            return True
+    
+    def load_cards(self):
+        """重新加载 cards（用于前端同步后刷新）"""
+        if self._sync_cards():
+            print(f"[RELOAD] Reloaded {len(self.cards)} cards (version {self.cards_version})")
+
+    def find_similar(self, user_query: str, top_k: int = 5):
+        """本地向量检索：返回最相似的 top_k 张卡片 [(card, score), ...]"""
+        with self._index_lock:
+            by_id = self.cards_by_id
+            return [
+                (by_id[card_id], score)
+                for card_id, score in self.vector_index.search(user_query, top_k=top_k)
+                if card_id in by_id
+            ]
+
+    def match_locally(self, user_query: str):
+        """本地倒排索引预匹配：只返回高置信度结果，否则 None"""
+        # 卡片变化（含 cards.json 被外部修改后重新导入）时自动更新索引
+        self._sync_cards()
+        with self._index_lock:
+            local = self.keyword_index.match(user_query)
+            if local is None:
+                return None
+            card_id, confidence = local
+            matched_card = self.cards_by_id[card_id]
+        print(f"[FAST] Local index match: {matched_card['topic']} (confidence={confidence:.2f})")
+        return matched_card
 
 class MatchService:
-    def __init__(self):
-        self.cards = self._load_cards()
+    def __init__(self, store=None, index=None, state=None):
+        # 卡片索引：多个会话共用同一个 CardIndex
+        self.index = index or CardIndex(store)
+        self.store = self.index.store
+        # 云端错误写到这个会话的 state（None = 不上报）
+        self.state = state
         # ---  云端化：用户 Token ---
         self.user_token = None
+        # 共享的云端连接池
+        self.cloud = get_cloud_client()
     
     def set_token(self, token: str):
         """设置用户 Token，用于云端 API 鉴权"""
         self.user_token = token
 
-    def _load_cards(self):
-        try:
-            base_path = get_base_path()
-            file_path = os.path.join(base_path, "data", "cards.json")
-            print(f"[FILE] Loading cards from: {file_path}")
-            with open(file_path, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except Exception as e:
-            print(f"Error loading cards: {e}")
-            return []
-    
+    @property
+    def cards(self):
+        return self.index.cards
+
     def load_cards(self):
         """重新加载 cards（用于前端同步后刷新）"""
-        self.cards = self._load_cards()
-        print(f"[RELOAD] Reloaded {len(self.cards)} cards from file")
+        self.index.load_cards()
+
+    def find_similar(self, user_query: str, top_k: int = 5):
+        return self.index.find_similar(user_query, top_k)
+
+    def match_locally(self, user_query: str):
+        return self.index.match_locally(user_query)
 
     def find_best_match(self, user_query: str):
-        
+        # 0. 命中本地高置信度直接返回，跳过云端
+        matched_card = self.match_locally(user_query)
+        if matched_card is not None:
+            return matched_card
+        return self._cloud_match(user_query)
+
+    # ---------- asyncio 版本（面试流水线使用，停止时可以直接取消） ----------
+
+    async def afind_best_match(self, user_query: str):
+        # 本地检索会读卡片存储，放到线程里，不阻塞事件循环
+        matched_card = await asyncio.to_thread(self.match_locally, user_query)
+        if matched_card is not None:
+            return matched_card
+        return await self._acloud_match(user_query)
+
+    async def amatch_or_generate(self, user_query: str):
+        """
+        投机模式：云端匹配和 AI 生成同时发出，省掉未命中时的第二次串行往返
+        返回: (card, ai_card)，优先使用匹配结果，两者至多一个非 None
+        """
+        matched_card = await asyncio.to_thread(self.match_locally, user_query)
+        if matched_card is not None:
+            return matched_card, None
+
+        generate_task = asyncio.ensure_future(self.agenerate_ai_answer(user_query))
+        try:
+            matched_card = await self._acloud_match(user_query)
+            if matched_card is not None:
+                # 生成请求输掉：直接取消（进行中的请求也会中断）
+                print("[SPECULATIVE] Match won, cancelling AI generation")
+                return matched_card, None
+            return None, await generate_task
+        finally:
+            generate_task.cancel()
+
+    async def agenerate_ai_answer(self, user_query: str):
+        """generate_ai_answer 的异步版本"""
+        print(f"🤖 AI generating for: {user_query}")
+        request = self._generate_request(user_query)
+        if request is None:
+            return None
+        payload, headers = request
+        response = await self.cloud.apost("/v1/proxy/chat", json=payload, headers=headers, state=self.state)
+        return self._generate_result(response)
+
+    async def astream_ai_answer(self, user_query: str, on_update):
+        """
+        流式生成：每收到一段内容调用 on_update(卡片)（同一个 id，内容逐步变长，带 streaming=True），返回最终卡片或 None
+        云端不支持流式（旧版本 / 没有 httpx）时退回到 agenerate_ai_answer
+        流中途出错 / 没收到 [DONE] 就断开：已经展示过部分内容时返回带 incomplete=True 的卡片，否则返回 None
+        """
+        if not STREAM_GENERATION:
+            return await self.agenerate_ai_answer(user_query)
+        print(f"🤖 AI streaming for: {user_query}")
+        request = self._generate_stream_request(user_query)
+        if request is None:
+            return None
+        payload, headers = request
+
+        async with self.cloud.astream("/v1/proxy/chat/stream", json=payload, headers=headers, state=self.state) as response:
+            if response is None:
+                return await self.agenerate_ai_answer(user_query)
+
+            card_id = f"ai_generated_{int(time.time())}"
+            text, topic, card = "", None, None
+            last_update = 0.0
+            finished = False
+            try:
+                async for line in response.aiter_lines():
+                    if not line.startswith("data: "):
+                        continue
+                    data = line[len("data: "):]
+                    if data == "[DONE]":
+                        finished = True
+                        break
+                    event = json.loads(data)
+                    if "error" in event:
+                        print(f"Gen Stream Error: {event['error']}")
+                        break
+                    text += event.get("delta", "")
+
+                    # 第一行决定是不是问题：INVALID 直接结束（关闭连接，云端也不再生成）
+                    if topic is None:
+                        if "\n" not in text:
+                            continue
+                        header, text = text.split("\n", 1)
+                        if header.strip().upper().startswith("INVALID"):
+                            return None
+                        topic = self._stream_topic(header)
+                        if topic is None:
+                            topic, text = "Answer", header + "\n" + text
+
+                    content = text.strip()
+                    now = time.time()
+                    if content and now - last_update >= STREAM_UPDATE_INTERVAL:
+                        # streaming=True：半成品，前端原地更新同一张卡片（最终卡片没有这个字段）
+                        card = {"id": card_id, "topic": f"[NEW] AI: {topic}", "content": content, "streaming": True}
+                        on_update(card)
+                        last_update = now
+            except Exception as e:
+                print(f"Gen Stream Error: {e}")
+
+        if not finished:
+            # 没有完整生成：没展示过内容就当作没有答案；展示过的保留，但标成不完整（不能冒充最终答案）
+            if card is None:
+                return None
+            content = text.strip() or card["content"]
+            return {"id": card_id, "topic": f"[NEW] AI: {topic}", "content": content, "incomplete": True}
+
+        # 只有一行（没有换行）的回复
+        if topic is None:
+            if text.strip().upper().startswith("INVALID") or self._stream_topic(text) is not None:
+                return None
+            topic = "Answer"
+        content = text.strip()
+        if not content:
+            return None
+        return {"id": card_id, "topic": f"[NEW] AI: {topic}", "content": content}
+
+    @staticmethod
+    def _stream_topic(header):
+        """解析流式回复的第一行 "Topic: ..."，格式不对返回 None"""
+        key, sep, value = header.partition(":")
+        if sep and key.strip().lower() == "topic" and value.strip():
+            return value.strip()
+        return None
+
+    async def _acloud_match(self, user_query: str):
+        """_cloud_match 的异步版本"""
+        request = await asyncio.to_thread(self._match_request, user_query)
+        if request is None:
+            return None
+        payload, headers, candidates = request
+        response = await self.cloud.apost("/v1/proxy/chat", json=payload, headers=headers, state=self.state)
+        return self._match_result(response, candidates)
+
+    # ---------- 云端匹配 ----------
+
+    def _cloud_match(self, user_query: str):
+        """云端 LLM 匹配"""
+        request = self._match_request(user_query)
+        if request is None:
+            return None
+        payload, headers, candidates = request
+        # 发送请求到 Render 云端（复用连接池，错误由 cloud client 统一记录）
+        response = self.cloud.post("/v1/proxy/chat", json=payload, headers=headers, state=self.state)
+        return self._match_result(response, candidates)
+
+    def _match_request(self, user_query: str):
+        """构造匹配请求，返回 (payload, headers, 候选卡片)；没有 Token 返回 None"""
+        if not self.user_token:
+            print("[ERROR] No user token set! Cannot call cloud API")
+            return None
+
         # 1. Prepare simplified list with index-based IDs
+        # 卡组很大时只发送向量检索的候选，控制 prompt 长度
+        if len(self.cards) > MAX_PROMPT_CARDS:
+            candidates = [card for card, _ in self.find_similar(user_query, top_k=MAX_PROMPT_CARDS)]
+        else:
+            candidates = self.cards
+
         card_summaries = []
-        for idx, c in enumerate(self.cards):
+        for idx, c in enumerate(candidates):
             card_summaries.append(
                 f"[{idx}] Topic: {c['topic']} | Preview: {c['content'][:80]}..."
             )
@@ -104,50 +348,35 @@ class MatchService:
         }}
         """
 
-        # --- 3. 补全：调用云端 API 发送请求 ---
-        if not self.user_token:
-            print("[ERROR] No user token set! Cannot call cloud API")
+        # 3. 准备请求数据
+        payload = {
+            "model": "llama-3.1-8b-instant",
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": f"User Input: {user_query}"}
+            ],
+            "response_format": {"type": "json_object"},
+            "temperature": 0.0
+        }
+        headers = {'Authorization': f'Bearer {self.user_token}'}
+        return payload, headers, candidates
+
+    def _match_result(self, response, candidates):
+        """4. Parse Result：返回匹配到的卡片或 None"""
+        if response is None or response.status_code != 200:
             return None
-        
         try:
-            # 准备请求数据
-            payload = {
-                "model": "llama-3.1-8b-instant",
-                "messages": [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": f"User Input: {user_query}"}
-                ],
-                "response_format": {"type": "json_object"},
-                "temperature": 0.0
-            }
-            
-            headers = {'Authorization': f'Bearer {self.user_token}'}
-            
-            # 发送请求到 Render 云端
-            response = requests.post(
-                f"{RENDER_URL}/v1/proxy/chat",
-                json=payload,
-                headers=headers,
-                timeout=30
-            )
-            
-            if response.status_code != 200:
-                if _global_state is not None:
-                    _global_state.cloud_api_error = {"status": response.status_code, "message": response.text}
-                return None
-            
-            # 4. Parse Result
             result_data = response.json()
             result_text = result_data.get("content", "{}")
             result_json = json.loads(result_text)
             match_index = result_json.get("best_match_index")
             
             print(f"[SEARCH] AI Match Result: index={match_index}")
-            print(f"[INFO] Available cards: {len(self.cards)} cards")
+            print(f"[INFO] Available cards: {len(candidates)} cards")
 
             # Return the full card object if found
-            if match_index is not None and isinstance(match_index, int) and 0 <= match_index < len(self.cards):
-                matched_card = self.cards[match_index]
+            if match_index is not None and isinstance(match_index, int) and 0 <= match_index < len(candidates):
+                matched_card = candidates[match_index]
                 print(f"[OK] Found matching card: {matched_card['topic']}")
                 return matched_card
             else:
@@ -159,10 +388,21 @@ class MatchService:
             print(f"AI Match Error: {e}")
             return None
 
+    # ---------- AI 现场生成 ----------
+
     def generate_ai_answer(self, user_query: str):
         """AI 现场生成逻辑"""
         print(f"🤖 AI generating for: {user_query}")
-        
+        request = self._generate_request(user_query)
+        if request is None:
+            return None
+        payload, headers = request
+        # 发送请求到 Render 云端（复用连接池，错误由 cloud client 统一记录）
+        response = self.cloud.post("/v1/proxy/chat", json=payload, headers=headers, state=self.state)
+        return self._generate_result(response)
+
+    def _generate_request(self, user_query: str):
+        """构造生成请求，返回 (payload, headers)；没有 Token 返回 None"""
         system_prompt = """
         You are an Interview Coach.
         Task:
@@ -180,33 +420,53 @@ class MatchService:
             print("[ERROR] No user token set! Cannot call cloud API")
             return None
 
+        # 准备请求数据
+        payload = {
+            "model": "llama-3.1-8b-instant",
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_query}
+            ],
+            "response_format": {"type": "json_object"},
+            "temperature": 0.6
+        }
+        headers = {'Authorization': f'Bearer {self.user_token}'}
+        return payload, headers
+
+    def _generate_stream_request(self, user_query: str):
+        """构造流式生成请求：纯文本格式（第一行是 Topic 或 INVALID），可以边收边显示"""
+        system_prompt = """
+        You are an Interview Coach.
+        Task:
+        1. **Check**: Is this input a QUESTION from an interviewer?
+           - If it is the candidate answering (e.g. "I did...", "So..."), reply with exactly: INVALID
+        2. **Generate**: If valid, generate a short STAR method answer.
+
+        Output plain text (no JSON, no markdown):
+        Topic: <short topic>
+        <the answer>
+        """
+
+        if not self.user_token:
+            print("[ERROR] No user token set! Cannot call cloud API")
+            return None
+
+        payload = {
+            "model": "llama-3.1-8b-instant",
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_query}
+            ],
+            "temperature": 0.6
+        }
+        headers = {'Authorization': f'Bearer {self.user_token}'}
+        return payload, headers
+
+    def _generate_result(self, response):
+        """解析生成结果：有效问题返回新卡片，否则 None"""
+        if response is None or response.status_code != 200:
+            return None
         try:
-            # 准备请求数据
-            payload = {
-                "model": "llama-3.1-8b-instant",
-                "messages": [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_query}
-                ],
-                "response_format": {"type": "json_object"},
-                "temperature": 0.6
-            }
-            
-            headers = {'Authorization': f'Bearer {self.user_token}'}
-            
-            # 发送请求到 Render 云端
-            response = requests.post(
-                f"{RENDER_URL}/v1/proxy/chat",
-                json=payload,
-                headers=headers,
-                timeout=30
-            )
-            
-            if response.status_code != 200:
-                if _global_state is not None:
-                    _global_state.cloud_api_error = {"status": response.status_code, "message": response.text}
-                return None
-            
             result_data = response.json()
             result_text = result_data.get("content", "{}")
             result = json.loads(result_text)
@@ -221,4 +481,4 @@ class MatchService:
                 return None # 标记为无效问题
         except Exception as e:
             print(f"Gen Error: {e}")
-            return None
\ No newline at end of file
+            return None
@@ -0,0 +1,147 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+import numpy as np
+
+# 环境噪声底噪跟踪：每个会话只校准一次，之后用录到的音频帧持续更新阈值
+# 校准结果按设备名保存，下次启动直接复用
+
+# 所有会话的跟踪器写同一个 noise_profiles.json：读-改-写必须按文件加锁，
+# 否则两个会话同时保存会互相覆盖对方设备的校准
+_file_locks = {}
+_file_locks_guard = threading.Lock()
+
+
+def _lock_for(path):
+    path = os.path.abspath(path)
+    with _file_locks_guard:
+        return _file_locks.setdefault(path, threading.Lock())
+
+
+class NoiseFloorTracker:
+    """
+    噪声底噪跟踪器
+    - noise_floor: 背景噪声 RMS 的指数滑动平均
+    - threshold(): 语音能量阈值 = noise_floor * ratio（有上下限）
+    - 静音帧只能让底噪下降（它们本来就低于阈值）；另外用最近 window_s 秒所有帧能量的
+      低分位数估计底噪，环境变吵（风扇、换了房间）时底噪随之上升，不会把持续的噪声当成语音
+      （说话时总有停顿，只要停顿占窗口的 percentile% 以上，分位数就落在噪声上）
+    """
+
+    def __init__(self, profile_path, ratio=1.5, alpha=0.2, frame_ms=30,
+                 min_threshold=100.0, max_threshold=4000.0, save_interval=30.0,
+                 window_s=10.0, percentile=2):
+        self.profile_path = profile_path
+        self.ratio = ratio
+        self.alpha = alpha
+        self.frame_ms = frame_ms
+        self.min_threshold = min_threshold
+        self.max_threshold = max_threshold
+        self.save_interval = save_interval
+        self.percentile = percentile
+        self._window = deque(maxlen=max(1, int(window_s * 1000 / frame_ms)))
+
+        self.device = None
+        self.noise_floor = None
+        self._last_saved = 0.0
+        self._lock = _lock_for(profile_path)
+
+    @property
+    def calibrated(self):
+        return self.noise_floor is not None
+
+    def threshold(self):
+        return float(min(self.max_threshold, max(self.min_threshold, self.noise_floor * self.ratio)))
+
+    def _read_profiles(self):
+        try:
+            with open(self.profile_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def load(self, device):
+        """切换到 device 的校准数据；没有保存过返回 False"""
+        with self._lock:
+            self.device = device
+            profile = self._read_profiles().get(device)
+            self.noise_floor = profile.get("noise_floor") if profile else None
+            self._window.clear()
+            return self.noise_floor is not None
+
+    def save(self):
+        """保存当前设备的校准数据"""
+        with self._lock:
+            if self.device is None or self.noise_floor is None:
+                return
+            profiles = self._read_profiles()
+            profiles[self.device] = {
+                "noise_floor": self.noise_floor,
+                "energy_threshold": self.threshold(),
+                "updated_at": time.time(),
+            }
+            try:
+                os.makedirs(os.path.dirname(self.profile_path), exist_ok=True)
+                tmp_path = self.profile_path + ".tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(profiles, f, indent=2)
+                os.replace(tmp_path, self.profile_path)
+                self._last_saved = time.time()
+            except Exception as e:
+                print(f"[WARN] Failed to save noise profile: {e}")
+
+    def calibrate(self, energy_threshold):
+        """用一次 adjust_for_ambient_noise 的结果初始化底噪"""
+        self.noise_floor = energy_threshold / self.ratio
+        self.save()
+
+    def frame_energies(self, raw, sample_rate):
+        """16-bit PCM -> 每帧 RMS"""
+        samples = np.frombuffer(raw, dtype=np.int16).astype(np.float32)
+        frame_len = max(1, int(sample_rate * self.frame_ms / 1000))
+        n_frames = len(samples) // frame_len
+        if n_frames == 0:
+            return np.zeros(0, dtype=np.float32)
+        frames = samples[:n_frames * frame_len].reshape(n_frames, frame_len)
+        return np.sqrt(np.mean(frames * frames, axis=1))
+
+    def observe(self, energies, all_energies=None, alpha=0.01):
+        """
+        常开麦克风模式：用 VAD 判为静音的帧能量逐帧更新底噪
+        all_energies: 这次的全部帧能量（包括判为语音的帧），窗口攒满后底噪不低于它们的低分位数
+        """
+        for energy in energies:
+            if self.noise_floor is None:
+                self.noise_floor = float(energy)
+            else:
+                self.noise_floor = (1 - alpha) * self.noise_floor + alpha * float(energy)
+        if all_energies is not None and len(all_energies):
+            self._window.extend(float(e) for e in all_energies)
+            if len(self._window) == self._window.maxlen:
+                estimate = float(np.percentile(self._window, self.percentile))
+                if self.noise_floor is None or estimate > self.noise_floor:
+                    self.noise_floor = estimate
+        if self.noise_floor is None:
+            return
+        if time.time() - self._last_saved > self.save_interval:
+            self.save()
+
+    def update(self, raw, sample_rate):
+        """
+        用一段录音更新底噪：取最安静的 10% 帧作为噪声估计
+        返回新的能量阈值
+        """
+        energies = self.frame_energies(raw, sample_rate)
+        if len(energies):
+            estimate = float(np.percentile(energies, 10))
+            if self.noise_floor is None:
+                self.noise_floor = estimate
+            else:
+                self.noise_floor = (1 - self.alpha) * self.noise_floor + self.alpha * estimate
+        if self.noise_floor is None:
+            return None
+        if time.time() - self._last_saved > self.save_interval:
+            self.save()
+        return self.threshold()
@@ -0,0 +1,94 @@
+import re
+import threading
+from collections import OrderedDict
+
+# 防读屏：检测用户是不是在照着卡片念
+# 每张展示过的卡片（当前卡片 + 历史 + 回退前的卡片）预先切成词级 shingle 的哈希集合，
+# 检测时只需要把这句话的 shingle 逐个查表，与卡片长度无关
+
+_WORD_RE = re.compile(r"[a-z0-9']+")
+
+QUESTION_STARTERS = (
+    "what", "how", "why", "can you", "could you",
+    "tell me", "define", "explain", "is it", "do you"
+)
+
+
+def _words(text):
+    return _WORD_RE.findall(text.lower()) if text else []
+
+
+class ReadAloudDetector:
+    """
+    - shingle_size: 每个 shingle 的词数
+    - threshold: 这句话里出现在卡片上的 shingle 比例超过它就判为在念卡片
+    - max_cards: 最多跟踪最近展示过的多少张卡片
+    track 会在线程池里被调用（回退卡片接口），is_reading 在事件循环里调用：用锁保护两张表
+    """
+
+    def __init__(self, shingle_size=3, threshold=0.8, max_cards=12):
+        self.shingle_size = shingle_size
+        self.threshold = threshold
+        self.max_cards = max_cards
+        self._cards = OrderedDict()   # (card id, 内容) -> (shingle 哈希集合, 规整后的正文)
+        self._index = {}              # shingle 哈希 -> 包含它的卡片数
+        self._lock = threading.Lock()
+
+    def _shingles(self, words):
+        k = self.shingle_size
+        return {hash(tuple(words[i:i + k])) for i in range(len(words) - k + 1)}
+
+    def track(self, card):
+        """记录一张展示过的卡片（重复展示只调整顺序，不重新切分）"""
+        if not card:
+            return
+        content = card.get("content") or ""
+        key = (card.get("id"), content)
+        with self._lock:
+            self._track(key, content)
+
+    def _track(self, key, content):
+        if key in self._cards:
+            self._cards.move_to_end(key)
+            return
+        words = _words(content)
+        shingles = self._shingles(words)
+        self._cards[key] = (shingles, " " + " ".join(words) + " ")
+        for h in shingles:
+            self._index[h] = self._index.get(h, 0) + 1
+        while len(self._cards) > self.max_cards:
+            _, (old, _) = self._cards.popitem(last=False)
+            for h in old:
+                count = self._index[h] - 1
+                if count:
+                    self._index[h] = count
+                else:
+                    del self._index[h]
+
+    def clear(self):
+        with self._lock:
+            self._cards.clear()
+            self._index.clear()
+
+    def is_reading(self, speech_text):
+        """这句话是否在念最近展示过的卡片"""
+        if not speech_text:
+            return False
+        speech_clean = speech_text.lower().strip()
+        if speech_clean.startswith(QUESTION_STARTERS):
+            return False
+
+        words = _words(speech_clean)
+        if not words:
+            return False
+        shingles = self._shingles(words) if len(words) >= self.shingle_size else None
+        with self._lock:
+            if not self._cards:
+                return False
+            if shingles is None:
+                # 太短凑不出 shingle：整句按词边界出现在某张卡片上即可
+                phrase = " " + " ".join(words) + " "
+                return any(phrase in text for _, text in self._cards.values())
+            index = self._index
+            hits = sum(1 for h in shingles if h in index)
+        return hits / len(shingles) > self.threshold
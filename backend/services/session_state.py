@@ -0,0 +1,90 @@
+import gzip
+import json
+import threading
+from collections import namedtuple
+
+# 面试会话状态：不可变快照 + 版本号
+# - 写者（监听线程、API）在锁内基于当前快照生成新快照，整体替换引用（原子操作）
+# - 读者（poll / SSE / rewind）直接拿 state.snapshot，不加锁、不拷贝，也不会看到写了一半的状态
+# - 同一版本的 poll 响应体只序列化（和压缩）一次
+
+Snapshot = namedtuple("Snapshot", [
+    "version",
+    "session_id",        # 每次开始面试 +1（推送通道据此判断 transcript 是否需要整体重置）
+    "is_running",
+    "latest_text",
+    "latest_card",
+    "card_history",      # tuple，回退用
+    "transcript",        # tuple，存所有的对话记录 [{timestamp, text}, ...]
+    "cloud_api_error",   # 云端 API 错误信息: {"status": 401, "message": "..."}
+])
+
+EMPTY_SNAPSHOT = Snapshot(
+    version=0, session_id=0, is_running=False, latest_text="", latest_card=None,
+    card_history=(), transcript=(), cloud_api_error=None,
+)
+
+
+class SessionState:
+    def __init__(self):
+        self._write_lock = threading.Lock()   # 只有写者之间互斥
+        self.snapshot = EMPTY_SNAPSHOT
+        self._serialized = (None, None, None)  # (version, body, gzip body)
+
+        # --- 只在监听线程内部使用的工作状态（不对外发布） ---
+        self.sentence_buffer = ""
+        self.last_update_time = 0
+        self.start_time = 0           # 面试开始的时间戳
+        self.session_log = None       # 当前面试的预写日志（每条记录实时落盘）
+
+        # ---  云端化：用户 Token ---
+        self.user_token = None        # 用户的认证 Token，用于调用云端 API
+
+    # 只读访问（读的是当前快照）
+    is_running = property(lambda self: self.snapshot.is_running)
+    latest_text = property(lambda self: self.snapshot.latest_text)
+    latest_card = property(lambda self: self.snapshot.latest_card)
+    card_history = property(lambda self: self.snapshot.card_history)
+    transcript_log = property(lambda self: self.snapshot.transcript)
+    cloud_api_error = property(lambda self: self.snapshot.cloud_api_error)
+
+    def publish(self, change):
+        """
+        读-改-写：change(当前快照) 返回要修改的字段 dict（返回空则不发布）
+        返回新快照，没有变化时返回 None
+        """
+        with self._write_lock:
+            current = self.snapshot
+            fields = change(current)
+            if not fields:
+                return None
+            self.snapshot = current._replace(version=current.version + 1, **fields)
+            return self.snapshot
+
+    def update(self, **fields):
+        """直接设置字段（与当前值相同的字段不会产生新版本）"""
+        return self.publish(
+            lambda current: {k: v for k, v in fields.items() if getattr(current, k) != v}
+        )
+
+    def serialized(self, gzip_min_size=None):
+        """
+        返回 (快照, JSON 响应体, gzip 响应体或 None)，同一版本只序列化一次
+        gzip_min_size: 响应体达到这个大小才压缩
+        """
+        snapshot = self.snapshot
+        version, body, compressed = self._serialized
+        if version != snapshot.version:
+            body = json.dumps({
+                "is_running": snapshot.is_running,
+                "text": snapshot.latest_text,
+                "card": snapshot.latest_card,
+                "transcript": snapshot.transcript,
+                "cloud_api_error": snapshot.cloud_api_error,
+            }, ensure_ascii=False).encode("utf-8")
+            compressed = None
+            if gzip_min_size is not None and len(body) >= gzip_min_size:
+                compressed = gzip.compress(body, compresslevel=5)
+            # 并发的 poll 可能重复序列化同一版本，结果相同，谁覆盖都可以
+            self._serialized = (snapshot.version, body, compressed)
+        return snapshot, body, compressed
@@ -0,0 +1,408 @@
+import asyncio
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from services.audio import AudioService, STREAM_PARTIAL_INTERVAL
+from services.matcher import MatchService
+from services.read_aloud import ReadAloudDetector
+from services.session_state import SessionState
+
+# 多会话：每个面试会话有自己的 id、state、流水线、Token 和 transcript
+# 卡片索引 (CardIndex)、云端连接池在所有会话之间共用
+# 流水线是 uvicorn 事件循环里的 asyncio 任务：只有阻塞的麦克风读取放在线程里，
+# 云端请求走异步 HTTP，停止面试时取消任务，进行中的请求立即中断
+
+# 流水线参数：录音阶段不等网络，持续把语音段放进有界队列
+TRANSCRIBE_WORKERS = 2      # 并发转录请求数
+PIPELINE_MAX_PENDING = 8    # 已录音但还没处理完的语音段上限
+
+# 投机模式：超过 3 个词时，云端匹配和 AI 生成同时发出（未命中时省一次往返）
+SPECULATIVE_MATCH = os.getenv("SPECULATIVE_MATCH", "0") == "1"
+
+# 一个进程最多同时存在的会话数
+MAX_SESSIONS = int(os.getenv("MAX_SESSIONS", "16"))
+
+DEFAULT_SESSION_ID = "default"
+
+
+# 辅助函数：格式化时间 (把秒数转为 05:30 格式)
+def format_time(seconds):
+    m, s = divmod(int(seconds), 60)
+    return f"{m:02d}:{s:02d}"
+
+
+class InterviewSession:
+    def __init__(self, session_id, card_index, transcript_library, audio_factory=AudioService, device_name=None):
+        self.id = session_id
+        self.created_at = time.time()
+        # 会话状态：对外发布的字段是不可变快照，只能通过 state.update / state.publish 修改
+        self.state = SessionState()
+        # 每个会话录自己的麦克风（device_name=None 时跟随 .env 的 MIC_DEVICE_NAME）
+        self.audio = audio_factory(state=self.state, device_name=device_name)
+        self.matcher = MatchService(index=card_index, state=self.state)
+        # 防读屏：跟踪这个会话最近展示过的卡片
+        self.read_aloud = ReadAloudDetector()
+        self.transcript_library = transcript_library
+        # 麦克风读取是阻塞调用，每个会话一个录音线程
+        # （单线程：重新开始时新的录音循环会等上一个退出，不会同时打开两次麦克风）
+        self._capture_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"capture-{session_id}")
+        self._loop = None
+        self._task = None
+
+    def set_token(self, token):
+        self.state.user_token = token
+        self.audio.set_token(token)
+        self.matcher.set_token(token)
+
+    # ---------- 卡片 ----------
+
+    def update_card(self, new_card, track=True):
+        """
+        卡片更新封装函数 (带历史记录)
+        track=False: 流式生成中的半成品卡片（同一个 id 不进历史，也不交给防读屏跟踪）
+        """
+        def change(current):
+            history = current.card_history
+            if current.latest_card and current.latest_card.get('id') != new_card.get('id'):
+                history = (history + (current.latest_card,))[-10:]
+            return {"latest_card": new_card, "card_history": history}
+        self.state.publish(change)
+        if track:
+            self.read_aloud.track(new_card)
+
+    def rewind(self):
+        """回到上一张卡片；没有历史时返回 None"""
+        rewound = self.state.publish(lambda current: current.card_history and {
+            "latest_card": current.card_history[-1],
+            "card_history": current.card_history[:-1],
+        })
+        if not rewound:
+            return None
+        self.read_aloud.track(rewound.latest_card)
+        return rewound.latest_card
+
+    # ---------- 匹配 ----------
+
+    async def process_text(self, text, captured_at):
+        """匹配阶段：处理一段已转录的文本（按录音顺序调用）"""
+        BUFFER_TIMEOUT = 5.0
+        state = self.state
+
+        # --- [NEW] 记录 Transcript ---
+        # 只要识别到一段文本，就记录下来（时间戳用录音时刻，而不是处理完成时刻）
+        current_time = time.time()
+        elapsed = captured_at - state.start_time
+        timestamp_str = format_time(elapsed)
+
+        log_entry = {
+            "timestamp": timestamp_str,
+            "text": text
+        }
+        state.publish(lambda current: {"transcript": current.transcript + (log_entry,)})
+        if state.session_log:
+            state.session_log.append(log_entry)
+        # ------------------------
+
+        if self.read_aloud.is_reading(text):
+            print(f"🙊 Detected user reading card: '{text}' -> IGNORED")
+            state.last_update_time = time.time()
+            return
+
+        # 超时清理
+        if current_time - state.last_update_time > BUFFER_TIMEOUT:
+            if state.sentence_buffer:
+                print("🧹 Buffer timeout (Reset)")
+                state.sentence_buffer = ""
+
+        state.last_update_time = current_time
+
+        # 防止“Thank you”等短语
+        if state.sentence_buffer and len(state.sentence_buffer.split()) < 3:
+            if current_time - state.last_update_time > 2.0:
+                print("🧹 Cleared stale short buffer (noise/politeness)")
+                state.sentence_buffer = ""
+
+        # 拼接
+        current_full_text = (state.sentence_buffer + " " + text).strip()
+        print(f"🧩 Analyzing: [{current_full_text}]")
+        state.update(latest_text=current_full_text)
+
+        # --- 逻辑核心 ---
+        speculative = SPECULATIVE_MATCH and len(current_full_text.split()) > 3
+        if speculative:
+            card, ai_card = await self.matcher.amatch_or_generate(current_full_text)
+        else:
+            card = await self.matcher.afind_best_match(current_full_text)
+
+        if card:
+            print(f"[OK] LOCAL MATCH: {card['topic']}")
+            self.update_card(card)
+            state.sentence_buffer = ""
+        else:
+            # 没找到，尝试 AI 生成（投机模式下已经并发生成过）
+            if len(current_full_text.split()) > 3:
+                if not speculative:
+                    # 流式生成：第一段文字到达就出卡，边生成边更新
+                    ai_card = await self.matcher.astream_ai_answer(
+                        current_full_text, lambda partial: self.update_card(partial, track=False)
+                    )
+
+                if ai_card:
+                    print(f"🧞‍♂️ AI GENERATED: {ai_card['topic']}")
+                    self.update_card(ai_card)
+                    state.sentence_buffer = ""
+                else:
+                    # AI 拒绝生成
+                    if len(current_full_text.split()) > 8:
+                        print("🧹 Text rejected by AI & too long -> Clearing buffer")
+                        state.sentence_buffer = ""
+                    else:
+                        print("[WAIT] Text kept in buffer...")
+                        state.sentence_buffer = current_full_text
+            else:
+                state.sentence_buffer = current_full_text
+
+    async def process_partial(self, text):
+        """流式部分转录：只做本地匹配（亚毫秒，不调云端），命中就在问题说完前出卡"""
+        current_full_text = (self.state.sentence_buffer + " " + text).strip()
+        self.state.update(latest_text=current_full_text)
+        card = await asyncio.to_thread(self.matcher.match_locally, current_full_text)
+        if card:
+            print(f"[STREAM] Early match on partial: {card['topic']}")
+            self.update_card(card)
+
+    # ---------- 流水线 ----------
+
+    def _capture_loop(self, loop, enqueue, is_running, streaming):
+        """
+        录音阶段（在录音线程里运行）：常开麦克风 + VAD 分段，只负责录音
+        每段语音交回事件循环：enqueue(录音时刻, 语音段, 音频)
+        is_running: 这一轮面试是否还在进行（停止或重新开始后返回 False）
+        streaming: 说话中就产出音频块拿部分转录
+        """
+        print(f"[THREAD] [{self.id}] Capture stage started")
+        audio = self.audio
+        partial_interval = STREAM_PARTIAL_INTERVAL if streaming else None
+        while is_running():
+            stream_started = {}
+            try:
+                for segment, audio_data in audio.stream_segments(is_running, partial_interval):
+                    # 时间戳取这句话开始的时刻
+                    if segment.stream_id not in stream_started:
+                        duration = len(audio_data.frame_data) / (audio_data.sample_rate * audio_data.sample_width)
+                        stream_started = {segment.stream_id: time.time() - duration}
+                    captured_at = stream_started[segment.stream_id]
+                    loop.call_soon_threadsafe(enqueue, captured_at, segment, audio_data)
+            except RuntimeError as e:
+                if loop.is_closed():
+                    break  # 事件循环已经关闭（进程退出）
+                print(f"[ERROR] [{self.id}] Audio Error: {e}")
+                time.sleep(1.0)
+            except Exception as e:
+                print(f"[ERROR] [{self.id}] Audio Error: {e}")
+                time.sleep(1.0)
+        print(f"[STOP] [{self.id}] Capture stage stopped")
+
+    async def _run(self):
+        """
+        流水线：录音 (线程) -> 转录 (异步请求，最多 TRANSCRIBE_WORKERS 个并发) -> 匹配
+        pending 队列按录音顺序保存转录任务，匹配阶段按顺序 await 结果，
+        所以 transcript 顺序与说话顺序一致；队列满时丢弃新的语音段（背压）
+        流式模式下部分转录只做本地匹配，最终转录走完整逻辑
+        """
+        print(f"[THREAD] [{self.id}] Background listener started")
+        state = self.state
+        audio = self.audio
+        loop = asyncio.get_running_loop()
+        this_run = asyncio.current_task()
+        # stop() 会清空 self._task，重新开始会换成新任务：旧的录音循环据此退出
+        is_running = lambda: state.is_running and self._task is this_run
+
+        pending = asyncio.Queue(maxsize=PIPELINE_MAX_PENDING)
+        in_flight = set()
+        # 流式模式单并发，保证同一句话的音频块按顺序上传（协商结果出来后再设置）
+        slots = None
+        streaming = False
+
+        async def transcribe(segment, audio_data):
+            async with slots:
+                try:
+                    if streaming:
+                        return await audio.atranscribe_chunk(segment, audio_data)
+                    return await audio.atranscribe(audio_data)
+                except Exception as e:
+                    print(f"[ERROR] [{self.id}] Transcribe failed: {e}")
+                    return None
+
+        def enqueue(captured_at, segment, audio_data):
+            # 在事件循环里执行：立即开始转录，结果按录音顺序排队
+            if not is_running():
+                return
+            task = loop.create_task(transcribe(segment, audio_data))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+            try:
+                pending.put_nowait((captured_at, task, segment.final))
+            except asyncio.QueueFull:
+                # 部分结果丢了没关系（上传照常进行），最终结果丢了要提示
+                if segment.final:
+                    print(f"[WARN] [{self.id}] Pipeline backlog full, dropping utterance")
+
+        # 面试开始时预热异步连接池
+        in_flight.add(loop.create_task(audio.cloud.aprewarm()))
+        try:
+            # 可能要向云端协商格式（同步请求），放到线程里
+            streaming = await asyncio.to_thread(audio.streaming_enabled)
+            slots = asyncio.Semaphore(1 if streaming else TRANSCRIBE_WORKERS)
+            loop.run_in_executor(self._capture_executor, self._capture_loop, loop, enqueue, is_running, streaming)
+
+            while True:
+                captured_at, task, final = await pending.get()
+                # 单句出错只丢这一句，流水线继续跑（否则录音停了但界面还显示在听）
+                try:
+                    text = await task
+                    if not text or not state.is_running:
+                        continue
+                    if final:
+                        await self.process_text(text, captured_at)
+                    elif pending.empty():
+                        # 后面已经有更新的结果时跳过过期的部分转录
+                        await self.process_partial(text)
+                except Exception as e:
+                    print(f"[ERROR] [{self.id}] Failed to process utterance: {e}")
+                    continue
+        finally:
+            # 停止：取消所有还没完成的云端请求
+            for task in list(in_flight):
+                task.cancel()
+            print(f"[STOP] [{self.id}] Stopped")
+
+    def start(self):
+        """开始面试（在事件循环中调用）；已经在运行时返回 False"""
+        loop = asyncio.get_running_loop()
+        state = self.state
+        # [NEW] 重置状态 - 确保清空所有旧数据（检查和设置在同一次发布里完成，并发的 start 只有一个生效）
+        started = state.publish(lambda current: None if current.is_running else {
+            "is_running": True,
+            "session_id": current.session_id + 1,
+            "transcript": (),  # 清空 transcript 记录
+            "latest_text": "",
+            "latest_card": None,
+            "card_history": (),
+        })
+        if started is None:
+            return False
+
+        state.sentence_buffer = ""
+        self.read_aloud.clear()
+        state.start_time = time.time()
+        try:
+            state.session_log = self.transcript_library.start_session(datetime.now())
+        except Exception as e:
+            state.session_log = None
+            print(f"[ERROR] [{self.id}] Failed to open transcript log: {e}")
+
+        self._loop = loop
+        self._task = loop.create_task(self._run())
+        return True
+
+    def save_transcript(self):
+        """结束当前面试的 Transcript（日志已实时落盘，这里只做归档）"""
+        session_log, self.state.session_log = self.state.session_log, None
+        if session_log is None:
+            return None
+        try:
+            meta = self.transcript_library.finalize(session_log)
+            if meta:
+                print(f"💾 [{self.id}] Transcript saved: {meta['id']} ({meta['entry_count']} entries)")
+            else:
+                print(f"[WARN] [{self.id}] No transcript to save (empty)")
+            return meta
+        except Exception as e:
+            print(f"[ERROR] [{self.id}] Failed to save transcript: {e}")
+            return None
+
+    def stop(self):
+        """停止面试并归档 transcript（可以在任意线程调用，流水线立即取消）"""
+        self.state.update(is_running=False, cloud_api_error=None)  # 清除错误状态
+        task, self._task = self._task, None
+        if task is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(task.cancel)
+        self.audio.save_noise_profile()
+
+        # [NEW] 停止时归档（没有记录的会话直接丢弃）
+        self.save_transcript()
+
+        # [NEW] 归档后清空（日志已经关闭，不会重复保存）
+        self.state.update(transcript=())
+
+    def close(self):
+        """删除会话时调用：释放录音线程"""
+        self._capture_executor.shutdown(wait=False)
+
+    def info(self):
+        snapshot = self.state.snapshot
+        return {
+            "id": self.id,
+            "is_running": snapshot.is_running,
+            "created_at": self.created_at,
+            "transcript_entries": len(snapshot.transcript),
+            "device": self.audio.get_device_name(),
+        }
+
+
+class SessionLimitError(Exception):
+    """会话数已达上限"""
+
+
+class SessionManager:
+    """
+    会话管理：创建 / 查找 / 删除会话
+    所有会话共用 card_index（卡片索引）和云端连接池
+    麦克风按会话设置：同时运行多个会话时，每个会话应该指定自己的设备（device_name），
+    否则它们都跟随 MIC_DEVICE_NAME，会录到同一路音频
+    """
+
+    def __init__(self, card_index, transcript_library, max_sessions=MAX_SESSIONS, audio_factory=AudioService):
+        self.card_index = card_index
+        self.transcript_library = transcript_library
+        self.max_sessions = max_sessions
+        self.audio_factory = audio_factory
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def create(self, session_id=None, device_name=None):
+        """新建会话（id 已存在时直接返回已有的会话）"""
+        with self._lock:
+            if session_id in self._sessions:
+                return self._sessions[session_id]
+            if len(self._sessions) >= self.max_sessions:
+                raise SessionLimitError(f"Session limit reached ({self.max_sessions})")
+            session_id = session_id or uuid.uuid4().hex[:12]
+            session = InterviewSession(
+                session_id, self.card_index, self.transcript_library, self.audio_factory, device_name=device_name
+            )
+            self._sessions[session_id] = session
+        print(f"[SESSION] Created session {session_id} ({len(self._sessions)} active)")
+        return session
+
+    def get(self, session_id):
+        return self._sessions.get(session_id)
+
+    def remove(self, session_id):
+        """停止并删除会话；不存在返回 False"""
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+        if session is None:
+            return False
+        if session.state.is_running:
+            session.stop()
+        session.close()
+        print(f"[SESSION] Removed session {session_id} ({len(self._sessions)} active)")
+        return True
+
+    def all(self):
+        return list(self._sessions.values())
@@ -0,0 +1,274 @@
+import json
+import os
+import re
+import threading
+import time
+
+# Transcript 库：每场面试一个文件 + 一个元数据索引 (index.json)
+# 列表接口只读索引，不再打开每个 transcript 文件；详情按需加载
+# 面试进行中每条记录实时追加到 sessions/<id>.jsonl（预写日志），
+# 停止时只需 rename + 更新索引；进程崩溃后启动时自动恢复未完成的会话
+# 旧版本保存的 .json（整个数组）仍然可以读取
+
+INDEX_FILENAME = "index.json"
+SESSIONS_DIRNAME = "sessions"
+TRANSCRIPT_EXTENSIONS = (".jsonl", ".json")
+# 批量 fsync 的最小间隔（秒）；两次 fsync 之间的记录已 flush 到系统缓存，只有断电才会丢
+FSYNC_INTERVAL = float(os.getenv("TRANSCRIPT_FSYNC_INTERVAL", "1.0"))
+_ID_RE = re.compile(r"^transcript_[0-9_-]+$")
+
+
+def display_name(timestamp_str):
+    """2025-11-23_20-32-58 -> 11/23/2025 20:32:58（同一秒开始的其他会话带后缀 _2 -> (2)）"""
+    parts = timestamp_str.split('_')
+    if len(parts) == 3:
+        return f"{display_name('_'.join(parts[:2]))} ({parts[2]})"
+    if len(parts) == 2:
+        date_part = parts[0]  # 2025-11-23
+        time_part = parts[1]  # 20-32-58
+
+        # 转换日期格式：2025-11-23 -> 11/23/2025
+        date_components = date_part.split('-')
+        if len(date_components) == 3:
+            formatted_date = f"{date_components[1]}/{date_components[2]}/{date_components[0]}"
+            # 转换时间格式：20-32-58 -> 20:32:58
+            formatted_time = time_part.replace('-', ':')
+            return f"{formatted_date} {formatted_time}"
+    return timestamp_str.replace('_', ' ').replace('-', ':')
+
+
+def parse_elapsed(timestamp):
+    """'05:30' -> 330 秒"""
+    try:
+        minutes, seconds = timestamp.split(":")
+        return int(minutes) * 60 + int(seconds)
+    except (AttributeError, ValueError):
+        return 0
+
+
+def read_entries(path):
+    """读取 .jsonl / .json transcript；.jsonl 末尾写了一半的行直接跳过"""
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith(".json"):
+            return json.load(f)
+        entries = []
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                print(f"[WARN] Skipping corrupt transcript line in {os.path.basename(path)}")
+        return entries
+
+
+class SessionLog:
+    """
+    一场面试的预写日志：每条记录追加一行 JSON 并 flush，fsync 按时间批量进行
+    同时记录条数和最后一个时间戳，结束时不需要重新读文件就能生成元数据
+    """
+
+    def __init__(self, path, transcript_id, fsync_interval=FSYNC_INTERVAL):
+        self.path = path
+        self.transcript_id = transcript_id
+        self.fsync_interval = fsync_interval
+        self.entry_count = 0
+        self.last_timestamp = None
+        self._lock = threading.Lock()
+        self._last_sync = time.time()
+        self._dirty = False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+
+    def append(self, entry):
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._file.flush()
+            self.entry_count += 1
+            self.last_timestamp = entry.get("timestamp")
+            self._dirty = True
+            if time.time() - self._last_sync >= self.fsync_interval:
+                self._sync()
+
+    def _sync(self):
+        os.fsync(self._file.fileno())
+        self._last_sync = time.time()
+        self._dirty = False
+
+    def close(self):
+        with self._lock:
+            if self._file is None:
+                return
+            if self._dirty:
+                self._sync()
+            self._file.close()
+            self._file = None
+
+
+class TranscriptLibrary:
+    def __init__(self, path):
+        self.path = path
+        self.index_path = os.path.join(path, INDEX_FILENAME)
+        self.sessions_path = os.path.join(path, SESSIONS_DIRNAME)
+        self._lock = threading.Lock()
+        self._items = None   # id -> 元数据
+        self._active = set()  # 进行中的会话 id
+
+    @staticmethod
+    def is_valid_id(transcript_id):
+        return bool(_ID_RE.match(transcript_id or ""))
+
+    def _file_path(self, transcript_id):
+        for ext in TRANSCRIPT_EXTENSIONS:
+            path = os.path.join(self.path, transcript_id + ext)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def _build_meta(self, transcript_id, entry_count, last_timestamp):
+        timestamp_str = transcript_id.replace('transcript_', '')
+        return {
+            "id": transcript_id,
+            "name": display_name(timestamp_str),
+            "timestamp": timestamp_str,
+            "duration": parse_elapsed(last_timestamp),
+            "entry_count": entry_count,
+        }
+
+    def _meta_from_entries(self, transcript_id, entries):
+        last_timestamp = entries[-1].get("timestamp") if entries else None
+        return self._build_meta(transcript_id, len(entries), last_timestamp)
+
+    def _write_index(self):
+        os.makedirs(self.path, exist_ok=True)
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"items": self._items}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.index_path)
+
+    def _ensure_index(self):
+        """
+        加载索引（需持有锁）
+        索引里缺失的文件（旧版本保存的、或外部拷进来的）只解析一次补进索引
+        """
+        if self._items is not None:
+            return
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                items = json.load(f).get("items", {})
+        except (FileNotFoundError, ValueError):
+            items = {}
+
+        on_disk = set()
+        if os.path.isdir(self.path):
+            for name in os.listdir(self.path):
+                transcript_id, ext = os.path.splitext(name)
+                if ext in TRANSCRIPT_EXTENSIONS and self.is_valid_id(transcript_id):
+                    on_disk.add(transcript_id)
+
+        changed = False
+        for transcript_id in on_disk - set(items):
+            try:
+                entries = read_entries(self._file_path(transcript_id))
+                items[transcript_id] = self._meta_from_entries(transcript_id, entries)
+                changed = True
+            except Exception as e:
+                print(f"Error reading {transcript_id}: {e}")
+        for transcript_id in set(items) - on_disk:
+            del items[transcript_id]
+            changed = True
+
+        self._items = items
+        if changed:
+            self._write_index()
+            print(f"[INDEX] Transcript index rebuilt: {len(items)} transcripts")
+
+    def _archive(self, session_path, transcript_id, meta):
+        """把会话日志移到 transcripts 目录并写入索引"""
+        with self._lock:
+            self._ensure_index()
+            os.replace(session_path, os.path.join(self.path, f"{transcript_id}.jsonl"))
+            self._items[transcript_id] = meta
+            self._write_index()
+
+    def start_session(self, started_at):
+        """
+        开始一场面试，返回它的预写日志
+        id 由开始时间生成：transcript_2023-10-27_10-30-00；同一秒开始的其他会话加后缀 _2、_3 ...
+        """
+        base_id = f"transcript_{started_at.strftime('%Y-%m-%d_%H-%M-%S')}"
+        with self._lock:
+            self._ensure_index()
+            transcript_id, n = base_id, 1
+            while transcript_id in self._items or transcript_id in self._active:
+                n += 1
+                transcript_id = f"{base_id}_{n}"
+            self._active.add(transcript_id)
+        return SessionLog(os.path.join(self.sessions_path, f"{transcript_id}.jsonl"), transcript_id)
+
+    def finalize(self, session):
+        """
+        结束一场面试：关闭日志，rename 到 transcripts 目录并写入索引
+        耗时与面试长度无关（不重新序列化记录）；没有记录的会话直接删除，返回 None
+        """
+        session.close()
+        with self._lock:
+            self._active.discard(session.transcript_id)
+        if session.entry_count == 0:
+            try:
+                os.remove(session.path)
+            except FileNotFoundError:
+                pass
+            return None
+        meta = self._build_meta(session.transcript_id, session.entry_count, session.last_timestamp)
+        self._archive(session.path, session.transcript_id, meta)
+        return meta
+
+    def recover(self):
+        """启动时归档上次没有正常结束的会话（崩溃、强制退出）；返回恢复的数量"""
+        if not os.path.isdir(self.sessions_path):
+            return 0
+        recovered = 0
+        for name in os.listdir(self.sessions_path):
+            transcript_id, ext = os.path.splitext(name)
+            if ext != ".jsonl" or not self.is_valid_id(transcript_id):
+                continue
+            path = os.path.join(self.sessions_path, name)
+            try:
+                entries = read_entries(path)
+                if not entries:
+                    os.remove(path)
+                    continue
+                self._archive(path, transcript_id, self._meta_from_entries(transcript_id, entries))
+                recovered += 1
+                print(f"[RECOVER] Recovered unfinished transcript: {transcript_id} ({len(entries)} entries)")
+            except Exception as e:
+                print(f"[ERROR] Failed to recover {name}: {e}")
+        return recovered
+
+    def list(self, offset=0, limit=50):
+        """按时间倒序分页，只返回元数据；返回 (items, total)"""
+        with self._lock:
+            self._ensure_index()
+            items = sorted(self._items.values(), key=lambda m: m["timestamp"], reverse=True)
+        return items[offset:offset + limit], len(items)
+
+    def get(self, transcript_id):
+        """加载一场面试的完整内容；不存在返回 None"""
+        if not self.is_valid_id(transcript_id):
+            return None
+        with self._lock:
+            self._ensure_index()
+            meta = self._items.get(transcript_id)
+        path = self._file_path(transcript_id)
+        if meta is None or path is None:
+            return None
+        try:
+            entries = read_entries(path)
+        except Exception as e:
+            print(f"Error reading {transcript_id}: {e}")
+            return None
+        return {**meta, "transcript": entries}
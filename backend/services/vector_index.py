@@ -0,0 +1,150 @@
+import re
+import zlib
+import numpy as np
+
+# 本地稠密向量索引：卡片 embedding 矩阵 (n_cards, dim) float32
+# 默认编码器为 hashed character n-grams，可替换为任意本地 encoder
+
+_SPACE_RE = re.compile(r"\s+")
+
+
+class HashedNgramEncoder:
+    """
+    字符 n-gram 哈希编码器（无需模型文件）
+    每个 n-gram 用 crc32 哈希到 dim 个桶里计数，最后 L2 归一化
+    """
+
+    def __init__(self, dim=512, ngram_range=(3, 4)):
+        self.dim = dim
+        self.ngram_range = ngram_range
+
+    def _encode_one(self, text, out):
+        text = " " + _SPACE_RE.sub(" ", (text or "").lower()).strip() + " "
+        buckets = []
+        for n in range(self.ngram_range[0], self.ngram_range[1] + 1):
+            for i in range(len(text) - n + 1):
+                buckets.append(zlib.crc32(text[i:i + n].encode("utf-8")))
+        if not buckets:
+            return
+        h = np.asarray(buckets, dtype=np.uint32) % self.dim
+        out += np.bincount(h, minlength=self.dim).astype(np.float32)
+
+    def encode(self, texts):
+        """texts -> (len(texts), dim) float32，行向量已 L2 归一化"""
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            self._encode_one(text, matrix[row])
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+
+def card_text(card):
+    """卡片的编码文本：topic 更重要，重复一次加权"""
+    topic = card.get("topic") or ""
+    return f"{topic} {topic} {card.get('content') or ''}"
+
+
+class VectorIndex:
+    """
+    卡片 embedding 矩阵 + 余弦 top-k 检索
+    - upsert / remove 按卡片 id 增量更新，不重算整副卡组
+    - search 对一批 query 做一次矩阵乘法，不在 Python 里逐张遍历
+    """
+
+    def __init__(self, encoder=None):
+        self.encoder = encoder or HashedNgramEncoder()
+        self.dim = self.encoder.dim
+        self.matrix = np.zeros((0, self.dim), dtype=np.float32)  # 预分配容量，前 size 行有效
+        self.size = 0
+        self.ids = []          # row -> card id
+        self.rows = {}         # card id -> row
+        self.fingerprints = {} # card id -> 编码文本的 crc32（判断内容是否变化）
+
+    def __len__(self):
+        return self.size
+
+    def _reserve(self, extra):
+        needed = self.size + extra
+        if needed <= self.matrix.shape[0]:
+            return
+        capacity = max(needed, self.matrix.shape[0] * 2, 64)
+        grown = np.zeros((capacity, self.dim), dtype=np.float32)
+        grown[:self.size] = self.matrix[:self.size]
+        self.matrix = grown
+
+    def upsert(self, cards):
+        """新增或更新卡片，只对内容变化的卡片重新编码；返回实际编码的数量"""
+        pending = []
+        for card in cards:
+            card_id = card.get("id")
+            text = card_text(card)
+            fp = zlib.crc32(text.encode("utf-8"))
+            if self.fingerprints.get(card_id) == fp:
+                continue
+            pending.append((card_id, text, fp))
+
+        if not pending:
+            return 0
+
+        vectors = self.encoder.encode([text for _, text, _ in pending])
+        self._reserve(len(pending))
+        for (card_id, _, fp), vec in zip(pending, vectors):
+            row = self.rows.get(card_id)
+            if row is None:
+                row = self.size
+                self.size += 1
+                self.ids.append(card_id)
+                self.rows[card_id] = row
+            self.matrix[row] = vec
+            self.fingerprints[card_id] = fp
+        return len(pending)
+
+    def remove(self, card_ids):
+        """删除卡片：用最后一行覆盖被删行（O(1)/张）"""
+        removed = 0
+        for card_id in card_ids:
+            row = self.rows.pop(card_id, None)
+            if row is None:
+                continue
+            self.fingerprints.pop(card_id, None)
+            last = self.size - 1
+            if row != last:
+                moved_id = self.ids[last]
+                self.matrix[row] = self.matrix[last]
+                self.ids[row] = moved_id
+                self.rows[moved_id] = row
+            self.ids.pop()
+            self.size -= 1
+            removed += 1
+        return removed
+
+    def sync(self, cards):
+        """与最新卡片列表对齐：删掉不存在的，编码新增/修改的"""
+        current = {card.get("id") for card in cards}
+        removed = self.remove([cid for cid in list(self.rows) if cid not in current])
+        encoded = self.upsert(cards)
+        return encoded, removed
+
+    def search(self, queries, top_k=5):
+        """
+        批量余弦 top-k
+        queries: str 或 [str, ...]
+        返回: 每个 query 一个 [(card_id, score), ...]（分数从高到低）
+        """
+        single = isinstance(queries, str)
+        if single:
+            queries = [queries]
+        if self.size == 0 or not queries:
+            return [] if single else [[] for _ in queries]
+
+        q = self.encoder.encode(queries)
+        scores = q @ self.matrix[:self.size].T   # (n_queries, n_cards)
+        k = min(top_k, self.size)
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for qi in range(len(queries)):
+            row_scores = scores[qi, top[qi]]
+            order = np.argsort(-row_scores)
+            results.append([(self.ids[top[qi][j]], float(row_scores[j])) for j in order])
+        return results[0] if single else results
@@ -0,0 +1,39 @@
+from services.keyword_index import KeywordIndex, is_question
+
+CARDS = [
+    {"id": "weakness", "topic": "Greatest weakness / What is your biggest weakness",
+     "content": "I used to avoid public speaking, so I joined a weekly presentation club."},
+    {"id": "kafka", "topic": "Kafka / Why did you use Kafka",
+     "content": "We moved the order events to Kafka to decouple the billing service."},
+    {"id": "conflict", "topic": "Conflict with a teammate / Disagreement with coworker",
+     "content": "I set up a short call, listened first, and we agreed on a design review."},
+]
+
+
+def make_index():
+    index = KeywordIndex()
+    index.upsert(CARDS)
+    return index
+
+
+def test_question_matches_locally():
+    index = make_index()
+    assert index.match("What is your greatest weakness")[0] == "weakness"
+    assert index.match("So, tell me about your biggest weakness")[0] == "weakness"
+    assert index.match("why did you use kafka?")[0] == "kafka"
+
+
+def test_candidate_answer_falls_through_to_cloud():
+    index = make_index()
+    # 候选人自己说的话命中了 topic 词，但不是问题：不能本地出卡
+    assert index.match("I think my greatest weakness is public speaking") is None
+    assert index.match("my biggest weakness is public speaking") is None
+    assert index.match("we used kafka because of the billing service") is None
+
+
+def test_is_question():
+    assert is_question("What's your biggest weakness")
+    assert is_question("Okay, walk me through your resume")
+    assert is_question("Your greatest weakness?")
+    assert not is_question("I think my greatest weakness is public speaking")
+    assert not is_question("")
@@ -0,0 +1,236 @@
+"""
+上游延迟基准测试：慢的 Groq 请求会不会拖住其他用户
+
+- 本地起一个假的上游（Groq chat / transcription + Supabase auth / profiles），带固定延迟
+- 一部分 chat 请求很慢（SLOW_LATENCY），其余很快（FAST_LATENCY）
+- 用 uvicorn 单 worker 运行 cloud_server，CONCURRENCY 个客户端并发请求 DURATION 秒
+- 统计吞吐，快请求 / 慢请求各自的 p50 / p95 延迟，以及打到 Supabase 的请求数
+- BENCH_SHARED_PROMPTS=N: 所有客户端从 N 个相同的问题里选（测试请求合并和结果缓存），
+  默认 0 表示每个请求都不一样
+- BENCH_NOISY_CLIENTS=K: 其中 K 个客户端属于同一个"吵闹"用户，不停地发 chat；
+  其余客户端各是一个正常用户，像面试一样每隔 NORMAL_THINK 秒发一次转录 + 一次 chat
+- BENCH_UPSTREAM_LIMIT=N: 假 Groq 同时最多处理 N 个请求，超出返回 429（模拟共享的上游额度）
+- 客户端带 HS256 签名的 JWT（SUPABASE_JWT_SECRET 同时传给服务端，用于本地校验）
+
+用法: python bench_upstream.py [main.py 路径]
+      不传路径时测试同目录下的 main.py；传入旧版本的 main.py 可以对比
+"""
+import asyncio
+import importlib.util
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FAST_LATENCY = 0.10     # 快请求的上游耗时（秒）
+SLOW_LATENCY = 2.0      # 慢请求的上游耗时（秒）
+AUTH_LATENCY = 0.03     # Supabase 每次查询耗时（秒）
+SLOW_RATIO = 0.2        # 慢请求占比
+JWT_SECRET = "bench-jwt-secret-at-least-32-bytes-long"
+CONCURRENCY = int(os.environ.get("BENCH_CONCURRENCY", "32"))
+DURATION = float(os.environ.get("BENCH_DURATION", "10"))
+SHARED_PROMPTS = int(os.environ.get("BENCH_SHARED_PROMPTS", "0"))
+NOISY_CLIENTS = int(os.environ.get("BENCH_NOISY_CLIENTS", "0"))
+UPSTREAM_LIMIT = int(os.environ.get("BENCH_UPSTREAM_LIMIT", "0"))
+NORMAL_THINK = 1.0      # 正常用户两次提问之间的间隔（秒）
+
+
+class FakeUpstream(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    supabase_calls = 0
+    groq_active = 0
+    groq_rejected = 0
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, payload, status=200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def do_GET(self):
+        FakeUpstream.supabase_calls += 1
+        time.sleep(AUTH_LATENCY)
+        if self.path.startswith("/auth/v1/user"):
+            self._reply({
+                "id": "bench-user", "aud": "authenticated", "email": "bench@example.com",
+                "app_metadata": {}, "user_metadata": {}, "created_at": "2024-01-01T00:00:00Z",
+            })
+        else:  # /rest/v1/profiles
+            self._reply([{"id": "bench-user", "is_premium": True, "subscription_end_date": None}])
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        with FakeUpstream.lock:
+            FakeUpstream.groq_active += 1
+            over_limit = UPSTREAM_LIMIT and FakeUpstream.groq_active > UPSTREAM_LIMIT
+            if over_limit:
+                FakeUpstream.groq_rejected += 1
+        try:
+            if over_limit:
+                self._reply({"error": {"message": "Rate limit reached", "type": "tokens"}}, status=429)
+            else:
+                self._handle_groq(body)
+        finally:
+            with FakeUpstream.lock:
+                FakeUpstream.groq_active -= 1
+
+    def _handle_groq(self, body):
+        if self.path.endswith("/audio/transcriptions"):
+            time.sleep(FAST_LATENCY)
+            self._reply({"text": "tell me about yourself"})
+            return
+        request = json.loads(body)
+        slow = "slow" in request["messages"][-1]["content"]
+        time.sleep(SLOW_LATENCY if slow else FAST_LATENCY)
+        self._reply({
+            "id": "bench", "object": "chat.completion", "created": int(time.time()), "model": request["model"],
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": "{\"best_match_index\": null}"}}],
+        })
+
+
+class FakeUpstreamServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256   # listen backlog（默认 5，连接一多就会重传 SYN）
+
+
+def start_fake_upstream():
+    server = FakeUpstreamServer(("127.0.0.1", 0), FakeUpstream)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def load_app(path):
+    spec = importlib.util.spec_from_file_location("bench_cloud_main", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.app
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else float("nan")
+
+
+def make_token(user_id="bench-user"):
+    import jwt
+    claims = {"sub": user_id, "email": f"{user_id}@example.com", "aud": "authenticated",
+              "exp": int(time.time()) + 3600}
+    return jwt.encode(claims, JWT_SECRET, algorithm="HS256")
+
+
+async def run_clients(base_url):
+    import httpx
+
+    # 分组统计：默认按 fast / slow，吵闹用户模式下按 用户类型-接口
+    results = {}
+    deadline = time.time() + DURATION
+
+    def record(group, status, latency):
+        entry = results.setdefault(group, {"latencies": [], "errors": {}})
+        if status == 200:
+            entry["latencies"].append(latency)
+        else:
+            entry["errors"][status] = entry["errors"].get(status, 0) + 1
+
+    async def timed_post(http, group, *args, **kwargs):
+        start = time.time()
+        response = await http.post(*args, **kwargs)
+        record(group, response.status_code, time.time() - start)
+
+    def chat_payload(kind, question):
+        return {
+            "model": "llama-3.1-8b-instant",
+            "messages": [{"role": "user", "content": f"{kind} question {question}"}],
+            "temperature": 0.0,
+        }
+
+    async def client(i):
+        rng = random.Random(i)
+        noisy = i < NOISY_CLIENTS
+        user_id = "noisy" if noisy else f"user-{i}"   # 其余每个客户端一个用户
+        headers = {"Authorization": f"Bearer {make_token(user_id)}"}
+        sent = 0
+        async with httpx.AsyncClient(base_url=base_url, timeout=60) as http:
+            while time.time() < deadline:
+                kind = "slow" if rng.random() < SLOW_RATIO else "fast"
+                sent += 1
+                question = rng.randrange(SHARED_PROMPTS) if SHARED_PROMPTS else f"{i}-{sent}"
+                if NOISY_CLIENTS and not noisy:
+                    # 正常用户：一次转录 + 一次 chat，然后"听"一会儿
+                    files = {"file": ("audio.wav", b"RIFF" + bytes(2000), "audio/wav")}
+                    await timed_post(http, "normal transcribe", "/v1/proxy/transcribe", files=files, headers=headers)
+                    await timed_post(http, "normal chat", "/v1/proxy/chat", json=chat_payload("fast", question), headers=headers)
+                    await asyncio.sleep(NORMAL_THINK)
+                else:
+                    group = "noisy chat" if noisy else kind
+                    await timed_post(http, group, "/v1/proxy/chat", json=chat_payload(kind, question), headers=headers)
+
+    start = time.time()
+    await asyncio.gather(*(client(i) for i in range(CONCURRENCY)))
+    elapsed = time.time() - start
+    async with httpx.AsyncClient(base_url=base_url) as http:
+        response = await http.get("/v1/metrics")
+        server_metrics = response.json() if response.status_code == 200 else {}
+    return results, elapsed, server_metrics
+
+
+def main():
+    app_path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+    upstream = start_fake_upstream()
+    upstream_url = f"http://127.0.0.1:{upstream.server_address[1]}"
+    # 必须在导入 main.py 之前设置
+    os.environ["GROQ_BASE_URL"] = upstream_url
+    os.environ["GROQ_API_KEY"] = "bench-key"
+    os.environ["SUPABASE_URL"] = upstream_url
+    os.environ["SUPABASE_SERVICE_KEY"] = "bench-service-key"
+    os.environ["SUPABASE_JWT_SECRET"] = JWT_SECRET
+    sys.path.insert(0, os.path.dirname(os.path.abspath(app_path)))
+
+    import uvicorn
+    app = load_app(app_path)
+    config = uvicorn.Config(app, host="127.0.0.1", port=0, log_level="warning", workers=1)
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    port = server.servers[0].sockets[0].getsockname()[1]
+
+    results, elapsed, server_metrics = asyncio.run(run_clients(f"http://127.0.0.1:{port}"))
+    server.should_exit = True
+    thread.join(timeout=5)
+    upstream.shutdown()
+
+    completed = sum(len(entry["latencies"]) for entry in results.values())
+    errors = sum(sum(entry["errors"].values()) for entry in results.values())
+    print(f"{os.path.basename(app_path)}: {CONCURRENCY} clients, {elapsed:.1f}s, "
+          f"slow upstream {SLOW_LATENCY:.1f}s x {SLOW_RATIO:.0%}, fast {FAST_LATENCY * 1000:.0f} ms")
+    print(f"  throughput {completed / elapsed:6.1f} req/s  ({completed} ok, {errors} errors, "
+          f"{FakeUpstream.supabase_calls} Supabase calls, {FakeUpstream.groq_rejected} upstream 429s)")
+    if server_metrics:
+        print(f"  server: {server_metrics.get('chat_upstream_calls', 0)} upstream chat calls, "
+              f"{server_metrics.get('chat_cache_hits', 0)} cache hits, "
+              f"{server_metrics.get('chat_coalesced', 0)} coalesced")
+        if "scheduler" in server_metrics:
+            print(f"  scheduler: {server_metrics['scheduler']}")
+    for group in sorted(results):
+        values, group_errors = results[group]["latencies"], results[group]["errors"]
+        print(f"  {group:<17} {len(values):>5} ok  p50 {percentile(values, 0.5) * 1000:7.0f} ms  "
+              f"p95 {percentile(values, 0.95) * 1000:7.0f} ms  errors {group_errors or '-'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,22 @@
+import io
 import os
-from fastapi import FastAPI, Header, HTTPException, UploadFile, File, Body
+import time
+import wave
+import json
+import asyncio
+import hashlib
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, AsyncExitStack
+from fastapi import FastAPI, Header, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from starlette.datastructures import UploadFile as StarletteUploadFile
+from starlette.formparsers import MultiPartParser, MultiPartException
 from pydantic import BaseModel
 from typing import List, Dict, Any
-from groq import Groq
-from server_auth import verify_user_token
+from groq import AsyncGroq
+from server_auth import verify_user_token, try_verify_cached, refresh_user
+from scheduler import UpstreamScheduler, QueueTimeout
 
 app = FastAPI()
 
@@ -13,8 +26,61 @@ GROQ_API_KEY = os.environ.get("GROQ_API_KEY")
 if not GROQ_API_KEY:
     print("⚠️ 警告: GROQ_API_KEY 未设置")
 
-# 初始化 Groq 客户端
-server_client = Groq(api_key=GROQ_API_KEY)
+# 初始化 Groq 客户端（异步：等待 Groq 时不占住事件循环，慢请求不会拖住其他用户）
+server_client = AsyncGroq(api_key=GROQ_API_KEY)
+
+# Supabase SDK 是同步的：鉴权放到有界线程池里执行
+AUTH_WORKERS = int(os.environ.get("AUTH_WORKERS", "16"))
+auth_pool = ThreadPoolExecutor(max_workers=AUTH_WORKERS, thread_name_prefix="auth")
+
+# 上游准入调度：全局并发上限 + 每个接口的上限 + 每个用户的令牌桶（每秒 USER_RATE 个，最多攒 USER_BURST 个）
+# 超出的请求排队（转录优先，同优先级按用户轮流），排队超过 ROUTE_QUEUE_TIMEOUT 秒才失败
+scheduler = UpstreamScheduler(
+    max_concurrency=int(os.environ.get("GROQ_CONCURRENCY", "32")),
+    route_limits={
+        "transcribe": int(os.environ.get("TRANSCRIBE_CONCURRENCY", "32")),
+        "chat": int(os.environ.get("CHAT_CONCURRENCY", "24")),
+    },
+    user_rate=float(os.environ.get("USER_RATE", "5")),
+    user_burst=float(os.environ.get("USER_BURST", "20")),
+)
+ROUTE_QUEUE_TIMEOUT = float(os.environ.get("ROUTE_QUEUE_TIMEOUT", "10"))
+
+# temperature=0 的 chat 请求结果是确定的：相同 payload 的并发请求合并成一次上游调用，
+# 结果再缓存 CHAT_CACHE_TTL 秒（大家共用的常见问题/卡片会反复出现）
+CHAT_CACHE_TTL = float(os.environ.get("CHAT_CACHE_TTL", "30"))
+CHAT_CACHE_SIZE = int(os.environ.get("CHAT_CACHE_SIZE", "1024"))
+chat_cache = OrderedDict()       # payload hash -> (expires_at, content)，按最近使用排序
+chat_inflight = {}               # payload hash -> 正在进行的上游调用 (asyncio.Task)
+
+# 运行指标（/v1/metrics）
+metrics = Counter()
+
+# 转录上传支持的格式（客户端通过 /v1/proxy/transcribe/formats 协商）
+# 客户端会先重采样到 16 kHz 单声道再编码，FLAC 优先
+TRANSCRIBE_FORMATS = ["flac", "wav"]
+TRANSCRIBE_SAMPLE_RATE = 16000
+
+# 转录上传：边收边解析，超过大小上限立即 413（不等整个文件传完），时长超过上限也拒绝
+# 文件内容超过 UPLOAD_SPOOL_BYTES 就写到临时文件，再把文件对象直接交给 Groq SDK 分块上传，
+# 每个请求占用的内存不随上传大小增长
+TRANSCRIBE_MAX_BYTES = int(os.environ.get("TRANSCRIBE_MAX_BYTES", str(8 * 1024 * 1024)))
+TRANSCRIBE_MAX_SECONDS = float(os.environ.get("TRANSCRIBE_MAX_SECONDS", "120"))
+UPLOAD_SPOOL_BYTES = 256 * 1024
+UPLOAD_OVERHEAD = 16 * 1024      # multipart 边界和字段头
+
+# 流式转录：客户端按 stream_id 分块上传 16 kHz 16-bit 单声道 PCM
+# 服务端累积同一句话的音频，返回到目前为止的转录
+# 每次转录都要重新发送整句音频：partial 只在累积的音频长度翻倍时转录（1、2、4、8 秒 ...），
+# 一句话所有 partial 加起来不超过这句话本身的时长（每块都转录是平方级，15 秒的问题要转录约 120 秒）
+# final 块总是转录整句
+STREAM_MAX_SECONDS = 30          # 单句上限
+STREAM_MAX_BYTES = STREAM_MAX_SECONDS * TRANSCRIBE_SAMPLE_RATE * 2
+STREAM_FIRST_PARTIAL_SECONDS = 1.0
+STREAM_IDLE_TIMEOUT = 60         # 超过这么久没有新块的 stream 直接丢弃
+# 每个用户同时缓存的 stream 数（超出时丢弃最旧的），缓存内存每用户最多 STREAM_MAX_PER_USER * 960 KB
+STREAM_MAX_PER_USER = int(os.environ.get("STREAM_MAX_PER_USER", "4"))
+stream_buffers = {}              # (user_id, stream_id) -> {"pcm": bytearray, "updated": ts, "next_partial": 字节数}
 
 # --- 数据模型 ---
 class ChatPayload(BaseModel):
@@ -23,84 +89,419 @@ class ChatPayload(BaseModel):
     response_format: Dict[str, Any] = None
     temperature: float = 0.6
 
+class UploadParser(MultiPartParser):
+    spool_max_size = UPLOAD_SPOOL_BYTES
+
+# --- 鉴权 & 并发控制 ---
+async def authenticate(authorization):
+    """
+    校验 Authorization 头，返回 user，失败抛 401
+    本地 JWT 校验 + 缓存命中时直接返回；否则在线程池里查 Supabase
+    """
+    if not authorization:
+        raise HTTPException(401, "Missing Authorization Header")
+
+    token = authorization.replace("Bearer ", "")
+    hit, user = try_verify_cached(token)
+    if not hit:
+        loop = asyncio.get_running_loop()
+        try:
+            user = await loop.run_in_executor(auth_pool, verify_user_token, token)
+        except Exception as e:
+            raise HTTPException(401, f"Auth Failed: {str(e)}")
+    if not user:
+        raise HTTPException(401, "Invalid or Expired Token")
+    return user
+
+@asynccontextmanager
+async def upstream_slot(user, route):
+    """排队占用一个上游名额；用户自己超出速率返回 429，服务端繁忙返回 503"""
+    try:
+        async with scheduler.slot(user.id, route, ROUTE_QUEUE_TIMEOUT):
+            yield
+    except QueueTimeout as e:
+        retry_after = {"Retry-After": str(max(1, round(e.retry_after)))}
+        if e.rate_limited:
+            raise HTTPException(429, "Rate limit exceeded, please slow down", headers=retry_after)
+        raise HTTPException(503, f"Server busy ({route}), please retry", headers=retry_after)
+
+class _SlotStreamingResponse(StreamingResponse):
+    """
+    占着上游名额的流式响应：无论流正常结束、出错、客户端断开，
+    还是断开得太早、生成器根本没开始跑，响应结束时都会调用 on_close
+    （生成器里的 finally 在这些情况下不一定会执行，也可能在被取消后执行不完）
+    """
+
+    def __init__(self, content, on_close, **kwargs):
+        super().__init__(content, **kwargs)
+        self.on_close = on_close
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.on_close()
+
 # --- 根路径 (用于 Render 健康检查) ---
+@app.get("/v1/metrics")
+def get_metrics():
+    return {
+        **metrics,
+        "chat_cache_size": len(chat_cache),
+        "chat_inflight": len(chat_inflight),
+        "scheduler": scheduler.stats(),
+    }
+
 @app.get("/")
 def health_check():
     return {"status": "Cloud Brain is Active 🟢"}
 
-# --- 接口 1: 语音转文字代理 (Proxy Transcribe) ---
-@app.post("/v1/proxy/transcribe")
-async def proxy_transcribe(
-    file: UploadFile = File(...), 
-    authorization: str = Header(None)
-):
-    # 1. 鉴权 (查 Supabase)
+# --- 刷新鉴权缓存（刚升级 Premium 后调用，不用等缓存过期） ---
+@app.post("/v1/auth/refresh")
+async def refresh_auth(authorization: str = Header(None)):
     if not authorization:
         raise HTTPException(401, "Missing Authorization Header")
-    
+
     token = authorization.replace("Bearer ", "")
+    loop = asyncio.get_running_loop()
     try:
-        user = verify_user_token(token)
-        if not user:
-            raise HTTPException(401, "Invalid or Expired Token")
+        user = await loop.run_in_executor(auth_pool, refresh_user, token)
     except Exception as e:
         raise HTTPException(401, f"Auth Failed: {str(e)}")
+    return {"premium": user is not None}
+
+# --- 上传格式协商 ---
+@app.get("/v1/proxy/transcribe/formats")
+def transcribe_formats():
+    return {"formats": TRANSCRIBE_FORMATS, "sample_rate": TRANSCRIBE_SAMPLE_RATE, "streaming": True}
+
+# --- 接口 1: 语音转文字代理 (Proxy Transcribe) ---
+def _too_large(max_bytes):
+    return HTTPException(413, f"Audio file larger than {max_bytes / (1024 * 1024):.1f} MB")
+
+async def _receive_upload(request, max_bytes, max_fields=0):
+    """
+    流式解析 multipart 上传，返回表单（file 字段是 UploadFile，用完调用 form.close()）
+    Content-Length 超过上限直接拒绝；没有 Content-Length（分块上传）时收到的字节数一超过上限就停止读取
+    """
+    limit = max_bytes + UPLOAD_OVERHEAD
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > limit:
+        raise _too_large(max_bytes)
+    if not request.headers.get("content-type", "").startswith("multipart/form-data"):
+        raise HTTPException(400, "Expected multipart/form-data upload")
+
+    async def capped_stream():
+        received = 0
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > limit:
+                raise _too_large(max_bytes)
+            yield chunk
 
-    # 2. 转发给 Groq (消耗你的额度)
     try:
-        # 读取上传的音频文件内容
-        file_content = await file.read()
-        
-        # 传递给 Groq (注意：Groq SDK 需要 file-like object)
-        # 这里为了简单，我们不存盘，直接传流，或者你可以根据 SDK 要求调整
-        # Groq Python SDK 通常接受 tuple ('filename', bytes)
-        
-        transcript = server_client.audio.transcriptions.create(
-            model="whisper-large-v3-turbo",
-            file=(file.filename, file_content), 
-            response_format="json",
-            language="en"
-        )
-        
+        form = await UploadParser(request.headers, capped_stream(), max_files=1, max_fields=max_fields).parse()
+    except MultiPartException as e:
+        raise HTTPException(400, e.message)
+    if not isinstance(form.get("file"), StarletteUploadFile):
+        await form.close()
+        raise HTTPException(400, "Missing audio file")
+    return form
+
+def _audio_duration(f, extension):
+    """从文件头读出音频时长（秒）；读不出来返回 None（交给 Groq 判断）"""
+    f.seek(0, os.SEEK_END)
+    size = f.tell()
+    f.seek(0)
+    try:
+        if extension == "wav":
+            with wave.open(f, "rb") as wav:
+                byte_rate = wav.getframerate() * wav.getnchannels() * wav.getsampwidth()
+            # 不用 header 里的帧数（边录边写的 WAV 里可能是 0 或 0xFFFFFFFF）
+            return (size - 44) / byte_rate if byte_rate else None
+        if extension == "flac":
+            # "fLaC" + 元数据块头 (4 字节) + STREAMINFO：20 位采样率 ... 36 位总采样数
+            header = f.read(42)
+            if len(header) < 42 or header[:4] != b"fLaC":
+                return None
+            fields = int.from_bytes(header[18:26], "big")
+            sample_rate, total_samples = fields >> 44, fields & 0xFFFFFFFFF
+            return total_samples / sample_rate if sample_rate and total_samples else None
+    except (wave.Error, EOFError):
+        return None
+    finally:
+        f.seek(0)
+    return None
+
+@app.post("/v1/proxy/transcribe")
+async def proxy_transcribe(
+    request: Request,
+    authorization: str = Header(None)
+):
+    # 1. 鉴权 (查 Supabase)：在读取上传内容之前，未授权的请求不会占用带宽和磁盘
+    user = await authenticate(authorization)
+
+    # 2. 接收上传（限制大小），检查格式和时长
+    form = await _receive_upload(request, TRANSCRIBE_MAX_BYTES)
+    upload = form["file"]
+    try:
+        extension = os.path.splitext(upload.filename or "")[1].lstrip(".").lower()
+        if extension not in TRANSCRIBE_FORMATS:
+            raise HTTPException(415, f"Unsupported audio format: {extension or 'unknown'}")
+        duration = _audio_duration(upload.file, extension)
+        if duration is not None and duration > TRANSCRIBE_MAX_SECONDS:
+            raise HTTPException(413, f"Audio longer than {TRANSCRIBE_MAX_SECONDS:.0f}s")
+
+        # 3. 转发给 Groq (消耗你的额度)
+        # 直接传文件对象，SDK 分块读取上传（重试时会从头重新读）
+        async with upstream_slot(user, "transcribe"):
+            transcript = await server_client.audio.transcriptions.create(
+                model="whisper-large-v3-turbo",
+                file=(upload.filename, upload.file),
+                response_format="json",
+                language="en"
+            )
+
         return {"text": transcript.text}
 
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Groq Error: {e}")
         raise HTTPException(500, "AI Engine Error")
+    finally:
+        await form.close()
 
 # --- 接口 2: 对话/生成代理 (Proxy Chat) ---
+async def _chat_upstream(payload, user):
+    """转发给 Groq，返回回复内容"""
+    async with upstream_slot(user, "chat"):
+        metrics["chat_upstream_calls"] += 1
+        response = await server_client.chat.completions.create(
+            model=payload.model, # 使用客户端请求的模型 (如 llama-3.1-8b-instant)
+            messages=payload.messages,
+            response_format=payload.response_format,
+            temperature=payload.temperature
+        )
+    return response.choices[0].message.content
+
+def _chat_key(payload):
+    body = json.dumps(payload.model_dump(), sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(body.encode("utf-8")).hexdigest()
+
+def _chat_finished(key, task):
+    """上游调用结束：移出进行中列表，成功的结果写入缓存"""
+    chat_inflight.pop(key, None)
+    if task.cancelled() or task.exception() is not None or CHAT_CACHE_TTL <= 0:
+        return
+    chat_cache[key] = (time.time() + CHAT_CACHE_TTL, task.result())
+    chat_cache.move_to_end(key)
+    while len(chat_cache) > CHAT_CACHE_SIZE:
+        chat_cache.popitem(last=False)
+
+async def _chat_deduplicated(payload, user):
+    """
+    temperature=0 的请求：先查缓存，再看有没有相同的请求正在进行（有就一起等结果）
+    上游调用是独立的任务，发起它的客户端断开也不会影响其他等待者
+    （排队和速率限制算在发起上游调用的用户头上，缓存命中和合并的请求不占额度）
+    发起者被限速 / 排队超时（429/503）时，合并进来的其他用户用自己的名额重新请求，
+    不会替别人背 429
+    """
+    key = _chat_key(payload)
+    cached = chat_cache.get(key)
+    if cached and cached[0] > time.time():
+        metrics["chat_cache_hits"] += 1
+        chat_cache.move_to_end(key)
+        return cached[1]
+
+    task = chat_inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_chat_upstream(payload, user))
+        chat_inflight[key] = task
+        task.add_done_callback(lambda t: _chat_finished(key, t))
+        return await asyncio.shield(task)
+
+    metrics["chat_coalesced"] += 1
+    try:
+        return await asyncio.shield(task)
+    except HTTPException:
+        # _chat_upstream 只有调度器（upstream_slot）会抛 HTTPException：那是发起者的额度问题
+        metrics["chat_coalesced_retries"] += 1
+        return await _chat_upstream(payload, user)
+
 @app.post("/v1/proxy/chat")
 async def proxy_chat(
     payload: ChatPayload, 
     authorization: str = Header(None)
 ):
     # 1. 鉴权
-    if not authorization:
-        raise HTTPException(401, "Missing Authorization Header")
-    
-    token = authorization.replace("Bearer ", "")
-    try:
-        user = verify_user_token(token)
-        if not user:
-            raise HTTPException(401, "Invalid Token")
-    except Exception as e:
-        raise HTTPException(401, f"Auth Failed: {str(e)}")
+    user = await authenticate(authorization)
 
-    # 2. 转发给 Groq
+    # 2. 转发给 Groq（确定性的请求合并 + 缓存）
+    metrics["chat_requests"] += 1
     try:
-        response = server_client.chat.completions.create(
-            model=payload.model, # 使用客户端请求的模型 (如 llama-3.1-8b-instant)
-            messages=payload.messages,
-            response_format=payload.response_format,
-            temperature=payload.temperature
-        )
+        if payload.temperature == 0:
+            content = await _chat_deduplicated(payload, user)
+        else:
+            content = await _chat_upstream(payload, user)
         
         # 返回完整响应结构或只返回内容，这里为了兼容性返回关键内容
         return {
-            "content": response.choices[0].message.content,
+            "content": content,
             # 如果需要，也可以返回 usage 信息用于统计
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Groq Chat Error: {e}")
-        raise HTTPException(500, f"AI Generation Error: {str(e)}")
\ No newline at end of file
+        raise HTTPException(500, f"AI Generation Error: {str(e)}")
+
+def _sse(data):
+    return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/v1/proxy/chat/stream")
+async def proxy_chat_stream(
+    payload: ChatPayload,
+    authorization: str = Header(None)
+):
+    """
+    流式对话：把 Groq 的 token 逐段转发成 SSE
+    - 每段: data: {"delta": "..."}
+    - 结束: data: [DONE]；中途出错: data: {"error": "..."}
+    排队、鉴权和上游连接的错误在开始推送之前以普通 HTTP 错误返回
+    客户端断开时上游流随之关闭，上游名额一直占到响应结束（见 _SlotStreamingResponse）
+    """
+    user = await authenticate(authorization)
+    metrics["chat_stream_requests"] += 1
+
+    stack = AsyncExitStack()
+    await stack.enter_async_context(upstream_slot(user, "chat"))
+    try:
+        metrics["chat_upstream_calls"] += 1
+        stream = await server_client.chat.completions.create(
+            model=payload.model,
+            messages=payload.messages,
+            response_format=payload.response_format,
+            temperature=payload.temperature,
+            stream=True
+        )
+    except Exception as e:
+        await stack.aclose()
+        print(f"Groq Chat Stream Error: {e}")
+        raise HTTPException(500, f"AI Generation Error: {str(e)}")
+
+    async def event_stream():
+        try:
+            async for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    yield _sse({"delta": delta})
+            yield "data: [DONE]\n\n"
+        except Exception as e:
+            print(f"Groq Chat Stream Error: {e}")
+            yield _sse({"error": str(e)})
+
+    async def finish():
+        # 先还名额（shield：被取消也要还完），再关上游流；关流出错不影响名额
+        try:
+            await asyncio.shield(stack.aclose())
+        finally:
+            try:
+                await stream.close()
+            except Exception as e:
+                print(f"Groq Chat Stream close error: {e}")
+
+    return _SlotStreamingResponse(
+        event_stream(),
+        on_close=finish,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# --- 接口 3: 流式语音转文字 (Proxy Transcribe Stream) ---
+def _pcm_to_wav(pcm):
+    """16 kHz 16-bit 单声道 PCM -> WAV bytes"""
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(TRANSCRIBE_SAMPLE_RATE)
+        wav.writeframes(pcm)
+    return buf.getvalue()
+
+def _prune_streams():
+    now = time.time()
+    for key in [k for k, v in stream_buffers.items() if now - v["updated"] > STREAM_IDLE_TIMEOUT]:
+        del stream_buffers[key]
+
+def _open_stream(user_id, key):
+    """新建一个 stream 缓存；这个用户的 stream 数到上限时丢弃最旧的"""
+    mine = [k for k in stream_buffers if k[0] == user_id]
+    while len(mine) >= STREAM_MAX_PER_USER:
+        oldest = min(mine, key=lambda k: stream_buffers[k]["updated"])
+        del stream_buffers[oldest]
+        mine.remove(oldest)
+    stream = stream_buffers[key] = {
+        "pcm": bytearray(),
+        "updated": 0,
+        "next_partial": int(STREAM_FIRST_PARTIAL_SECONDS * TRANSCRIBE_SAMPLE_RATE * 2),
+    }
+    return stream
+
+@app.post("/v1/proxy/transcribe/stream")
+async def proxy_transcribe_stream(
+    request: Request,
+    authorization: str = Header(None)
+):
+    # 1. 鉴权
+    user = await authenticate(authorization)
+
+    # 2. 接收这一块（限制大小：一块不会超过整句的上限）
+    form = await _receive_upload(request, STREAM_MAX_BYTES, max_fields=2)
+    try:
+        stream_id = form.get("stream_id")
+        if not isinstance(stream_id, str) or not stream_id:
+            raise HTTPException(400, "Missing stream_id")
+        final = str(form.get("final", "false")).lower() in ("true", "1", "yes", "on")
+        chunk = await form["file"].read()
+    finally:
+        await form.close()
+
+    # 3. 累积这句话的音频
+    _prune_streams()
+    key = (user.id, stream_id)
+    stream = stream_buffers.get(key) or _open_stream(user.id, key)
+    if len(stream["pcm"]) + len(chunk) > STREAM_MAX_BYTES:
+        stream_buffers.pop(key, None)
+        raise HTTPException(413, f"Stream longer than {STREAM_MAX_SECONDS}s")
+    stream["pcm"] += chunk
+    stream["updated"] = time.time()
+
+    if final:
+        stream_buffers.pop(key, None)
+    elif len(stream["pcm"]) < stream["next_partial"]:
+        # 还没到下一次 partial 转录的长度：只缓存
+        return {"text": "", "final": False}
+    else:
+        stream["next_partial"] = len(stream["pcm"]) * 2
+    pcm = bytes(stream["pcm"])
+    if not pcm:
+        return {"text": "", "final": final}
+
+    # 4. 转写到目前为止的整句音频
+    try:
+        async with upstream_slot(user, "transcribe"):
+            transcript = await server_client.audio.transcriptions.create(
+                model="whisper-large-v3-turbo",
+                file=("stream.wav", _pcm_to_wav(pcm)),
+                response_format="json",
+                language="en"
+            )
+        return {"text": transcript.text, "final": final}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Groq Stream Error: {e}")
+        raise HTTPException(500, "AI Engine Error")
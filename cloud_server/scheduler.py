@@ -0,0 +1,218 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+
+# 上游 (Groq) 准入调度：所有转发给 Groq 的请求先在这里排队
+# - 全局并发上限 + 每个接口的并发上限
+# - 每个用户一个令牌桶：一个客户端刷请求只会让自己排队，不会把共享的 Groq 额度用光
+# - 转录优先于生成（面试中等转录的用户最着急）
+# - 同一优先级内按用户轮流放行（公平排队），排队超过 deadline 才失败
+# 只在事件循环线程里使用，不需要加锁
+
+PRIORITY_TRANSCRIBE = 0
+PRIORITY_CHAT = 1
+ROUTE_PRIORITY = {"transcribe": PRIORITY_TRANSCRIBE, "chat": PRIORITY_CHAT}
+WAIT_SAMPLES = 1000     # 最近多少次等待时间用于计算 p95
+IDLE_BUCKET_TTL = 300   # 用户多久没有请求后丢弃令牌桶
+
+
+class QueueTimeout(Exception):
+    """排队超过 deadline；rate_limited 表示是因为这个用户自己的令牌用完了"""
+
+    def __init__(self, route, rate_limited, retry_after):
+        super().__init__(f"Upstream queue timeout ({route})")
+        self.route = route
+        self.rate_limited = rate_limited
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def available(self, now):
+        self._refill(now)
+        return self.tokens >= 1
+
+    def take(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+    def wait_time(self, now):
+        """还要多久才有一个令牌"""
+        self._refill(now)
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+
+class _Waiter:
+    __slots__ = ("user_id", "route", "future", "enqueued_at")
+
+    def __init__(self, user_id, route, future, enqueued_at):
+        self.user_id = user_id
+        self.route = route
+        self.future = future
+        self.enqueued_at = enqueued_at
+
+
+class UpstreamScheduler:
+    def __init__(self, max_concurrency, route_limits, user_rate, user_burst):
+        self.max_concurrency = max_concurrency
+        self.route_limits = route_limits
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.active = 0
+        self.route_active = {route: 0 for route in route_limits}
+        self._buckets = {}          # user_id -> TokenBucket
+        # 每个优先级一个队列：user_id -> 这个用户排队中的请求；OrderedDict 的顺序就是轮转顺序
+        self._queues = {priority: OrderedDict() for priority in sorted(set(ROUTE_PRIORITY.values()))}
+        self._wakeup = None         # 令牌补充后重新调度的定时器
+        self._waits = deque(maxlen=WAIT_SAMPLES)
+        self.admitted = 0
+        self.timeouts = 0
+        self.rate_limited = 0
+
+    def _bucket(self, user_id):
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            if len(self._buckets) > 10000:
+                self._prune_buckets()
+            bucket = self._buckets[user_id] = TokenBucket(self.user_rate, self.user_burst)
+        return bucket
+
+    def _prune_buckets(self):
+        now = time.monotonic()
+        queued = {user_id for queue in self._queues.values() for user_id in queue}
+        for user_id in [u for u, b in self._buckets.items() if now - b.updated > IDLE_BUCKET_TTL and u not in queued]:
+            del self._buckets[user_id]
+
+    def _has_capacity(self, route):
+        return self.active < self.max_concurrency and self.route_active[route] < self.route_limits[route]
+
+    def _admit(self, user_id, route, now):
+        self._bucket(user_id).take(now)
+        self.active += 1
+        self.route_active[route] += 1
+        self.admitted += 1
+
+    def _release(self, route):
+        self.active -= 1
+        self.route_active[route] -= 1
+        self._dispatch()
+
+    def _queued(self, priority=None):
+        queues = self._queues.values() if priority is None else [
+            q for p, q in self._queues.items() if p <= priority
+        ]
+        return any(queue for queue in queues)
+
+    def _dispatch(self):
+        """按 优先级 -> 用户轮转 放行排队中的请求，直到没有名额或没有可以放行的请求"""
+        now = time.monotonic()
+        next_refill = None
+        while self.active < self.max_concurrency:
+            admitted = False
+            for queue in self._queues.values():
+                for user_id in list(queue):
+                    waiters = queue[user_id]
+                    waiter = waiters[0]
+                    if not self._has_capacity(waiter.route):
+                        continue
+                    bucket = self._bucket(user_id)
+                    if not bucket.available(now):
+                        wait = bucket.wait_time(now)
+                        next_refill = wait if next_refill is None else min(next_refill, wait)
+                        continue
+                    waiters.popleft()
+                    # 放行后这个用户排到队尾，其他用户先轮
+                    if waiters:
+                        queue.move_to_end(user_id)
+                    else:
+                        del queue[user_id]
+                    self._admit(user_id, waiter.route, now)
+                    self._waits.append(now - waiter.enqueued_at)
+                    waiter.future.set_result(None)
+                    admitted = True
+                    break
+                if admitted:
+                    break
+            if not admitted:
+                break
+
+        if next_refill is not None and self._wakeup is None:
+            loop = asyncio.get_running_loop()
+            self._wakeup = loop.call_later(next_refill, self._on_wakeup)
+
+    def _on_wakeup(self):
+        self._wakeup = None
+        self._dispatch()
+
+    def _remove(self, waiter):
+        queue = self._queues[ROUTE_PRIORITY[waiter.route]]
+        waiters = queue.get(waiter.user_id)
+        if waiters and waiter in waiters:
+            waiters.remove(waiter)
+            if not waiters:
+                del queue[waiter.user_id]
+
+    @asynccontextmanager
+    async def slot(self, user_id, route, deadline):
+        """
+        占用一个上游名额（async with），最多排队 deadline 秒，超时抛 QueueTimeout
+        前面没有同等或更高优先级的请求在排队时直接放行，不进队列
+        """
+        priority = ROUTE_PRIORITY[route]
+        now = time.monotonic()
+        if (not self._queued(priority) and self._has_capacity(route)
+                and self._bucket(user_id).available(now)):
+            self._admit(user_id, route, now)
+            self._waits.append(0.0)
+        else:
+            future = asyncio.get_running_loop().create_future()
+            waiter = _Waiter(user_id, route, future, now)
+            self._queues[priority].setdefault(user_id, deque()).append(waiter)
+            self._dispatch()
+            try:
+                await asyncio.wait_for(asyncio.shield(future), deadline)
+            except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+                if future.done() and not future.cancelled():
+                    # 刚好在超时的同时被放行：名额已经占上了，还回去
+                    self._release(route)
+                else:
+                    future.cancel()
+                    self._remove(waiter)
+                if isinstance(e, asyncio.CancelledError):
+                    raise
+                self.timeouts += 1
+                bucket = self._bucket(user_id)
+                rate_limited = not bucket.available(time.monotonic())
+                if rate_limited:
+                    self.rate_limited += 1
+                raise QueueTimeout(route, rate_limited, bucket.wait_time(time.monotonic()))
+        try:
+            yield
+        finally:
+            self._release(route)
+
+    def stats(self):
+        waits = sorted(self._waits)
+        return {
+            "active": self.active,
+            "queued": {
+                route: sum(1 for waiters in self._queues[priority].values() for w in waiters if w.route == route)
+                for route, priority in ROUTE_PRIORITY.items()
+            },
+            "admitted": self.admitted,
+            "timeouts": self.timeouts,
+            "rate_limited": self.rate_limited,
+            "wait_ms_avg": round(sum(waits) / len(waits) * 1000, 1) if waits else 0.0,
+            "wait_ms_p95": round(waits[int(len(waits) * 0.95)] * 1000, 1) if waits else 0.0,
+            "wait_ms_max": round(waits[-1] * 1000, 1) if waits else 0.0,
+        }
@@ -1,10 +1,29 @@
 import os
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import Future
 from supabase import create_client, Client
-from datetime import datetime
+from datetime import datetime, timezone
+
+try:
+    import jwt  # PyJWT
+except ImportError:
+    jwt = None
 
 # 读取环境变量
 url: str = os.environ.get("SUPABASE_URL")
-key: str = os.environ.get("SUPABASE_SERVICE_KEY") 
+key: str = os.environ.get("SUPABASE_SERVICE_KEY")
+# Supabase 项目的 JWT Secret（Settings -> API）：设置后本地校验签名和过期时间，不再调用 auth.get_user
+JWT_SECRET = os.environ.get("SUPABASE_JWT_SECRET")
+
+# Premium 状态缓存（按 user id），到期后重新查 profiles 表；没有权限的结果缓存时间短一些，升级后很快生效
+PROFILE_CACHE_TTL = float(os.environ.get("PROFILE_CACHE_TTL", "300"))
+PROFILE_NEGATIVE_TTL = float(os.environ.get("PROFILE_NEGATIVE_TTL", "15"))
+PROFILE_CACHE_SIZE = 10000
+# 验证过的 token 缓存到它自己的过期时间（没有 JWT Secret 时 auth.get_user 的结果最多缓存 TOKEN_CACHE_TTL 秒）
+TOKEN_CACHE_TTL = float(os.environ.get("TOKEN_CACHE_TTL", "60"))
+TOKEN_CACHE_SIZE = 10000
 
 if not url or not key:
     print("⚠️ 警告: Supabase URL 或 Key 未设置，鉴权将失败")
@@ -12,60 +31,228 @@ if not url or not key:
 else:
     supabase: Client = create_client(url, key)
 
-def verify_user_token(token: str):
-    """
-    验证用户 Token 是否有效，并检查是否有 Premium 权限
-    返回: user 对象 (如果有权限) 或 None
-    """
+if JWT_SECRET and jwt is None:
+    print("⚠️ 警告: 设置了 SUPABASE_JWT_SECRET 但没有安装 PyJWT，退回到 auth.get_user")
+
+# 本地校验 JWT 得到的用户（只有 main.py 用到的字段）
+AuthUser = namedtuple("AuthUser", ["id", "email"])
+
+# 缓存的 Premium 状态；end_date 为 None 表示永久有效
+ProfileEntry = namedtuple("ProfileEntry", ["is_premium", "end_date", "expires_at"])
+
+
+class SingleFlight:
+    """同一个 key 的并发查询只执行一次，其余调用等待并共用结果"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if not leader:
+            return future.result()
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+
+_lock = threading.Lock()
+_profiles = {}      # user_id -> ProfileEntry
+_tokens = {}        # token -> (user, expires_at)
+_flight = SingleFlight()
+
+
+def _cache_token(token, user, expires_at):
+    with _lock:
+        if len(_tokens) >= TOKEN_CACHE_SIZE:
+            now = time.time()
+            for t in [t for t, (_, exp) in _tokens.items() if exp <= now]:
+                del _tokens[t]
+            if len(_tokens) >= TOKEN_CACHE_SIZE:
+                _tokens.clear()
+        _tokens[token] = (user, expires_at)
+
+
+def _decode_local(token):
+    """本地校验签名、过期时间和 audience；返回 AuthUser，无效返回 None"""
+    try:
+        claims = jwt.decode(token, JWT_SECRET, algorithms=["HS256"], audience="authenticated")
+    except jwt.InvalidTokenError:
+        return None
+    if not claims.get("sub"):
+        return None
+    user = AuthUser(claims["sub"], claims.get("email"))
+    # 同一个 token 之后只需要查字典（签名已经验证过，过期时间到了自动失效）
+    _cache_token(token, user, claims.get("exp", time.time() + TOKEN_CACHE_TTL))
+    return user
+
+
+def _token_expiry(token):
+    """token 自带的过期时间（不校验签名，只用来限制缓存时间）"""
+    if jwt is None:
+        return None
+    try:
+        return jwt.decode(token, options={"verify_signature": False}).get("exp")
+    except jwt.InvalidTokenError:
+        return None
+
+
+def _fetch_user(token):
+    """调用 auth.get_user 验证 token 并缓存结果"""
+    user_response = supabase.auth.get_user(token)
+    user = user_response.user if user_response else None
+    if user is not None:
+        expires_at = time.time() + TOKEN_CACHE_TTL
+        exp = _token_expiry(token)
+        if exp is not None:
+            expires_at = min(expires_at, exp)
+        _cache_token(token, user, expires_at)
+    return user
+
+
+def _cached_user(token):
+    """只用本地校验/缓存识别用户：返回 (命中, user)"""
+    cached = _tokens.get(token)
+    if cached and cached[1] > time.time():
+        return True, cached[0]
+    if JWT_SECRET and jwt is not None:
+        return True, _decode_local(token)
+    return False, None
+
+
+def _identify(token):
+    """1. 验证 Token，返回 user 或 None（Token 无效）"""
+    hit, user = _cached_user(token)
+    if hit:
+        return user
     if not supabase:
         raise Exception("Supabase 未配置")
+    return _flight.do(("token", token), lambda: _fetch_user(token))
 
-    # 1. 验证 Token
-    user_response = supabase.auth.get_user(token)
-    
-    if not user_response or not user_response.user:
-        return None  # Token 无效
 
-    user = user_response.user
-    
-    # 2. 从 profiles 表检查用户的 Premium 状态
-    try:
-        profile_response = supabase.table('profiles').select('*').eq('id', user.id).execute()
-        
-        # 如果没有 profile 记录，拒绝访问
-        if not profile_response.data or len(profile_response.data) == 0:
-            print(f"⚠️ 用户 {user.email} 没有 profile 记录，拒绝访问")
-            return None
-        
+def _parse_end_date(subscription_end_date):
+    return datetime.fromisoformat(subscription_end_date.replace('Z', '+00:00'))
+
+
+def _fetch_profile(user):
+    """2. 从 profiles 表读取用户的 Premium 状态并缓存；查询失败抛异常（不缓存）"""
+    profile_response = supabase.table('profiles').select('*').eq('id', user.id).execute()
+    now = time.time()
+
+    # 如果没有 profile 记录，拒绝访问
+    if not profile_response.data or len(profile_response.data) == 0:
+        print(f"⚠️ 用户 {user.email} 没有 profile 记录，拒绝访问")
+        entry = ProfileEntry(False, None, now + PROFILE_NEGATIVE_TTL)
+    else:
         profile = profile_response.data[0]
-        
+        subscription_end_date = profile.get('subscription_end_date')
         # 3. 检查 is_premium 字段
         if not profile.get('is_premium'):
             print(f"⚠️ 用户 {user.email} 不是 Premium 用户")
-            return None
-        
-        # 4. 检查订阅是否过期
-        subscription_end_date = profile.get('subscription_end_date')
-        if subscription_end_date:
-            # 解析日期字符串
+            entry = ProfileEntry(False, None, now + PROFILE_NEGATIVE_TTL)
+        elif subscription_end_date:
             try:
-                end_date = datetime.fromisoformat(subscription_end_date.replace('Z', '+00:00'))
-                now = datetime.now(end_date.tzinfo)
-                
-                if now > end_date:
-                    print(f"⚠️ 用户 {user.email} 的 Premium 订阅已过期 (过期时间: {subscription_end_date})")
-                    return None
-                    
+                entry = ProfileEntry(True, _parse_end_date(subscription_end_date), now + PROFILE_CACHE_TTL)
                 print(f"✅ 验证通过: {user.email} (Premium, 有效期至 {subscription_end_date})")
             except Exception as e:
                 print(f"⚠️ 解析订阅日期失败: {e}")
-                return None
+                entry = ProfileEntry(False, None, now + PROFILE_NEGATIVE_TTL)
         else:
             # 如果没有设置过期时间，视为永久 Premium
             print(f"✅ 验证通过: {user.email} (Premium, 永久有效)")
-        
-        return user
-        
-    except Exception as e:
-        print(f"❌ 检查 Premium 状态失败: {e}")
-        return None
\ No newline at end of file
+            entry = ProfileEntry(True, None, now + PROFILE_CACHE_TTL)
+
+    with _lock:
+        if len(_profiles) >= PROFILE_CACHE_SIZE:
+            for user_id in [k for k, v in _profiles.items() if v.expires_at <= now]:
+                del _profiles[user_id]
+        _profiles[user.id] = entry
+    return entry
+
+
+def _is_active(user, entry):
+    """4. 检查订阅是否过期（缓存的结果每次都重新比较当前时间）"""
+    if not entry.is_premium:
+        return False
+    if entry.end_date is not None and datetime.now(timezone.utc) > entry.end_date:
+        print(f"⚠️ 用户 {user.email} 的 Premium 订阅已过期 (过期时间: {entry.end_date.isoformat()})")
+        return False
+    return True
+
+
+def try_verify_cached(token: str):
+    """
+    只用本地 JWT 校验和缓存验证（不发网络请求，微秒级，可以直接在事件循环里调用）
+    返回: (True, user 或 None) 已得出结论；(False, None) 需要调用 verify_user_token
+    """
+    hit, user = _cached_user(token)
+    if not hit:
+        return False, None
+    if user is None:
+        return True, None
+    with _lock:
+        entry = _profiles.get(user.id)
+    if entry is None or entry.expires_at <= time.time():
+        return False, None
+    return True, (user if _is_active(user, entry) else None)
+
+
+def verify_user_token(token: str):
+    """
+    验证用户 Token 是否有效，并检查是否有 Premium 权限
+    返回: user 对象 (如果有权限) 或 None
+    同一个 token / 用户的并发查询只会发出一次 Supabase 请求
+    """
+    if not supabase:
+        raise Exception("Supabase 未配置")
+
+    user = _identify(token)
+    if user is None:
+        return None  # Token 无效
+
+    with _lock:
+        entry = _profiles.get(user.id)
+    if entry is None or entry.expires_at <= time.time():
+        try:
+            entry = _flight.do(("profile", user.id), lambda: _fetch_profile(user))
+        except Exception as e:
+            print(f"❌ 检查 Premium 状态失败: {e}")
+            return None
+
+    return user if _is_active(user, entry) else None
+
+
+def invalidate_user(user_id=None):
+    """清除缓存（user_id=None 清空全部）；在 profiles 表里修改 Premium 状态后调用"""
+    with _lock:
+        if user_id is None:
+            _profiles.clear()
+            _tokens.clear()
+            return
+        _profiles.pop(user_id, None)
+        for token in [t for t, (user, _) in _tokens.items() if user.id == user_id]:
+            del _tokens[token]
+
+
+def refresh_user(token: str):
+    """清除这个 token 对应用户的缓存并重新验证（例如刚升级 Premium 后调用）"""
+    if not supabase:
+        raise Exception("Supabase 未配置")
+    user = _identify(token)
+    if user is None:
+        return None
+    invalidate_user(user.id)
+    return verify_user_token(token)
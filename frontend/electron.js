@@ -465,36 +465,7 @@ function createPopupWindow(cardData) {
 
   popupWindow.webContents.on('did-finish-load', () => {
     popupWindow.webContents.send('card-data', cardData);
-    
-    // Auto-adjust window size to fit content
-    setTimeout(() => {
-      popupWindow.webContents.executeJavaScript(`
-        (function() {
-          const container = document.querySelector('.popup-container');
-          if (container) {
-            const rect = container.getBoundingClientRect();
-            return {
-              width: Math.ceil(rect.width),
-              height: Math.ceil(rect.height)
-            };
-          }
-          return null;
-        })();
-      `).then(size => {
-        if (size && popupWindow && !popupWindow.isDestroyed()) {
-          const bounds = popupWindow.getBounds();
-          const newWidth = Math.max(320, Math.min(620, size.width + 40));
-          const newHeight = Math.max(170, Math.min(600, size.height + 40));
-          
-          popupWindow.setBounds({
-            x: bounds.x,
-            y: bounds.y,
-            width: newWidth,
-            height: newHeight
-          });
-        }
-      }).catch(err => console.error('Error adjusting window size:', err));
-    }, 150);
+    fitPopupToContent();
   });
 
   popupWindow.on('close', () => {
@@ -513,6 +484,39 @@ function createPopupWindow(cardData) {
   });
 }
 
+// Auto-adjust window size to fit content
+function fitPopupToContent() {
+  setTimeout(() => {
+    if (!popupWindow || popupWindow.isDestroyed()) return;
+    popupWindow.webContents.executeJavaScript(`
+      (function() {
+        const container = document.querySelector('.popup-container');
+        if (container) {
+          const rect = container.getBoundingClientRect();
+          return {
+            width: Math.ceil(rect.width),
+            height: Math.ceil(rect.height)
+          };
+        }
+        return null;
+      })();
+    `).then(size => {
+      if (size && popupWindow && !popupWindow.isDestroyed()) {
+        const bounds = popupWindow.getBounds();
+        const newWidth = Math.max(320, Math.min(620, size.width + 40));
+        const newHeight = Math.max(170, Math.min(600, size.height + 40));
+        
+        popupWindow.setBounds({
+          x: bounds.x,
+          y: bounds.y,
+          width: newWidth,
+          height: newHeight
+        });
+      }
+    }).catch(err => console.error('Error adjusting window size:', err));
+  }, 150);
+}
+
 app.whenReady().then(async () => {
   // ✨ 启动后端（带重试机制）
   let backendStarted = false;
@@ -674,6 +678,22 @@ ipcMain.on('show-popup', (event, cardData) => {
   createPopupWindow(cardData);
 });
 
+// 流式生成中的卡片：在已经打开的弹窗里更新内容（弹窗还在加载时等 did-finish-load 发送最新内容）
+ipcMain.on('update-popup', (event, cardData) => {
+  if (!popupWindow || popupWindow.isDestroyed()) {
+    createPopupWindow(cardData);
+    return;
+  }
+  if (popupWindow.webContents.isLoading()) {
+    popupWindow.webContents.once('did-finish-load', () => {
+      popupWindow.webContents.send('card-data', cardData);
+    });
+    return;
+  }
+  popupWindow.webContents.send('card-data', cardData);
+  fitPopupToContent();
+});
+
 // Listen for close popup request
 ipcMain.on('close-popup', () => {
   if (popupWindow && !popupWindow.isDestroyed()) {
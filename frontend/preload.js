@@ -7,6 +7,11 @@ contextBridge.exposeInMainWorld('electronAPI', {
     ipcRenderer.send('show-popup', cardData);
   },
   
+  // 更新当前弹窗的内容（流式生成的卡片逐步变长）；弹窗已关闭时重新弹出
+  updatePopup: (cardData) => {
+    ipcRenderer.send('update-popup', cardData);
+  },
+
   // 关闭弹窗
   closePopup: () => {
     ipcRenderer.send('close-popup');
@@ -7,6 +7,21 @@ import useSystemTheme from './hooks/useSystemTheme';
 import LoginPage from './components/LoginPage'
 import { useAuth } from './contexts/AuthContext'
 
+// Transcript history is paginated by the backend (/api/transcripts?offset=&limit=)
+const TRANSCRIPT_PAGE_SIZE = 100;
+// 推送通道连续出错这么多次才退回轮询（中间由 EventSource 自己重连）
+const SSE_MAX_FAILURES = 3;
+// 退回轮询后每隔这么久重新试一次推送通道
+const SSE_RETRY_MS = 30000;
+
+const fetchTranscriptPage = async (offset) => {
+  const response = await fetch(`http://127.0.0.1:8000/api/transcripts?offset=${offset}&limit=${TRANSCRIPT_PAGE_SIZE}`);
+  if (!response.ok) return null;
+  const data = await response.json();
+  const transcripts = data.transcripts || [];
+  return { transcripts, total: typeof data.total === 'number' ? data.total : offset + transcripts.length };
+};
+
 function MainApp() {
   const navigate = useNavigate();
   const location = useLocation();
@@ -110,23 +125,43 @@ function MainApp() {
   
   // ✨ New: Transcript history for storing past recordings
   const [transcriptHistory, setTranscriptHistory] = useState([]);
-  
+  // How many transcripts have been fetched from the backend / how many it has in total
+  // (counted separately from transcriptHistory.length, which shrinks when one is deleted locally)
+  const [transcriptPaging, setTranscriptPaging] = useState({ loaded: 0, total: 0 });
+
+  // Reload the first page (on mount and after an interview stops)
+  const reloadTranscriptHistory = async () => {
+    try {
+      const page = await fetchTranscriptPage(0);
+      if (page) {
+        setTranscriptHistory(page.transcripts);
+        setTranscriptPaging({ loaded: page.transcripts.length, total: page.total });
+        console.log(`📋 Loaded ${page.transcripts.length} of ${page.total} transcripts from backend`);
+      }
+    } catch (error) {
+      console.error('Error loading transcript history:', error);
+    }
+  };
+
+  // Append the next page of older transcripts
+  const loadMoreTranscripts = async () => {
+    try {
+      const page = await fetchTranscriptPage(transcriptPaging.loaded);
+      if (page) {
+        setTranscriptHistory(prev => {
+          const seen = new Set(prev.map(t => t.id));
+          return [...prev, ...page.transcripts.filter(t => !seen.has(t.id))];
+        });
+        setTranscriptPaging(prev => ({ loaded: prev.loaded + page.transcripts.length, total: page.total }));
+      }
+    } catch (error) {
+      console.error('Error loading more transcripts:', error);
+    }
+  };
+
   // ✨ Load transcript history from backend when component mounts
   useEffect(() => {
-    const loadTranscriptHistory = async () => {
-      try {
-        const response = await fetch('http://127.0.0.1:8000/api/transcripts');
-        if (response.ok) {
-          const data = await response.json();
-          setTranscriptHistory(data.transcripts || []);
-          console.log(`📋 Loaded ${data.transcripts?.length || 0} transcripts from backend`);
-        }
-      } catch (error) {
-        console.error('Error loading transcript history:', error);
-      }
-    };
-    
-    loadTranscriptHistory();
+    reloadTranscriptHistory();
   }, []);
 
   // ✨ 监听自动更新事件
@@ -216,94 +251,170 @@ function MainApp() {
     }
   }, [transcript, currentPage, userHasScrolled]);
 
-  // 2. Core logic: Poll backend every 100ms
+  // 2. Core logic: subscribe to backend push channel (SSE), fall back to polling /api/poll after repeated errors
+  // 当前展示的卡片 { id, content, streaming, incomplete }：流式生成的卡片 id 不变，内容逐步变长
+  const activeCardRef = useRef(null);
   useEffect(() => {
-    // Only poll in interview mode
+    // Only listen in interview mode
     if (currentPage !== 'interview') return;
 
-    const intervalId = setInterval(async () => {
-      try {
-        // Send request to backend endpoint
-        const response = await fetch('http://127.0.0.1:8000/api/poll');
-        
-        if (!response.ok) {
-          setStatus("Backend connection lost ❌");
-          return;
+    // 🚨 检查云端 API 错误（权限问题）- 优先显示
+    const applyStatus = (running, cloudApiError) => {
+      if (cloudApiError) {
+        const { status, message } = cloudApiError;
+        if (status === 401) {
+          setStatus('❌ Access Denied: Please login with valid credentials');
+        } else if (status === 403) {
+          setStatus('❌ Access Denied: Premium subscription required');
+        } else {
+          setStatus(`❌ Cloud API Error: ${status}`);
         }
+      } else if (typeof running !== 'undefined') {
+        setIsRunning(running);
+        setStatus(running ? "Listening to AI brain... 🟢" : "click Start button to launch");
+      } else {
+        setStatus("Listening to AI brain... 🟢");
+      }
+    };
 
-        const data = await response.json();
+    // Backend may return two structures: { card } or old { card_id, card_data }
+    const applyCard = (data) => {
+      const card = data.card || (data.card_id ? { id: data.card_id, ...data.card_data } : null);
+      // No matching card found: don't auto-hide, stay as is
+      if (!card) return;
+      const active = activeCardRef.current;
+      const sameCard = active !== null && active.id === card.id;
+      const streaming = Boolean(card.streaming);
+      const incomplete = Boolean(card.incomplete);
+      // 同一张卡片、内容也没变：不用重新渲染
+      if (sameCard && active.content === card.content && active.streaming === streaming
+          && active.incomplete === incomplete) return;
+      if (!sameCard) console.log("Found new card!", card);
+      activeCardRef.current = { id: card.id, content: card.content, streaming, incomplete };
 
-        // 🚨 检查云端 API 错误（权限问题）- 优先显示
-        if (data.cloud_api_error) {
-          const { status, message } = data.cloud_api_error;
-          if (status === 401) {
-            setStatus('❌ Access Denied: Please login with valid credentials');
-          } else if (status === 403) {
-            setStatus('❌ Access Denied: Premium subscription required');
-          } else {
-            setStatus(`❌ Cloud API Error: ${status}`);
-          }
-          // 注意：不 return，继续更新其他状态，但状态栏已显示错误
-        } else {
-          // 只有在没有错误时才更新正常状态
-          if (typeof data.is_running !== 'undefined') {
-            setIsRunning(data.is_running);
-            setStatus(data.is_running ? "Listening to AI brain... 🟢" : "click Start button to launch");
-          } else {
-            setStatus("Listening to AI brain... 🟢");
-          }
-        }
+      // Transform backend card shape to the UI shape expected by InterviewCard
+      const uiCard = {
+        id: card.id,
+        // 过滤掉 loading 状态的 topic
+        title: (card.topic && card.topic !== 'loading...') ? card.topic : (card.title || ""),
+        // InterviewCard expects content as an array of lines
+        content: Array.isArray(card.content)
+          ? card.content
+          : (typeof card.content === 'string' ? card.content.split('\n') : []),
+        tags: Array.isArray(card.tags) ? card.tags : (card.tags ? [card.tags] : []),
+        // AI 还在生成中（内容会继续更新）
+        streaming,
+        // AI 生成中途出错：只有部分内容
+        incomplete
+      };
 
-        // ✨ Update transcript (if backend returned transcript field)
-        if (data.transcript) {
-            setTranscript(data.transcript);
+      // 如果在Electron环境中，显示幽灵弹窗（同一张卡片的后续内容原地更新，不重新弹出）
+      if (window.electronAPI) {
+        if (sameCard && window.electronAPI.updatePopup) {
+          window.electronAPI.updatePopup(uiCard);
+        } else {
+          window.electronAPI.showPopup(uiCard);
         }
+      } else if (sameCard) {
+        setActiveCard(uiCard);
+        setShowCard(true);
+      } else {
+        // 网页环境中的传统卡片显示
+        setShowCard(false);
+        setTimeout(() => {
+          setActiveCard(uiCard);
+          setShowCard(true);
+        }, 50);
+      }
+      
+      setActiveCard(uiCard);
+    };
 
-        // 3. Logic: Backend may return two structures: { card } or old { card_id, card_data }
-        const card = data.card || (data.card_id ? { id: data.card_id, ...data.card_data } : null);
-        if (card) {
-          if (activeCard?.id !== card.id) {
-            console.log("Found new card!", card);
-            
-            // Transform backend card shape to the UI shape expected by InterviewCard
-            const uiCard = {
-              id: card.id,
-              // 过滤掉 loading 状态的 topic
-              title: (card.topic && card.topic !== 'loading...') ? card.topic : (card.title || ""),
-              // InterviewCard expects content as an array of lines
-              content: Array.isArray(card.content)
-                ? card.content
-                : (typeof card.content === 'string' ? card.content.split('\n') : []),
-              tags: Array.isArray(card.tags) ? card.tags : (card.tags ? [card.tags] : [])
-            };
+    // --- Fallback: poll every 100ms ---
+    let intervalId = null;
+    const stopPolling = () => {
+      if (intervalId) clearInterval(intervalId);
+      intervalId = null;
+    };
+    const startPolling = () => {
+      if (intervalId) return;
+      intervalId = setInterval(async () => {
+        try {
+          const response = await fetch('http://127.0.0.1:8000/api/poll');
+          
+          if (!response.ok) {
+            setStatus("Backend connection lost ❌");
+            return;
+          }
 
-            // 如果在Electron环境中，显示幽灵弹窗
-            if (window.electronAPI) {
-              window.electronAPI.showPopup(uiCard);
-            } else {
-              // 网页环境中的传统卡片显示
-              setShowCard(false);
-              setTimeout(() => {
-                setActiveCard(uiCard);
-                setShowCard(true);
-              }, 50);
-            }
-            
-            setActiveCard(uiCard);
+          const data = await response.json();
+          applyStatus(data.is_running, data.cloud_api_error);
+          // ✨ Update transcript (if backend returned transcript field)
+          if (data.transcript) {
+              setTranscript(data.transcript);
           }
-        } else {
-          // No matching card found: don't auto-hide, stay as is
+          applyCard(data);
+        } catch {
+          setStatus("Backend not started or network error ⚠️");
         }
+      }, 100); // Poll interval 100ms
+    };
+
+    // --- Push channel: backend only sends what changed ---
+    let running;
+    let cloudApiError = null;
+    let events = null;
+    let failures = 0;
+    let retryTimer = null;
+
+    const connect = () => {
+      retryTimer = null;
+      const source = new EventSource('http://127.0.0.1:8000/api/events');
+      events = source;
+      const on = (name, handler) => source.addEventListener(name, (e) => handler(JSON.parse(e.data)));
+
+      on('status', (data) => { running = data.is_running; applyStatus(running, cloudApiError); });
+      on('cloud_error', (data) => { cloudApiError = data.cloud_api_error; applyStatus(running, cloudApiError); });
+      on('card', applyCard);
+      // 每次连上后端都会先推一次完整 transcript，重连不会漏数据
+      on('transcript_reset', (data) => setTranscript(data.transcript));
+      on('transcript', (data) => setTranscript((prev) => [...prev, ...data.entries]));
 
-      } catch {
+      // 推送通道连上了：不用再轮询
+      source.onopen = () => {
+        failures = 0;
+        stopPolling();
+      };
+
+      // Connection error: EventSource reconnects by itself; only after repeated failures
+      // (old backend without /api/events, or backend down) fall back to polling and retry later
+      source.onerror = () => {
+        failures += 1;
+        const closed = source.readyState === EventSource.CLOSED;
+        // 已经在轮询（这是一次定时重试）：失败一次就放弃，等下一次重试
+        if (!intervalId && !closed && failures < SSE_MAX_FAILURES) return;
+        source.close();
+        events = null;
+        failures = 0;
         setStatus("Backend not started or network error ⚠️");
-        // console.error("Polling error:", error); // Errors too frequent for polling, can comment out log
-      }
-    }, 100); // Poll interval 100ms
+        startPolling();
+        retryTimer = setTimeout(connect, SSE_RETRY_MS);
+      };
+    };
 
-    // Cleanup: stop polling when component unmounts
-    return () => clearInterval(intervalId);
-  }, [activeCard, currentPage]);
+    if (typeof EventSource !== 'undefined') {
+      connect();
+    } else {
+      startPolling();
+    }
+
+    // Cleanup: close channel / stop polling when component unmounts
+    return () => {
+      if (events) events.close();
+      if (retryTimer) clearTimeout(retryTimer);
+      stopPolling();
+    };
+  }, [currentPage]);
 
   // 手动关闭卡片
   const closeCard = () => setShowCard(false);
@@ -363,15 +474,7 @@ function MainApp() {
         setIsRunning(false);
         console.log('✅ Interview stopped successfully');
         // Reload transcript history from backend after stopping
-        try {
-          const response = await fetch('http://127.0.0.1:8000/api/transcripts');
-          if (response.ok) {
-            const historyData = await response.json();
-            setTranscriptHistory(historyData.transcripts || []);
-          }
-        } catch (error) {
-          console.error('Error reloading transcript history:', error);
-        }
+        await reloadTranscriptHistory();
       } else {
         setStatus('Stop request failed');
         console.error('❌ Stop request failed:', res.status);
@@ -1280,6 +1383,9 @@ function MainApp() {
           handleReturnToInterview={handleReturnToInterview}
           transcriptHistory={transcriptHistory}
           onUpdateTranscriptHistory={setTranscriptHistory}
+          transcriptTotal={transcriptPaging.total}
+          hasMoreTranscripts={transcriptPaging.loaded < transcriptPaging.total}
+          onLoadMoreTranscripts={loadMoreTranscripts}
         />
       } />
     </Routes>
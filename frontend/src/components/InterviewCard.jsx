@@ -26,7 +26,7 @@ const InterviewCard = ({ data, isVisible }) => {
     }}>
       {/* 标题 */}
       <h3 style={{ margin: '0 0 12px 0', fontSize: '18px', color: '#1d1d1f' }}>
-        {data.title}
+        {data.title}{data.streaming ? ' …' : ''}{data.incomplete ? ' (incomplete)' : ''}
       </h3>
 
       {/* 内容 */}
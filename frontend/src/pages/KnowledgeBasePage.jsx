@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import CardEditorModal from '../components/CardEditorModal'; 
 import useSystemTheme from '../hooks/useSystemTheme';
 import NewCategoryModal from '../components/NewCategoryModal';
@@ -593,26 +593,65 @@ function KnowledgeBasePage({ handleReturnToInterview }) {
         localStorage.setItem('knowledgebase_categories', JSON.stringify(categories));
     }, [categories]);
     
+    // 🔥 Last state acknowledged by the backend: { version, cards: Map(id -> signature) }
+    const syncedRef = useRef({ version: null, cards: new Map() });
+    // Syncs run one after another so each delta is based on the previous result
+    const syncChainRef = useRef(Promise.resolve());
+
     // 🔥 Listen to cards changes, auto save to localStorage and sync to backend
     useEffect(() => {
         localStorage.setItem('knowledgebase_cards', JSON.stringify(cards));
-        
-        // 同步到后端（包括空数组，这样删除操作也会同步）
+
+        // Only the fields the backend stores decide whether a card changed
+        const signature = card => JSON.stringify([card.topic, card.components, card.content]);
+        const snapshot = new Map(cards.map(card => [card.id, signature(card)]));
+
+        const fullSync = async () => {
+            const response = await fetch('http://127.0.0.1:8000/api/cards', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ cards })
+            });
+            const data = await response.json();
+            if (data.success) {
+                syncedRef.current = { version: data.version, cards: snapshot };
+                console.log(`✅ Cards synced to backend (${cards.length} cards)`);
+            }
+        };
+
+        // 同步到后端：只发送变化的卡片（包括删除）；版本冲突时退回全量同步
         const syncToBackend = async () => {
             try {
-                await fetch('http://127.0.0.1:8000/api/cards', {
-                    method: 'POST',
+                const synced = syncedRef.current;
+                if (synced.version === null) {
+                    await fullSync();
+                    return;
+                }
+                const changed = cards.filter(card => synced.cards.get(card.id) !== snapshot.get(card.id));
+                const deleted = [...synced.cards.keys()].filter(id => !snapshot.has(id));
+                if (changed.length === 0 && deleted.length === 0) return;
+
+                const response = await fetch('http://127.0.0.1:8000/api/cards', {
+                    method: 'PATCH',
                     headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify({ cards })
+                    body: JSON.stringify({ base_version: synced.version, changed, deleted })
                 });
-                console.log(`✅ Cards synced to backend (${cards.length} cards)`);
+                if (response.status === 409) {
+                    console.log('⚠️ Backend cards changed elsewhere, resyncing all cards');
+                    await fullSync();
+                    return;
+                }
+                const data = await response.json();
+                if (data.success) {
+                    syncedRef.current = { version: data.version, cards: snapshot };
+                    console.log(`✅ Cards synced to backend (${changed.length} changed, ${deleted.length} deleted)`);
+                }
             } catch (err) {
                 console.log('⚠️ Could not sync cards to backend:', err);
             }
         };
-        
-        // 总是同步，即使是空数组
-        syncToBackend();
+
+        syncChainRef.current = syncChainRef.current.then(syncToBackend);
     }, [cards]);
     
     // 🔥 Listen to activeCategory changes, auto save to localStorage
@@ -1,10 +1,20 @@
-import React, { useState } from 'react';
+import React, { useState, useEffect } from 'react';
 import useSystemTheme from '../hooks/useSystemTheme';
 import RenameModal from '../components/RenameModal';
 
 // Component for viewing transcript history list
-const TranscriptHistoryList = ({ theme, transcripts, onSelectTranscript, onDeleteTranscript, onRenameTranscript, selectedTranscriptId }) => {
+const TranscriptHistoryList = ({ theme, transcripts, onSelectTranscript, onDeleteTranscript, onRenameTranscript, selectedTranscriptId, total, hasMore, onLoadMore }) => {
     const [menuOpen, setMenuOpen] = useState(null);
+    const [loadingMore, setLoadingMore] = useState(false);
+
+    const handleLoadMore = async () => {
+        setLoadingMore(true);
+        try {
+            await onLoadMore();
+        } finally {
+            setLoadingMore(false);
+        }
+    };
     const [renameModalOpen, setRenameModalOpen] = useState(false);
     const [renamingTranscript, setRenamingTranscript] = useState(null);
 
@@ -207,6 +217,26 @@ const TranscriptHistoryList = ({ theme, transcripts, onSelectTranscript, onDelet
                         </div>
                     ))
                 )}
+                {hasMore && (
+                    <button
+                        onClick={handleLoadMore}
+                        disabled={loadingMore}
+                        style={{
+                            width: '100%',
+                            margin: '8px 0 16px 0',
+                            padding: '9px 15px',
+                            borderRadius: '8px',
+                            border: `1px solid ${theme.isDark ? '#444' : '#ddd'}`,
+                            background: 'transparent',
+                            color: '#007AFF',
+                            cursor: loadingMore ? 'default' : 'pointer',
+                            fontSize: '14px',
+                            fontFamily: '-apple-system, BlinkMacSystemFont, "Segoe UI", "Helvetica Neue", Arial, sans-serif'
+                        }}
+                    >
+                        {loadingMore ? 'Loading...' : `Load more (${transcripts.length} of ${total})`}
+                    </button>
+                )}
             </div>
         </div>
         </>
@@ -301,11 +331,37 @@ const TranscriptDetailView = ({ theme, transcript, onBack }) => {
 };
 
 // Main TranscriptHistoryPage component
-function TranscriptHistoryPage({ handleReturnToInterview, transcriptHistory, onUpdateTranscriptHistory }) {
+function TranscriptHistoryPage({ handleReturnToInterview, transcriptHistory, onUpdateTranscriptHistory, transcriptTotal, hasMoreTranscripts, onLoadMoreTranscripts }) {
     const theme = useSystemTheme();
     const [selectedTranscriptId, setSelectedTranscriptId] = useState(null);
 
-    const selectedTranscript = transcriptHistory.find(t => t.id === selectedTranscriptId);
+    // Transcript contents are loaded on demand; the list only carries metadata
+    const [loadedTranscripts, setLoadedTranscripts] = useState({});
+
+    const selectedMeta = transcriptHistory.find(t => t.id === selectedTranscriptId);
+    const selectedTranscript = selectedMeta
+        ? { ...selectedMeta, transcript: selectedMeta.transcript || loadedTranscripts[selectedMeta.id] }
+        : null;
+
+    useEffect(() => {
+        if (!selectedMeta || selectedMeta.transcript || loadedTranscripts[selectedMeta.id]) return;
+        let cancelled = false;
+        const loadTranscript = async () => {
+            try {
+                const response = await fetch(`http://127.0.0.1:8000/api/transcripts/${encodeURIComponent(selectedMeta.id)}`);
+                if (response.ok) {
+                    const data = await response.json();
+                    if (!cancelled) {
+                        setLoadedTranscripts(prev => ({ ...prev, [data.id]: data.transcript || [] }));
+                    }
+                }
+            } catch (error) {
+                console.error('Error loading transcript:', error);
+            }
+        };
+        loadTranscript();
+        return () => { cancelled = true; };
+    }, [selectedMeta, loadedTranscripts]);
 
     const handleDeleteTranscript = (transcriptId) => {
         const updated = transcriptHistory.filter(t => t.id !== transcriptId);
@@ -344,6 +400,9 @@ function TranscriptHistoryPage({ handleReturnToInterview, transcriptHistory, onU
                         onDeleteTranscript={handleDeleteTranscript}
                         onRenameTranscript={handleRenameTranscript}
                         selectedTranscriptId={selectedTranscriptId}
+                        total={transcriptTotal}
+                        hasMore={hasMoreTranscripts}
+                        onLoadMore={onLoadMoreTranscripts}
                     />
                 </div>
                 